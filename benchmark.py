@@ -0,0 +1,614 @@
+"""Rough performance measurements for the pieces of the compiler pipeline.
+These aren't tests, they just print numbers so that changes can be compared before and after"""
+
+from cfg import CFG
+from cfg_parser import Parser
+from cfg_transforms import to_ll1
+from common import NonTerminal, Symbol, Terminal, dollar, epsilon
+from glr_parser import GLRParser, ambiguous_expressions
+from grammar_reader import Grammar
+from lexer import Lexer
+from packed_tables import PackedTables, CompressedTables
+from parser_generator import ParserGenerator
+from parser_stub import parse_internal
+
+import contextlib
+import importlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from types import ModuleType
+
+slang_sources = ["slang/fib.slang", "slang/if.slang", "slang/two_plus_three.slang"]
+
+
+def read_slang_sources() -> str:
+    sources: list[str] = []
+    for filename in slang_sources:
+        with open(filename, "r", encoding="utf-8") as f:
+            sources.append(f.read())
+    return "\n".join(sources)
+
+
+def lexer_throughput(repeats: int = 4) -> None:
+    """Lex the slang sample programs, concatenated {repeats} times, and print chars/sec"""
+    g = Grammar.from_file("slang.grammar")
+
+    start = time.perf_counter()
+    lexer = Lexer(g.terminal_triples)
+    construction_time = time.perf_counter() - start
+
+    source = "\n".join([read_slang_sources()] * repeats)
+
+    start = time.perf_counter()
+    tokens = lexer.lex(source)
+    lex_time = time.perf_counter() - start
+
+    print(f"Lexer construction: {construction_time:.3f}s")
+    print(
+        f"Lexed {len(source)} chars into {len(tokens)} tokens in {lex_time:.3f}s"
+        f" ({len(source) / lex_time:.0f} chars/sec)"
+    )
+
+
+def unicode_lexer_throughput(repeats: int = 20000) -> None:
+    """Lex the same shape of input in ascii and in greek/emoji, and print chars/sec for each,
+    which should be about the same since characters are looked up by range rather than through Sigma"""
+    lexer = Lexer(
+        [
+            (Terminal("IDENT"), "[a-zα-ω]([a-zα-ω0-9])*", ["STORE"]),
+            (Terminal("COMMENT"), "#([^\n])*", ["IGNORE"]),
+            (Terminal("SKIP"), "[ \n]", ["IGNORE"]),
+        ]
+    )
+    for name, line in [
+        ("ascii", "abc xyz1 # comment here ok\n"),
+        ("unicode", "αβγ λμν1 # ünïcödé 😀 here\n"),
+    ]:
+        source = line * repeats
+        start = time.perf_counter()
+        lexer.lex(source)
+        lex_time = time.perf_counter() - start
+        print(
+            f"Lexed {len(source)} {name} chars ({len(source) / lex_time:.0f} chars/sec)"
+        )
+
+
+def streaming_lexer_memory(repeats: int = 2000) -> None:
+    """Lex a file of the slang sample programs repeated {repeats} times, once by reading it all in and once
+    with iter_tokens, and print the time and peak memory of each"""
+    g = Grammar.from_file("slang.grammar")
+    lexer = Lexer(g.terminal_triples)
+
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as f:
+        f.write("\n".join([read_slang_sources()] * repeats))
+
+        for name in ["lex", "iter_tokens"]:
+            f.seek(0)
+            tracemalloc.start()
+            start = time.perf_counter()
+            if name == "lex":
+                num_tokens = len(lexer.lex(f.read()))
+            else:
+                num_tokens = sum(1 for _ in lexer.iter_tokens(f))
+            lex_time = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(
+                f"{name}: {num_tokens} tokens in {lex_time:.3f}s, peak memory {peak / 1e6:.1f}MB"
+            )
+
+
+def parser_nesting(depths: list[int] = [1000, 2000, 4000, 8000]) -> None:
+    """Parse slang expressions nested {depth} brackets deep, ((( ... x ... ))), and print the time per token.
+    The stacks get as deep as the nesting, so this shows up anything that's proportional to the stack depth"""
+    g = Grammar.from_file("slang.grammar", add_starting_production=True)
+    action = g.cfg.slr1_action
+    goto = g.cfg.slr1_goto
+    semantic_actions = {n: lambda xs: xs for n in g.cfg.N}
+
+    lparen = Terminal("LPAREN")
+    rparen = Terminal("RPAREN")
+    ident = Terminal("IDENT", "x")
+    for depth in depths:
+        tokens = [lparen] * depth + [ident] + [rparen] * depth
+        start = time.perf_counter()
+        parse_internal(action, goto, semantic_actions, tokens)
+        parse_time = time.perf_counter() - start
+        print(
+            f"Parsed nesting depth {depth} in {parse_time:.3f}s"
+            f" ({parse_time / len(tokens) * 1e6:.1f}us/token)"
+        )
+
+
+def parser_throughput(repeats: int = 200) -> None:
+    """Parse each of the slang sample programs {repeats} times with the dict tables and then the packed ones,
+    and print tokens/sec for each"""
+    g = Grammar.from_file("slang.grammar", add_starting_production=True)
+    action = g.cfg.slr1_action
+    goto = g.cfg.slr1_goto
+    tables = PackedTables.from_tables(
+        action,
+        goto,
+        g.terminals + [dollar],
+        g.nonterminals,
+        [prod for prods in g.cfg.P.values() for prod in prods],
+    )
+    compressed = CompressedTables.from_packed(tables)
+    semantic_actions = {n: lambda xs: xs for n in g.cfg.N}
+
+    lexer = Lexer(g.terminal_triples)
+    programs: list[list[Terminal]] = []
+    for filename in slang_sources:
+        with open(filename, "r", encoding="utf-8") as f:
+            programs.append(lexer.lex(f.read()))
+    num_tokens = sum(len(tokens) for tokens in programs) * repeats
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for tokens in programs:
+            parse_internal(action, goto, semantic_actions, tokens)
+    dict_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for tokens in programs:
+            tables.parse(semantic_actions, tokens)
+    packed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for tokens in programs:
+            compressed.parse(semantic_actions, tokens)
+    compressed_time = time.perf_counter() - start
+
+    print(f"Dict tables: {num_tokens / dict_time:.0f} tokens/sec")
+    print(f"Packed tables: {num_tokens / packed_time:.0f} tokens/sec")
+    print(f"Compressed tables: {num_tokens / compressed_time:.0f} tokens/sec")
+
+
+def table_formats() -> None:
+    """Generate the slang parser with each format of parse table, and print the size of the file and of the tables,
+    and how long it takes to import and how much memory it's using afterwards, in a fresh interpreter each time.
+    Memory is measured separately because tracemalloc slows the import down a lot,
+    and the import is done twice and the second one is measured, so that it's loading the cached bytecode"""
+    g = Grammar.from_file("slang.grammar", add_starting_production=True)
+    measure_time = (
+        "import time; start = time.perf_counter(); import {module}; "
+        "print(time.perf_counter() - start)"
+    )
+    measure_memory = (
+        "import tracemalloc; tracemalloc.start(); import {module}; "
+        "print(tracemalloc.get_traced_memory()[0])"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([directory, os.getcwd()])
+
+        def run(command: str) -> float:
+            return float(
+                subprocess.run(
+                    [sys.executable, "-c", command],
+                    capture_output=True,
+                    check=True,
+                    text=True,
+                    env=env,
+                ).stdout
+            )
+
+        for name, packed, compressed in [
+            ("dict", False, False),
+            ("packed", True, False),
+            ("compressed", True, True),
+        ]:
+            module = f"benchmark_{name}_parser"
+            filename = os.path.join(directory, module + ".py")
+            pg = ParserGenerator(g, filename, [], [], packed, compressed)
+            pg.generate()
+            if compressed:
+                tables_size = len(pg.compressed_tables_to_string())
+            elif packed:
+                tables_size = len(pg.packed_tables_to_string())
+            else:
+                tables_size = len(pg.action_to_string()) + len(pg.goto_to_string())
+            run(measure_time.format(module=module))
+            import_time = run(measure_time.format(module=module))
+            memory = run(measure_memory.format(module=module))
+            print(
+                f"{name} tables: {tables_size / 1e3:.1f}KB of {os.path.getsize(filename) / 1e3:.0f}KB file,"
+                f" import {import_time * 1e3:.1f}ms, memory {memory / 1e6:.2f}MB"
+            )
+
+
+def lr_constructions(grammars: list[str] = ["g2.grammar", "slang.grammar"]) -> None:
+    """Build the tables for each grammar with SLR(1), LALR(1), canonical LR(1) and merged LR(1),
+    and print how many states each has and how long it took, starting from scratch each time.
+    Canonical LR(1) is just the automaton, since it's only there for comparison and nothing builds tables from it"""
+    for filename in grammars:
+        for name in ["SLR(1)", "LALR(1)", "canonical LR(1)", "merged LR(1)"]:
+            cfg = Grammar.from_file(filename, add_starting_production=True).cfg
+            start = time.perf_counter()
+            if name == "SLR(1)":
+                # Not counting the empty state, which the LR(1) automata leave out
+                num_states = len(cfg.slr1_action) - 1
+            elif name == "LALR(1)":
+                num_states = len(cfg.lalr1_action) - 1
+            elif name == "canonical LR(1)":
+                num_states = len(cfg.lr1_automaton(merge=False)[0])
+            else:
+                num_states = len(cfg.lr1_action)
+            build_time = time.perf_counter() - start
+            print(f"{filename} {name}: {num_states} states in {build_time:.3f}s")
+
+
+def precedence_grammar(levels: int) -> CFG:
+    """An expression grammar with {levels} binary operators, each binding tighter than the last,
+    E0 -> E0 op0 E1 | E1, ..., E{levels} -> ( E0 ) | id, which has about 4 LR(0) states per level"""
+    E = [NonTerminal(f"E{i}") for i in range(levels + 1)]
+    ops = [Terminal(f"op{i}") for i in range(levels)]
+    o_bracket = Terminal("(")
+    c_bracket = Terminal(")")
+    ident = Terminal("id")
+
+    P: dict[NonTerminal, list[list[Symbol]]] = {
+        E[i]: [[E[i], ops[i], E[i + 1]], [E[i + 1]]] for i in range(levels)
+    }
+    P[E[levels]] = [[o_bracket, E[0], c_bracket], [ident]]
+    return CFG(
+        set(E),
+        set(ops) | {o_bracket, c_bracket, ident},
+        P,
+        E[0],
+        terminals_order=ops + [o_bracket, c_bracket, ident],
+        nonterminals_order=E,
+        add_unique_starting_production=True,
+    )
+
+
+def lr_table_scaling(levels: list[int] = [25, 50, 100, 200]) -> None:
+    """Build the SLR(1) tables for precedence_grammar with more and more levels, and then print them out,
+    and print the time each took, which should grow roughly with the size of the tables, not faster"""
+    for n in levels:
+        cfg = precedence_grammar(n)
+        start = time.perf_counter()
+        action = cfg.slr1_action
+        cfg.slr1_goto
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cfg.print_slr1_action()
+            cfg.print_slr1_goto()
+        print_time = time.perf_counter() - start
+        print(
+            f"{n} levels: {len(action)} states, {len(action) * (len(cfg.T) + len(cfg.N) + 1)} table entries"
+            f" in {build_time:.3f}s, printed in {print_time:.3f}s"
+        )
+
+
+def nullable_chain_grammar(length: int) -> CFG:
+    """A0 -> A1 a0 | ε, ..., A{length} -> a{length}, where everything can start with nearly anything,
+    which is the worst case for going round the productions until nothing changes"""
+    A = [NonTerminal(f"A{i}") for i in range(length + 1)]
+    a = [Terminal(f"a{i}") for i in range(length + 1)]
+
+    P: dict[NonTerminal, list[list[Symbol]]] = {
+        A[i]: [[A[i + 1], a[i]], [epsilon]] for i in range(length)
+    }
+    P[A[length]] = [[a[length]]]
+    return CFG(
+        set(A),
+        set(a),
+        P,
+        A[0],
+        terminals_order=a,
+        nonterminals_order=A,
+        add_unique_starting_production=True,
+    )
+
+
+def first_follow_scaling(sizes: list[int] = [500, 1000, 2000, 4000]) -> None:
+    """Work out nullable, FIRST and FOLLOW for generated grammars with {sizes} productions,
+    and print how long it took, which should grow with the size of the grammar and the sets, not faster"""
+    for size in sizes:
+        for name, cfg in [
+            ("precedence", precedence_grammar(size // 2)),
+            ("nullable chain", nullable_chain_grammar(size // 2)),
+        ]:
+            start = time.perf_counter()
+            cfg.first
+            cfg.follow
+            total_time = time.perf_counter() - start
+            num_productions = sum(len(ps) for ps in cfg.P.values())
+            print(
+                f"{name} grammar, {num_productions} productions: FIRST and FOLLOW in {total_time:.3f}s"
+            )
+
+
+def lalr1_lookahead_scaling(levels: list[int] = [100, 200, 400, 800]) -> None:
+    """Work out the LALR(1) lookaheads for precedence_grammar with more and more levels, not counting the LR(0) automaton,
+    which has more states and more terminals each time, so the lookahead sets get bigger as well as more numerous"""
+    for n in levels:
+        cfg = precedence_grammar(n)
+        states = len(cfg.lr0_states())
+        start = time.perf_counter()
+        cfg.lalr1_lookaheads
+        lookahead_time = time.perf_counter() - start
+        print(
+            f"{n} levels: {states} states, {len(cfg.T)} terminals, lookaheads in {lookahead_time:.3f}s"
+        )
+
+
+def ll1_throughput(num_tokens: int = 200000) -> None:
+    """Parse a long expression with the LL(1) parser and with the SLR(1) packed tables for the same grammar,
+    E -> T E', E' -> + T E' | ε, T -> F T', T' -> * F T' | ε, F -> ( E ) | id,
+    and print tokens/sec for each, with the same semantic actions so they both build the same sort of tree"""
+    E, E_prime, T, T_prime, F = (NonTerminal(n) for n in ["E", "E'", "T", "T'", "F"])
+    plus, times, o_bracket, c_bracket, ident = (
+        Terminal(t) for t in ["+", "*", "(", ")", "id"]
+    )
+    cfg = CFG(
+        {E, E_prime, T, T_prime, F},
+        {plus, times, o_bracket, c_bracket, ident},
+        {
+            E: [[T, E_prime]],
+            E_prime: [[plus, T, E_prime], [epsilon]],
+            T: [[F, T_prime]],
+            T_prime: [[times, F, T_prime], [epsilon]],
+            F: [[o_bracket, E, c_bracket], [ident]],
+        },
+        E,
+        terminals_order=[ident, plus, times, o_bracket, c_bracket],
+        nonterminals_order=[E, E_prime, T, T_prime, F],
+        add_unique_starting_production=True,
+    )
+    semantic_actions = {n: lambda xs: xs for n in cfg.N}
+
+    # (id*id+id)*(id*id+id)*..., which nests a bit and uses everything
+    term = [o_bracket, ident, times, ident, plus, ident, c_bracket]
+    tokens = term
+    while len(tokens) < num_tokens:
+        tokens = tokens + [times] + term
+
+    ll1 = Parser(cfg)
+    start = time.perf_counter()
+    ll1.parse(tokens, semantic_actions)
+    ll1_time = time.perf_counter() - start
+
+    # The packed tables count the ε in E' -> ε as a symbol to pop, so the LR parser gets the productions without them
+    lr_cfg = CFG(
+        cfg.N - {cfg.E},
+        cfg.T,
+        {
+            n: [[s for s in prod.RHS if s != epsilon] for prod in prods]
+            for n, prods in cfg.P.items()
+            if n != cfg.E
+        },
+        E,
+        terminals_order=cfg.terminals_order,
+        nonterminals_order=[n for n in cfg.nonterminals_order if n != cfg.E],
+        add_unique_starting_production=True,
+    )
+    lr = PackedTables.from_tables(
+        lr_cfg.slr1_action,
+        lr_cfg.slr1_goto,
+        lr_cfg.terminals_order + [dollar],
+        lr_cfg.nonterminals_order,
+        [prod for n in lr_cfg.nonterminals_order for prod in lr_cfg.P[n]],
+    )
+    start = time.perf_counter()
+    lr.parse(semantic_actions, tokens)
+    lr_time = time.perf_counter() - start
+
+    print(f"LL(1) parser: {len(tokens) / ll1_time:.0f} tokens/sec")
+    print(f"SLR(1) packed tables: {len(tokens) / lr_time:.0f} tokens/sec")
+
+
+def recursive_descent_throughput(repeats: int = 2000) -> None:
+    """Generate the g2 parser with packed LR tables and the recursive descent parser for g2_ll1.grammar,
+    which is g2 without the left recursion, and print tokens/sec for each on the same tokens,
+    along with the table-driven LL(1) parser for comparison"""
+    source = " + ".join(["(x * y + z) * w"] * repeats)
+    with tempfile.TemporaryDirectory() as directory:
+        sys.path.insert(0, directory)
+        try:
+            g = Grammar.from_file("g2.grammar", add_starting_production=True)
+            ParserGenerator(
+                g, os.path.join(directory, "benchmark_lr_parser.py"), [], []
+            ).generate()
+            g_ll1 = Grammar.from_file("g2_ll1.grammar", add_starting_production=True)
+            ParserGenerator(
+                g_ll1,
+                os.path.join(directory, "benchmark_rd_parser.py"),
+                [],
+                [],
+                recursive_descent=True,
+            ).generate()
+            lr_parser = importlib.import_module("benchmark_lr_parser")
+            rd_parser = importlib.import_module("benchmark_rd_parser")
+        finally:
+            sys.path.remove(directory)
+
+    tokens = lr_parser.lex(source)
+    ll1 = Parser(g_ll1.cfg)
+    semantic_actions = {n: lambda xs: xs for n in g_ll1.cfg.N}
+    for name, parse in [
+        ("SLR(1) packed tables", lambda: lr_parser.parse(tokens)),
+        ("Recursive descent", lambda: rd_parser.parse(tokens)),
+        ("Table-driven LL(1)", lambda: ll1.parse(tokens, semantic_actions)),
+    ]:
+        # Best of a few, because each one is quite quick
+        parse_time = min(timeit.repeat(parse, number=1, repeat=5))
+        print(f"{name} on g2: {len(tokens) / parse_time:.0f} tokens/sec")
+
+
+def recursive_ascent_throughput(repeats: int = 200) -> None:
+    """Generate the packed table parser and the recursive ascent parser for g2 and slang,
+    and print tokens/sec for each on the same programs, which for slang are the samples {repeats} times"""
+    parsers: dict[str, list[tuple[str, ModuleType]]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        sys.path.insert(0, directory)
+        try:
+            for name in ["g2", "slang"]:
+                g = Grammar.from_file(f"{name}.grammar", add_starting_production=True)
+                parsers[name] = []
+                for kind, recursive_ascent in [
+                    ("SLR(1) packed tables", False),
+                    ("Recursive ascent", True),
+                ]:
+                    module_name = f"benchmark_{name}_{int(recursive_ascent)}_parser"
+                    ParserGenerator(
+                        g,
+                        os.path.join(directory, f"{module_name}.py"),
+                        [],
+                        [],
+                        recursive_ascent=recursive_ascent,
+                    ).generate()
+                    parsers[name].append((kind, importlib.import_module(module_name)))
+        finally:
+            sys.path.remove(directory)
+
+    lex = parsers["g2"][0][1].lex
+    programs = {"g2": [lex(" + ".join(["(x * y + z) * w"] * 10 * repeats))]}
+    lex = parsers["slang"][0][1].lex
+    programs["slang"] = []
+    for filename in slang_sources:
+        with open(filename, "r", encoding="utf-8") as f:
+            programs["slang"] += [lex(f.read())] * repeats
+
+    for name, kinds in parsers.items():
+        num_tokens = sum(len(tokens) for tokens in programs[name])
+        for kind, module in kinds:
+
+            def run() -> None:
+                for tokens in programs[name]:
+                    module.parse(tokens)
+
+            # Best of a few, because each one is quite quick
+            parse_time = min(timeit.repeat(run, number=1, repeat=5))
+            print(f"{kind} on {name}: {num_tokens / parse_time:.0f} tokens/sec")
+
+
+def transformed_slang(repeats: int = 200) -> None:
+    """Turn the slang grammar into an LL(1) one with cfg_transforms.to_ll1, and print how long that and making
+    the LL(1) parser takes against making the SLR(1) packed tables, and then tokens/sec for each on the slang samples,
+    with the same semantic actions so that they both build the same values"""
+    start = time.perf_counter()
+    g = Grammar.from_file("slang.grammar", add_starting_production=True)
+    tables = PackedTables.from_tables(
+        g.cfg.slr1_action,
+        g.cfg.slr1_goto,
+        g.terminals + [dollar],
+        g.nonterminals,
+        [prod for prods in g.cfg.P.values() for prod in prods],
+    )
+    lr_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    g = Grammar.from_file("slang.grammar", add_starting_production=True)
+    transformation = to_ll1(g.cfg)
+    ll1 = Parser(transformation.cfg)
+    ll1_time = time.perf_counter() - start
+    print(f"SLR(1) packed tables for slang: {lr_time:.3f}s")
+    print(
+        f"to_ll1 and LL(1) parser for slang: {ll1_time:.3f}s, "
+        f"{sum(len(prods) for prods in transformation.cfg.P.values())} productions "
+        f"from {sum(len(prods) for prods in g.cfg.P.values())}"
+    )
+
+    semantic_actions = {n: lambda xs: xs for n in g.cfg.N}
+    production_actions = transformation.production_actions(semantic_actions)
+    lexer = Lexer(g.terminal_triples)
+    programs: list[list[Terminal]] = []
+    for filename in slang_sources:
+        with open(filename, "r", encoding="utf-8") as f:
+            programs.append(lexer.lex(f.read()))
+    num_tokens = sum(len(tokens) for tokens in programs) * repeats
+
+    def run_lr() -> None:
+        for tokens in programs:
+            tables.parse(semantic_actions, tokens)
+
+    def run_ll1() -> None:
+        for tokens in programs:
+            ll1.parse(tokens, production_actions=production_actions)
+
+    for name, run in [("SLR(1) packed tables", run_lr), ("Transformed LL(1)", run_ll1)]:
+        parse_time = min(timeit.repeat(run, number=repeats, repeat=5))
+        print(f"{name} on slang: {num_tokens / parse_time:.0f} tokens/sec")
+
+
+def glr_throughput(repeats: int = 200, lengths: list[int] = [25, 50, 100]) -> None:
+    """Print tokens/sec for the GLR parser against the SLR(1) packed tables on g2 and the slang samples,
+    where there aren't any conflicts so it's only ever got one stack, and then how long it takes and how big
+    the forest is for id + id + ... + id in the ambiguous expression grammar, which has exponentially many parses"""
+    for name in ["g2", "slang"]:
+        g = Grammar.from_file(f"{name}.grammar", add_starting_production=True)
+        tables = PackedTables.from_tables(
+            g.cfg.slr1_action,
+            g.cfg.slr1_goto,
+            g.terminals + [dollar],
+            g.nonterminals,
+            [prod for prods in g.cfg.P.values() for prod in prods],
+        )
+        glr = GLRParser(g.cfg)
+        semantic_actions = {n: lambda xs: xs for n in g.cfg.N}
+
+        lexer = Lexer(g.terminal_triples)
+        if name == "g2":
+            programs = [lexer.lex(" + ".join(["(x * y + z) * w"] * 10 * repeats))]
+        else:
+            programs = []
+            for filename in slang_sources:
+                with open(filename, "r", encoding="utf-8") as f:
+                    programs += [lexer.lex(f.read())] * repeats
+        num_tokens = sum(len(tokens) for tokens in programs)
+
+        def run_lr() -> None:
+            for tokens in programs:
+                tables.parse(semantic_actions, tokens)
+
+        def run_glr() -> None:
+            for tokens in programs:
+                glr.parse(tokens).evaluate(semantic_actions)
+
+        for kind, run in [("SLR(1) packed tables", run_lr), ("GLR", run_glr)]:
+            parse_time = min(timeit.repeat(run, number=1, repeat=5))
+            print(f"{kind} on {name}: {num_tokens / parse_time:.0f} tokens/sec")
+
+    glr = GLRParser(ambiguous_expressions())
+    plus = Terminal("+")
+    ident = Terminal("id")
+    for length in lengths:
+        tokens = [ident] + [plus, ident] * (length - 1)
+        start = time.perf_counter()
+        root = glr.parse(tokens)
+        parse_time = time.perf_counter() - start
+        _, families = root.size()
+        print(
+            f"GLR on {length} ids: {parse_time:.3f}s, {families} families, "
+            f"{len(str(root.count_trees()))} digit number of parses"
+        )
+
+
+def main() -> None:
+    lexer_throughput()
+    unicode_lexer_throughput()
+    streaming_lexer_memory()
+    parser_nesting()
+    parser_throughput()
+    table_formats()
+    lr_constructions()
+    lr_table_scaling()
+    first_follow_scaling()
+    lalr1_lookahead_scaling()
+    ll1_throughput()
+    recursive_descent_throughput()
+    recursive_ascent_throughput()
+    transformed_slang()
+    glr_throughput()
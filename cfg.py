@@ -1,5 +1,4 @@
-from dfa import DFA
-from nfa import TypedNFA
+from dfa import DFA, TransitionTable
 from common import (
     Symbol,
     Terminal,
@@ -13,7 +12,9 @@ from common import (
     dollar,
 )
 
-from typing import Optional, Union
+from collections import deque
+from collections.abc import Callable, Hashable, Iterable, Iterator, Mapping, Sequence
+from typing import Optional, TypeVar, Union
 
 
 class LR0_Item:
@@ -79,6 +80,124 @@ class LR0_Item:
         )
 
 
+class LR1_Item(LR0_Item):
+    """An LR(0) item plus the terminals that can come after the production, [A -> α⋅β, a/b]
+    When the dot gets to the end it's only reduced if the next token is one of the lookaheads"""
+
+    def __init__(
+        self, production: Production, dot_location: int, lookaheads: frozenset[Terminal]
+    ):
+        super().__init__(production, dot_location)
+        self.lookaheads = lookaheads
+
+    @property
+    def core(self) -> LR0_Item:
+        return LR0_Item(self.production, self.dot_location)
+
+    def item_after_dot(self) -> "LR1_Item":
+        core = super().item_after_dot()
+        return LR1_Item(core.production, core.dot_location, self.lookaheads)
+
+    def __hash__(self) -> int:
+        return hash((self.production, self.dot_location, self.lookaheads))
+
+    def __str__(self) -> str:
+        return f"[{super().__str__()}, {'/'.join(sorted(str(t) for t in self.lookaheads))}]"
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, LR1_Item)
+            and self.production == other.production
+            and self.dot_location == other.dot_location
+            and self.lookaheads == other.lookaheads
+        )
+
+
+K = TypeVar("K", bound=Hashable)
+
+
+def digraph(
+    X: Iterable[K], R: Callable[[K], Iterable[K]], F_prime: Callable[[K], int]
+) -> dict[K, int]:
+    """DeRemer and Pennello's digraph algorithm, for the smallest F with F(x) = F'(x) ∪ ⋃{F(y) | x R y},
+    where the sets are bitsets, so the unions are just |s
+    It's a depth first search which spots strongly connected components as it goes, like Tarjan's algorithm,
+    because everything in one of those ends up with the same set, so each set is only built once.
+    Done with an explicit stack rather than recursion, because the relations can have very long chains"""
+    infinity = float("inf")
+    depth: dict[
+        K, float
+    ] = {}  # Where each x is on the stack, or infinity once we've finished with it
+    low: dict[K, float] = {}
+    F: dict[K, int] = {}
+    stack: list[K] = []
+
+    def push(x: K) -> None:
+        stack.append(x)
+        depth[x] = low[x] = len(stack)
+        F[x] = F_prime(x)
+
+    for root in X:
+        if root in depth:
+            continue
+        push(root)
+        call_stack = [(root, iter(R(root)))]
+        while call_stack:
+            x, successors = call_stack[-1]
+            for y in successors:
+                if y not in depth:
+                    push(y)
+                    call_stack.append((y, iter(R(y))))
+                    break
+                low[x] = min(low[x], low[y])
+                F[x] |= F[y]
+            else:
+                call_stack.pop()
+                if low[x] == depth[x]:
+                    # x is the root of a strongly connected component, which is everything above it on the stack
+                    while True:
+                        top = stack.pop()
+                        low[top] = infinity
+                        F[top] = F[x]
+                        if top == x:
+                            break
+                if call_stack:
+                    parent = call_stack[-1][0]
+                    low[parent] = min(low[parent], low[x])
+                    F[parent] |= F[x]
+    return F
+
+
+def bits_to_terminals(bits: int, terminals: Sequence[Terminal]) -> set[Terminal]:
+    """The set of terminals[i] for each bit i set in {bits}"""
+    result = set()
+    while bits:
+        lowest = bits & -bits
+        result.add(terminals[lowest.bit_length() - 1])
+        bits ^= lowest
+    return result
+
+
+class TerminalSets(Mapping[K, set[Terminal]]):
+    """A dict of sets of terminals, which are stored as bitsets and only turned back into sets when they're looked at"""
+
+    def __init__(self, bits: dict[K, int], terminals: Sequence[Terminal]):
+        self.bits = bits
+        self.terminals = terminals
+        self.decoded: dict[K, set[Terminal]] = {}
+
+    def __getitem__(self, key: K) -> set[Terminal]:
+        if key not in self.decoded:
+            self.decoded[key] = bits_to_terminals(self.bits[key], self.terminals)
+        return self.decoded[key]
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self.bits)
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+
 class CFG:
     def __init__(
         self,
@@ -142,19 +261,60 @@ class CFG:
         for n in self.N:
             assert n in self.P, n
 
-        self._computed_first = False
-        self._first: dict[NonTerminal, set[Terminal]] = {n: set() for n in self.N}
+        # Sets of terminals get stored as ints, with bit i set if terminal_list[i] is in the set,
+        # so that unions are just an |, rather than hashing every terminal in them
+        self.terminal_list = self.terminals_order + [
+            t for t in [dollar, epsilon] if t not in self.terminals_order
+        ]
+        self.terminal_ids = {t: i for i, t in enumerate(self.terminal_list)}
+        self.epsilon_bit = 1 << self.terminal_ids[epsilon]
 
-        self._computed_follow = False
-        self._follow: dict[NonTerminal, set[Terminal]] = {n: set() for n in self.N}
+        self.invalidate()
 
-        self._computed_ll1_parse_table = False
-        self._ll1_parse_table: dict[NonTerminal, dict[Terminal, set[Production]]] = {
-            n: {t: set() for t in self.T} for n in self.N
-        }
+    def invalidate(self) -> None:
+        """Forget everything that's been worked out from the grammar, i.e. FIRST, FOLLOW and the parse tables,
+        so that it's worked out again next time it's needed.
+        They're all cached, so if you change the productions you need to call this, add_production does"""
+        self._nullable: Optional[set[NonTerminal]] = None
+        self._first_bits: Optional[dict[NonTerminal, int]] = None
+        self._first: Optional[TerminalSets[NonTerminal]] = None
+        self._follow_bits: Optional[dict[NonTerminal, int]] = None
+        self._follow: Optional[TerminalSets[NonTerminal]] = None
+
+        self._ll1_parse_table: Optional[
+            dict[NonTerminal, dict[Terminal, set[Production]]]
+        ] = None
 
         self._lr0_items: Optional[list[LR0_Item]] = None
         self._lr0_dfa: Optional[DFA] = None
+        self._lr0_transitions: Optional[list[dict[Symbol, int]]] = None
+        self._lalr1_lookaheads: Optional[TerminalSets[tuple[int, Production]]] = None
+        self._lr1_automata: dict[
+            bool, tuple[list[frozenset[LR1_Item]], list[dict[Symbol, int]]]
+        ] = {}
+
+        self._slr1_action: Optional[dict[int, dict[Terminal, Optional[LR0_Action]]]] = (
+            None
+        )
+        self._slr1_goto: Optional[dict[int, dict[NonTerminal, Optional[int]]]] = None
+        self._lalr1_action: Optional[
+            dict[int, dict[Terminal, Optional[LR0_Action]]]
+        ] = None
+        self._slr1_action_lists: Optional[
+            dict[int, dict[Terminal, list[LR0_Action]]]
+        ] = None
+        self._lalr1_action_lists: Optional[
+            dict[int, dict[Terminal, list[LR0_Action]]]
+        ] = None
+        self._lr1_action: Optional[dict[int, dict[Terminal, Optional[LR0_Action]]]] = (
+            None
+        )
+        self._lr1_goto: Optional[dict[int, dict[NonTerminal, Optional[int]]]] = None
+
+    def add_production(self, n: NonTerminal, production: list[Symbol]) -> None:
+        assert n in self.N, (n, self.N)
+        self.P[n].append(Production(n, production))
+        self.invalidate()
 
     def __str__(self) -> str:
         all_prods = []
@@ -209,21 +369,68 @@ class CFG:
             return alpha == epsilon
         else:
             assert isinstance(alpha, NonTerminal) and alpha in self.N, (alpha, self.N)
-            # If we don't know if n is nullable this will throw an exception
-            # This is the correct behaviour because we use the exception for "have we computed it"
-            return epsilon in self.first[alpha]
+            return alpha in self.nullable
+
+    @property
+    def nullable(self) -> set[NonTerminal]:
+        """The nonterminals that can produce the empty string.
+        Each production keeps a count of the symbols on its RHS that we don't know are nullable yet,
+        and whenever a nonterminal turns out to be nullable the counts of the productions it appears in go down,
+        so each symbol of each production is only looked at a couple of times"""
+        if self._nullable is not None:
+            return self._nullable
+
+        self._nullable = set()
+        remaining: dict[Production, int] = {}
+        appears_in: dict[NonTerminal, list[Production]] = {n: [] for n in self.N}
+        worklist: list[NonTerminal] = []
+        for n in self.N:
+            for production in self.P[n]:
+                remaining[production] = 0
+                for symbol in production.RHS:
+                    if isinstance(symbol, NonTerminal):
+                        appears_in[symbol].append(production)
+                    if symbol != epsilon:
+                        remaining[production] += 1
+                if remaining[production] == 0:
+                    worklist.append(n)
+
+        while worklist:
+            n = worklist.pop()
+            if n in self._nullable:
+                continue
+            self._nullable.add(n)
+            for production in appears_in[n]:
+                remaining[production] -= 1
+                if remaining[production] == 0:
+                    worklist.append(production.LHS)
+        return self._nullable
 
     def print_nullable(self) -> None:  # pragma: no cover
         for n in self.nonterminals_order:
             print(f"Nullable({n}) = {self.is_nullable(n)}")
 
+    def terminal_set(self, bits: int) -> set[Terminal]:
+        return bits_to_terminals(bits, self.terminal_list)
+
+    def symbol_first_bits(self, symbol: Symbol) -> int:
+        if isinstance(symbol, NonTerminal):
+            return self.first_bits[symbol]
+        assert isinstance(symbol, Terminal), symbol
+        return 1 << self.terminal_ids[symbol]
+
+    def first_bits_of(self, alpha: Sequence[Symbol], start: int = 0) -> int:
+        """FIRST(alpha[start:]) as a bitset, including ε if it's all nullable (so if it's empty too).
+        ε is in FIRST of exactly the nullable symbols, so we don't need to look anything else up"""
+        bits = 0
+        for i in range(start, len(alpha)):
+            symbol_bits = self.symbol_first_bits(alpha[i])
+            bits |= symbol_bits & ~self.epsilon_bit
+            if not symbol_bits & self.epsilon_bit:
+                return bits
+        return bits | self.epsilon_bit
+
     def get_first(self, alpha: Symbol | list[Symbol] | Production) -> set[Terminal]:
-        # There's a bunch of mutual recursion here between get_first, is_nullable and first
-        # It's fine because get_first only calls nullable in the case where it's arg is list[Symbol]
-        # And it calls it with a Symbol not a list
-        # is_nullable only calls first with a NonTerminal, so will never hit an infinite loop
-        # first and get_first call each other, but first will just return the partially computed version
-        # which is has cached, which is the exact behaviour we want, and the cache prevents an infinite loop
         if isinstance(alpha, Terminal):
             assert alpha == epsilon or alpha in self.T, alpha
             return {alpha}
@@ -237,33 +444,48 @@ class CFG:
             assert all(isinstance(a, Symbol) for a in alpha), alpha
             if len(alpha) == 0:
                 return set()
-            first_set = self.get_first(alpha[0]) - {epsilon}
-            if len(alpha) > 1 and self.is_nullable(alpha[0]):
-                first_set |= self.get_first(alpha[1:])
-            if all([self.is_nullable(a) for a in alpha]):
-                first_set |= {epsilon}
-            return first_set
+            return self.terminal_set(self.first_bits_of(alpha))
+
+    def first_relations(
+        self,
+    ) -> tuple[dict[NonTerminal, int], dict[NonTerminal, set[NonTerminal]]]:
+        """What goes into FIRST(A) directly, i.e. the terminals that can start a production of A (as a bitset),
+        and which FIRST(B)s go into it, i.e. the B that can start a production of A,
+        which in both cases means everything before them is nullable"""
+        direct: dict[NonTerminal, int] = {n: 0 for n in self.N}
+        includes: dict[NonTerminal, set[NonTerminal]] = {n: set() for n in self.N}
+        for n in self.N:
+            for production in self.P[n]:
+                for symbol in production.RHS:
+                    if isinstance(symbol, NonTerminal):
+                        includes[n].add(symbol)
+                    elif symbol != epsilon:
+                        assert isinstance(symbol, Terminal), symbol
+                        direct[n] |= 1 << self.terminal_ids[symbol]
+                    if not self.is_nullable(symbol):
+                        break
+        return direct, includes
 
     @property
-    def first(self) -> dict[NonTerminal, set[Terminal]]:
-        if self._computed_first:
-            return self._first
-
-        # We haven't fully computed it yet, but we use the partially computed version
-        # In the calculation so we need to not just be in an infinite loop
-        self._computed_first = True
-
-        changed = True  # Initialise to True to get into the loop
-        while changed:
-            changed = False
-            for n in self.N:
-                new_first = set()
-                for production in self.P[n]:
-                    new_first |= self.get_first(production)
-                if not new_first <= self._first[n]:
-                    changed = True
-                    self._first[n] |= new_first
+    def first_bits(self) -> dict[NonTerminal, int]:
+        """FIRST(A) is the smallest set with the direct terminals of A and FIRST(B) for each B A starts with,
+        which is what the digraph algorithm solves, in time linear in the size of the grammar.
+        Nullable nonterminals have ε in their FIRST too."""
+        if self._first_bits is None:
+            direct, includes = self.first_relations()
+            first = digraph(
+                self.nonterminals_order, lambda n: includes[n], lambda n: direct[n]
+            )
+            self._first_bits = {
+                n: first[n] | self.epsilon_bit if n in self.nullable else first[n]
+                for n in self.N
+            }
+        return self._first_bits
 
+    @property
+    def first(self) -> Mapping[NonTerminal, set[Terminal]]:
+        if self._first is None:
+            self._first = TerminalSets(self.first_bits, self.terminal_list)
         return self._first
 
     def print_first(self) -> None:  # pragma: no cover
@@ -271,43 +493,43 @@ class CFG:
             print(f"First({n}) = {self.first[n]}")
 
     @property
-    def follow(self) -> dict[NonTerminal, set[Terminal]]:
-        # As a nice little efficiency win, do this in 2 stages
-        # Figure out what the fixed point dependencies are, and get all the first sets
-        # Then do the fixed point computation
+    def follow_bits(self) -> dict[NonTerminal, int]:
+        """For each occurrence of A in B -> αAβ, FOLLOW(A) gets FIRST(β), and if β is nullable it gets FOLLOW(B) too,
+        so like FIRST this is the digraph algorithm.
+        FIRST(β) is found by walking backwards along each RHS, so each production is only looked at once."""
+        if self._follow_bits is not None:
+            return self._follow_bits
 
-        if self._computed_follow:
-            return self._follow
-
-        fixed_point_dependencies: dict[NonTerminal, set[NonTerminal]] = {
-            n: set() for n in self.N
-        }
-
-        self._follow[self.E] = {dollar}
+        direct: dict[NonTerminal, int] = {n: 0 for n in self.N}
+        direct[self.E] |= 1 << self.terminal_ids[dollar]
+        includes: dict[NonTerminal, set[NonTerminal]] = {n: set() for n in self.N}
 
         for n in self.N:
             for production in self.P[n]:
-                for i, A in enumerate(production.RHS):
-                    if not isinstance(A, NonTerminal):
-                        continue
-                    beta = production.RHS[i + 1 :]
-                    self._follow[A] |= self.get_first(beta) - {epsilon}
-
-                    if len(beta) == 0 or self.is_nullable(beta):
-                        fixed_point_dependencies[A] |= {n}
-
-        changed = True  # Initialise to True to get into the loop
-        while changed:
-            changed = False
-            for n in self.N:
-                new_follow: set[Terminal] = set()
-                for non_terminal in fixed_point_dependencies[n]:
-                    new_follow |= self._follow[non_terminal]
-                if not new_follow <= self._follow[n]:
-                    changed = True
-                    self._follow[n] |= new_follow
-
-        self._computed_follow = True
+                # FIRST of what's after the current symbol, and whether it's all nullable
+                first_after = 0
+                nullable_after = True
+                for symbol in reversed(production.RHS):
+                    if isinstance(symbol, NonTerminal):
+                        direct[symbol] |= first_after
+                        if nullable_after:
+                            includes[symbol].add(n)
+                    symbol_bits = self.symbol_first_bits(symbol)
+                    if symbol_bits & self.epsilon_bit:
+                        first_after |= symbol_bits & ~self.epsilon_bit
+                    else:
+                        first_after = symbol_bits
+                        nullable_after = False
+
+        self._follow_bits = digraph(
+            self.nonterminals_order, lambda n: includes[n], lambda n: direct[n]
+        )
+        return self._follow_bits
+
+    @property
+    def follow(self) -> Mapping[NonTerminal, set[Terminal]]:
+        if self._follow is None:
+            self._follow = TerminalSets(self.follow_bits, self.terminal_list)
         return self._follow
 
     def print_follow(self) -> None:  # pragma: no cover
@@ -316,23 +538,27 @@ class CFG:
 
     @property
     def ll1_parse_table(self) -> dict[NonTerminal, dict[Terminal, set[Production]]]:
-        if self._computed_ll1_parse_table:
+        if self._ll1_parse_table is not None:
             return self._ll1_parse_table
 
         # We could assert here that the grammar isn't left recursive
         # However you can still generate a parse table for some left recursive grammars, you just can't parse with it
         # So given that our goal here is education not creating tools, let's allow that case
 
+        # $ isn't in T if we added S -> E, but it can still follow things
+        table: dict[NonTerminal, dict[Terminal, set[Production]]] = {
+            n: {t: set() for t in self.T | {dollar}} for n in self.N
+        }
         for A, productions in self.P.items():
             for production in productions:
                 for a in self.get_first(production):
                     if a == epsilon:
                         for b in self.follow[A]:
-                            self._ll1_parse_table[A][b] |= {production}
+                            table[A][b] |= {production}
                     else:
-                        self._ll1_parse_table[A][a] |= {production}
+                        table[A][a] |= {production}
 
-        self._computed_ll1_parse_table = True
+        self._ll1_parse_table = table
         return self._ll1_parse_table
 
     def print_ll1_parse_table(self) -> None:  # pragma: no cover
@@ -384,84 +610,447 @@ class CFG:
 
     @property
     def lr0_dfa(self) -> DFA:
+        """The LR(0) automaton, whose states are sets of LR0_Items, with the state numbers in dfa.state_list.
+        Rather than building an NFA over every item and running the subset construction on it,
+        this works on the item sets directly. Each state is identified by its kernel (the items with something
+        before the dot, or the starting item), so it's only closed once, and it only has transitions
+        on the symbols that come after a dot in it, rather than trying every symbol.
+        Items are numbered internally so that all the set operations are on ints"""
         if self._lr0_dfa is not None:  # pragma: no cover
             return self._lr0_dfa
 
-        Q = set(self.lr0_items)
-        Sigma: set[Symbol] = self.N | self.T
         assert self.starting_prod is not None
-        q0 = LR0_Item(self.starting_prod, 0)
-
-        starting_items_for_nonterminal = {
-            n: [LR0_Item(production, 0) for production in productions]
-            for n, productions in self.P.items()
-        }
-
-        transitions: list[tuple[LR0_Item, Symbol, LR0_Item]] = []
-
-        for item in Q:
-            next_symbol = item.symbol_after_dot()
-            if next_symbol is not None:
-                transitions.append((item, next_symbol, item.item_after_dot()))
-                if isinstance(next_symbol, NonTerminal):
-                    for starting_item in starting_items_for_nonterminal[next_symbol]:
-                        transitions.append((item, epsilon, starting_item))
+        Sigma: set[Symbol] = self.N | self.T
+        symbols: list[Symbol] = [*self.nonterminals_order, *self.terminals_order]
 
-        transition_dict: dict[LR0_Item, dict[Symbol, set[LR0_Item]]] = {
-            q: {s: set() for s in Sigma | {epsilon}} for q in Q
-        }
-        for q, s, q_prime in transitions:
-            transition_dict[q][s] |= {q_prime}
+        # Item i is LR0_Item(item_productions[i], item_dots[i]), and the item with the dot moved on is i + 1
+        items: list[LR0_Item] = []
+        first_item: dict[Production, int] = {}
+        for n in self.nonterminals_order:
+            for production in self.P[n]:
+                first_item[production] = len(items)
+                for i in range(len(production.RHS) + 1):
+                    items.append(LR0_Item(production, i))
+        symbol_after_dot = [item.symbol_after_dot() for item in items]
+
+        # What the closure adds for an item with B after the dot, worked out once per nonterminal
+        # An ε on the RHS is treated as an ε move straight to the item after it, as it was in the NFA
+        closure_of: dict[NonTerminal, frozenset[int]] = {}
+        for B in self.nonterminals_order:
+            added: set[int] = set()
+            worklist = [first_item[production] for production in self.P[B]]
+            while worklist:
+                i = worklist.pop()
+                if i in added:
+                    continue
+                added.add(i)
+                X = symbol_after_dot[i]
+                if isinstance(X, NonTerminal):
+                    worklist.extend(first_item[production] for production in self.P[X])
+                elif X == epsilon:
+                    worklist.append(i + 1)
+            closure_of[B] = frozenset(added)
+
+        def closure(kernel: frozenset[int]) -> set[int]:
+            closed = set(kernel)
+            for i in kernel:
+                X = symbol_after_dot[i]
+                if isinstance(X, NonTerminal):
+                    closed |= closure_of[X]
+                elif X == epsilon:
+                    closed.add(i + 1)
+            return closed
+
+        # BFS from the start state, going through symbols in the order given,
+        # which numbers the states in the order they're presented in the notes
+        start_kernel = frozenset({first_item[self.starting_prod]})
+        kernel_ids: dict[frozenset[int], int] = {start_kernel: 0}
+        closures: list[set[int]] = [closure(start_kernel)]
+        transitions: list[dict[Symbol, int]] = []
+        for closed in closures:
+            goto_kernels: dict[Symbol, set[int]] = {}
+            for i in closed:
+                X = symbol_after_dot[i]
+                if X is not None and X != epsilon:
+                    goto_kernels.setdefault(X, set()).add(i + 1)
+            row: dict[Symbol, int] = {}
+            for X in symbols:
+                if X not in goto_kernels:
+                    continue
+                kernel = frozenset(goto_kernels[X])
+                if kernel not in kernel_ids:
+                    kernel_ids[kernel] = len(closures)
+                    closures.append(closure(kernel))
+                row[X] = kernel_ids[kernel]
+            transitions.append(row)
+
+        # The empty state is where everything else goes, and it's always the last one
+        # (because it's not in the notes and I didn't want to reorder)
+        dfa_state_list = [frozenset(items[i] for i in closed) for closed in closures]
+        dead = len(dfa_state_list)
+        dfa_state_list.append(frozenset())
+        transitions.append({})
 
-        nfa: TypedNFA[LR0_Item, Symbol, None] = TypedNFA(
-            Q,
+        table: TransitionTable[frozenset[LR0_Item], Symbol] = TransitionTable(
+            dfa_state_list,
+            symbols,
+            [[row.get(X, dead) for X in symbols] for row in transitions],
+            dead,
+        )
+        dfa: DFA[frozenset[LR0_Item], Symbol, None] = DFA(
+            set(dfa_state_list),
             Sigma,
-            lambda q, c: transition_dict[q][epsilon]
-            if c == ""
-            else transition_dict[q][c],
-            q0,
-            Q,
-            epsilon,
+            table.delta,
+            dfa_state_list[0],
+            set(dfa_state_list[:-1]),
+            table=table,
         )
-        dfa: DFA[frozenset[LR0_Item], Symbol, None] = DFA.fromNFA(nfa)
+        setattr(dfa, "state_list", dfa_state_list)
+        # So that finding a state's number doesn't need dfa_state_list.index
+        setattr(dfa, "state_ids", table.state_ids)
 
-        dfa_state_list: list[frozenset[LR0_Item]] = []
-        unsorted_dfa_states = list(dfa.Q)
+        self._lr0_transitions = transitions
+        self._lr0_dfa = dfa
+        return self._lr0_dfa
 
-        dfa_state_list.append(dfa.q_0)
-        unsorted_dfa_states.remove(dfa.q_0)
+    @property
+    def slr1_action(self) -> dict[int, dict[Terminal, Optional[LR0_Action]]]:
+        """Reduce by A -> α on anything that can follow A anywhere"""
+        if self._slr1_action is None:
+            self._slr1_action = self.action_table(
+                self.lr0_states(),
+                self.lr0_transitions(),
+                lambda i, prod: self.follow[prod.LHS],
+            )
+        return self._slr1_action
 
-        unsorted_dfa_states.remove(frozenset())  # We handle this one at the end
+    @property
+    def slr1_action_lists(self) -> dict[int, dict[Terminal, list[LR0_Action]]]:
+        """slr1_action but with every action for each cell, so it still works if the grammar isn't SLR(1)"""
+        if self._slr1_action_lists is None:
+            self._slr1_action_lists = self.action_lists(
+                self.lr0_states(),
+                self.lr0_transitions(),
+                lambda i, prod: self.follow[prod.LHS],
+            )
+        return self._slr1_action_lists
 
-        worklist: list[frozenset[LR0_Item]] = [dfa.q_0]
-        while len(unsorted_dfa_states) > 0:
-            assert len(worklist) > 0
-            work_state = worklist[0]
-            worklist = worklist[1:]
-            for symbol in self.nonterminals_order + self.terminals_order:
-                if (dfa_state_prime := dfa.delta(work_state, symbol)) != frozenset():
-                    if dfa_state_prime not in dfa_state_list:
-                        dfa_state_list.append(dfa_state_prime)
-                        unsorted_dfa_states.remove(dfa_state_prime)
-                        worklist.append(dfa_state_prime)
+    @property
+    def lalr1_action_lists(self) -> dict[int, dict[Terminal, list[LR0_Action]]]:
+        """lalr1_action but with every action for each cell"""
+        if self._lalr1_action_lists is None:
+            lookaheads = self.lalr1_lookaheads
+            self._lalr1_action_lists = self.action_lists(
+                self.lr0_states(),
+                self.lr0_transitions(),
+                lambda i, prod: lookaheads[(i, prod)],
+            )
+        return self._lalr1_action_lists
 
-        assert len(unsorted_dfa_states) == 0
-        # Work list might have stuff in, but as we've got all the states already that doesn't matter
+    @property
+    def lalr1_action(self) -> dict[int, dict[Terminal, Optional[LR0_Action]]]:
+        """The same states as SLR(1), but only reduce by A -> α on what can follow A in that particular state"""
+        if self._lalr1_action is None:
+            lookaheads = self.lalr1_lookaheads
+            self._lalr1_action = self.action_table(
+                self.lr0_states(),
+                self.lr0_transitions(),
+                lambda i, prod: lookaheads[(i, prod)],
+            )
+        return self._lalr1_action
 
-        # This is always the last 1 (because it's not in the notes and I didn't want to reorder)
-        dfa_state_list.append(frozenset())
+    @property
+    def lalr1_goto(self) -> dict[int, dict[NonTerminal, Optional[int]]]:
+        # LALR(1) doesn't change the states, just which reductions happen in them
+        return self.slr1_goto
 
-        setattr(dfa, "state_list", dfa_state_list)
+    def lr0_states(self) -> list[frozenset[LR0_Item]]:
+        dfa = self.lr0_dfa
+        assert hasattr(dfa, "state_list")
+        return dfa.state_list
 
-        self._lr0_dfa = dfa
-        return self._lr0_dfa
+    def lr0_transitions(self) -> list[dict[Symbol, int]]:
+        """lr0_transitions()[i][X] is the number of the state you go to from state i on X, if there is one"""
+        _ = self.lr0_dfa
+        assert self._lr0_transitions is not None
+        return self._lr0_transitions
 
     @property
-    def slr1_action(self) -> dict[int, dict[Terminal, Optional[LR0_Action]]]:
+    def lalr1_lookaheads(self) -> Mapping[tuple[int, Production], set[Terminal]]:
+        """The LALR(1) lookahead set of each reduction, keyed by (state number, production),
+        found with DeRemer and Pennello's algorithm, Efficient Computation of LALR(1) Look-Ahead Sets.
+        Rather than following A everywhere, it tracks what follows each transition (p, A) on a nonterminal,
+        i.e. what can come next after we've done the GOTO from state p on A:
+            DR(p, A) are the terminals that can be shifted straight after it
+            (p, A) reads (r, C) if we can GOTO on a nullable C straight after it, so what C can be followed by counts too
+            (p, A) includes (p', B) if B -> βAγ with γ nullable, and p' goes to p on β, so A can be followed by what B can
+        and then the lookaheads of the reduction by A -> ω in state q are the Follows of the (p, A) where p goes to q on ω
+        """
+        if self._lalr1_lookaheads is not None:
+            return self._lalr1_lookaheads
+
         dfa = self.lr0_dfa
         assert hasattr(dfa, "state_list")
         states: list[frozenset[LR0_Item]] = dfa.state_list
+        transitions = self.lr0_transitions()
+        assert self.starting_prod is not None
+        accept_item = LR0_Item(self.starting_prod, len(self.starting_prod))
+
+        # The transitions (p, A) get numbered, and the relations are between the numbers,
+        # because there can be a lot of them and hashing the tuples adds up
+        nonterminal_transitions: list[tuple[int, NonTerminal]] = []
+        transition_ids: list[dict[NonTerminal, int]] = []
+        for p in range(len(states)):
+            transition_ids.append({})
+            for A in transitions[p]:
+                if isinstance(A, NonTerminal):
+                    transition_ids[p][A] = len(nonterminal_transitions)
+                    nonterminal_transitions.append((p, A))
+        dollar_bit = 1 << self.terminal_ids[dollar]
+
+        def direct_reads(x: int) -> int:
+            p, A = nonterminal_transitions[x]
+            r = transitions[p][A]
+            dr = 0
+            for t in transitions[r]:
+                if isinstance(t, Terminal):
+                    dr |= 1 << self.terminal_ids[t]
+            if accept_item in states[r]:
+                dr |= dollar_bit
+            return dr
+
+        def reads(x: int) -> list[int]:
+            p, A = nonterminal_transitions[x]
+            r = transitions[p][A]
+            return [
+                transition_ids[r][C]
+                for C in transitions[r]
+                if isinstance(C, NonTerminal) and self.is_nullable(C)
+            ]
+
+        includes: list[set[int]] = [set() for _ in nonterminal_transitions]
+        lookback: dict[tuple[int, Production], set[int]] = {}
+        for x, (p_prime, B) in enumerate(nonterminal_transitions):
+            for production in self.P[B]:
+                q = p_prime
+                for i, X in enumerate(production.RHS):
+                    if (
+                        isinstance(X, NonTerminal)
+                        and self.first_bits_of(production.RHS, i + 1) & self.epsilon_bit
+                    ):
+                        includes[transition_ids[q][X]].add(x)
+                    q = transitions[q][X]
+                lookback.setdefault((q, production), set()).add(x)
+
+        ids = range(len(nonterminal_transitions))
+        read = digraph(ids, reads, direct_reads)
+        follow = digraph(ids, lambda x: includes[x], lambda x: read[x])
+
+        lookahead_bits: dict[tuple[int, Production], int] = {}
+        for i, state in enumerate(states):
+            for item in state:
+                if item.symbol_after_dot() is None:
+                    bits = 0
+                    for x in lookback.get((i, item.production), set()):
+                        bits |= follow[x]
+                    lookahead_bits[(i, item.production)] = bits
+        self._lalr1_lookaheads = TerminalSets(lookahead_bits, self.terminal_list)
+        return self._lalr1_lookaheads
+
+    @property
+    def lr1_action(self) -> dict[int, dict[Terminal, Optional[LR0_Action]]]:
+        """The ACTION table for lr1_automaton, i.e. LR(1) with the states merged where that doesn't cause conflicts"""
+        if self._lr1_action is None:
+            states, transitions = self.lr1_automaton()
+            lookaheads = {
+                (i, item.production): set(item.lookaheads)
+                for i, state in enumerate(states)
+                for item in state
+                if item.symbol_after_dot() is None
+            }
+            self._lr1_action = self.action_table(
+                states, transitions, lambda i, prod: lookaheads[(i, prod)]
+            )
+        return self._lr1_action
+
+    @property
+    def lr1_goto(self) -> dict[int, dict[NonTerminal, Optional[int]]]:
+        if self._lr1_goto is None:
+            _, transitions = self.lr1_automaton()
+            self._lr1_goto = self.goto_table(transitions)
+        return self._lr1_goto
+
+    def lr1_closure_lookaheads(
+        self, B: NonTerminal
+    ) -> dict[NonTerminal, tuple[set[Terminal], bool]]:
+        """What the closure of an item [A -> α⋅Bβ, L] adds, apart from the items themselves.
+        For each C with items [C -> ⋅γ] in it, it's the lookaheads the closure gives them regardless of L,
+        and whether the lookaheads of B get passed down to them (which they do if what's after them is nullable).
+        It only depends on B, so doing this once per nonterminal saves working out the closure from scratch in every state"""
+        result: dict[NonTerminal, tuple[set[Terminal], bool]] = {B: (set(), True)}
+        worklist = [B]
+        while worklist:
+            X = worklist.pop()
+            spontaneous, passes = result[X]
+            for production in self.P[X]:
+                if len(production.RHS) == 0 or not isinstance(
+                    C := production.RHS[0], NonTerminal
+                ):
+                    continue
+                beta_bits = self.first_bits_of(production.RHS, 1)
+                nullable = bool(beta_bits & self.epsilon_bit)
+                new_spontaneous = self.terminal_set(beta_bits & ~self.epsilon_bit)
+                if nullable:
+                    new_spontaneous |= spontaneous
+                new_passes = passes and nullable
+                old_spontaneous, old_passes = result.get(C, (set(), False))
+                # C's items are in the closure even if they don't get any lookaheads, e.g. if β can't produce anything
+                if (
+                    C not in result
+                    or not new_spontaneous <= old_spontaneous
+                    or new_passes > old_passes
+                ):
+                    result[C] = (
+                        old_spontaneous | new_spontaneous,
+                        old_passes or new_passes,
+                    )
+                    worklist.append(C)
+        return result
+
+    def lr1_automaton(
+        self, merge: bool = True
+    ) -> tuple[list[frozenset[LR1_Item]], list[dict[Symbol, int]]]:
+        """The LR(1) automaton, as its states and transitions[i][X] = the state you go to from state i on X.
+        Canonical LR(1) has loads more states than LR(0), because states with the same items get split
+        whenever their lookaheads differ. So if {merge} then we use Pager's weak compatibility test
+        (A Practical General Method for Constructing LR(k) Parsers) to merge a new state into an existing one
+        with the same items whenever that can't introduce a reduce/reduce conflict that LR(1) wouldn't have.
+        Then it's the same size as LALR(1) for grammars that are LALR(1), and only splits states where it has to.
+        States are identified by their kernels, with the lookaheads as a dict alongside,
+        and the closure is only expanded when we need to know what a state goes to."""
+        if merge in self._lr1_automata:
+            return self._lr1_automata[merge]
+
+        assert self.starting_prod is not None
+        closure_lookaheads = {B: self.lr1_closure_lookaheads(B) for B in self.N}
+
+        def closure(
+            kernel: dict[LR0_Item, set[Terminal]],
+        ) -> dict[LR0_Item, set[Terminal]]:
+            items = {item: set(lookaheads) for item, lookaheads in kernel.items()}
+            added: dict[NonTerminal, set[Terminal]] = {}
+            for item, lookaheads in kernel.items():
+                B = item.symbol_after_dot()
+                if not isinstance(B, NonTerminal):
+                    continue
+                beta_bits = self.first_bits_of(
+                    item.production.RHS, item.dot_location + 1
+                )
+                passed = self.terminal_set(beta_bits & ~self.epsilon_bit)
+                if beta_bits & self.epsilon_bit:
+                    passed |= lookaheads
+                for C, (spontaneous, passes) in closure_lookaheads[B].items():
+                    added.setdefault(C, set()).update(
+                        spontaneous | passed if passes else spontaneous
+                    )
+            for C, lookaheads in added.items():
+                for production in self.P[C]:
+                    items.setdefault(LR0_Item(production, 0), set()).update(lookaheads)
+            return items
+
+        def weakly_compatible(
+            a: dict[LR0_Item, set[Terminal]], b: dict[LR0_Item, set[Terminal]]
+        ) -> bool:
+            """Merging a and b can only cause a conflict between items i and j if i's lookaheads in one of them
+            overlap with j's in the other, and it's not a conflict LR(1) would have had anyway"""
+            items = list(a)
+            for x, i in enumerate(items):
+                for j in items[x + 1 :]:
+                    if (
+                        (a[i] & b[j] or a[j] & b[i])
+                        and not a[i] & a[j]
+                        and not b[i] & b[j]
+                    ):
+                        return False
+            return True
+
+        kernels: list[dict[LR0_Item, set[Terminal]]] = []
+        states_with_core: dict[frozenset[LR0_Item], list[int]] = {}
+        transitions: list[dict[Symbol, int]] = []
+        worklist: deque[int] = deque()
+        queued: set[int] = set()
+
+        def add(kernel: dict[LR0_Item, set[Terminal]]) -> int:
+            core = frozenset(kernel)
+            for i in states_with_core.get(core, []):
+                if kernels[i] == kernel:
+                    return i
+                if merge and weakly_compatible(kernels[i], kernel):
+                    if any(
+                        not lookaheads <= kernels[i][item]
+                        for item, lookaheads in kernel.items()
+                    ):
+                        # The lookaheads have grown, so what it goes to will need updating too
+                        for item, lookaheads in kernel.items():
+                            kernels[i][item] |= lookaheads
+                        if i not in queued:
+                            queued.add(i)
+                            worklist.append(i)
+                    return i
+            kernels.append(
+                {item: set(lookaheads) for item, lookaheads in kernel.items()}
+            )
+            transitions.append({})
+            states_with_core.setdefault(core, []).append(len(kernels) - 1)
+            queued.add(len(kernels) - 1)
+            worklist.append(len(kernels) - 1)
+            return len(kernels) - 1
+
+        add({LR0_Item(self.starting_prod, 0): {dollar}})
+        while worklist:
+            i = worklist.popleft()
+            queued.remove(i)
+            goto_kernels: dict[Symbol, dict[LR0_Item, set[Terminal]]] = {}
+            for item, lookaheads in closure(kernels[i]).items():
+                X = item.symbol_after_dot()
+                if X is not None:
+                    goto_kernels.setdefault(X, {}).setdefault(
+                        item.item_after_dot(), set()
+                    ).update(lookaheads)
+            transitions[i] = {X: add(kernel) for X, kernel in goto_kernels.items()}
+
+        # Merging can leave states that nothing goes to any more, so renumber the ones that are left
+        # in the same order as the LR(0) states, a BFS from the start state going through the symbols in order
+        symbols: list[Symbol] = [*self.nonterminals_order, *self.terminals_order]
+        state_ids = {0: 0}
+        order = [0]
+        for i in order:
+            for X in symbols:
+                if X in transitions[i] and transitions[i][X] not in state_ids:
+                    state_ids[transitions[i][X]] = len(order)
+                    order.append(transitions[i][X])
+
+        states = [
+            frozenset(
+                LR1_Item(item.production, item.dot_location, frozenset(lookaheads))
+                for item, lookaheads in closure(kernels[i]).items()
+            )
+            for i in order
+        ]
+        renumbered = [
+            {X: state_ids[j] for X, j in transitions[i].items()} for i in order
+        ]
+        self._lr1_automata[merge] = (states, renumbered)
+        return self._lr1_automata[merge]
 
+    def action_lists(
+        self,
+        states: Sequence[Iterable[LR0_Item]],
+        transitions: list[dict[Symbol, int]],
+        lookaheads: Callable[[int, Production], set[Terminal]],
+    ) -> dict[int, dict[Terminal, list[LR0_Action]]]:
+        """Every action for an automaton, reducing by prod in state i on lookaheads(i, prod).
+        Conflicts are just cells with more than one action in, which is what glr_parser wants"""
         action_list_table: dict[int, dict[Terminal, list[LR0_Action]]] = {
             i: {t: [] for t in self.T | {dollar}} for i in range(len(states))
         }
@@ -472,17 +1061,26 @@ class CFG:
                 actions.extend(item.actions)
             for action in actions:
                 if isinstance(action, LR0_Shift):
-                    new_action = LR0_Shift(
-                        action.t, states.index(dfa.delta(state, action.t))
-                    )
+                    new_action = LR0_Shift(action.t, transitions[i][action.t])
                     action_list_table[i][action.t].append(new_action)
                 else:
                     assert isinstance(action, LR0_Reduce), action
                     if action.prod == self.starting_prod:
                         action_list_table[i][dollar].append(LR0_Accept())
                         continue
-                    for t in self.follow[action.prod.LHS]:
+                    for t in lookaheads(i, action.prod):
                         action_list_table[i][t].append(action)
+        return action_list_table
+
+    def action_table(
+        self,
+        states: Sequence[Iterable[LR0_Item]],
+        transitions: list[dict[Symbol, int]],
+        lookaheads: Callable[[int, Production], set[Terminal]],
+    ) -> dict[int, dict[Terminal, Optional[LR0_Action]]]:
+        """The ACTION table for an automaton, reducing by prod in state i on lookaheads(i, prod)
+        and printing any conflicts"""
+        action_list_table = self.action_lists(states, transitions, lookaheads)
 
         action_table: dict[int, dict[Terminal, Optional[LR0_Action]]] = {
             i: {t: None for t in self.T | {dollar}} for i in range(len(states))
@@ -556,20 +1154,19 @@ class CFG:
 
     @property
     def slr1_goto(self) -> dict[int, dict[NonTerminal, Optional[int]]]:
-        dfa = self.lr0_dfa
-        assert hasattr(dfa, "state_list")
-
-        goto_table: dict[int, dict[NonTerminal, Optional[int]]] = {
-            i: {n: None for n in self.N} for i in range(len(dfa.state_list))
+        if self._slr1_goto is None:
+            self._slr1_goto = self.goto_table(self.lr0_transitions())
+        return self._slr1_goto
+
+    def goto_table(
+        self, transitions: list[dict[Symbol, int]]
+    ) -> dict[int, dict[NonTerminal, Optional[int]]]:
+        """The GOTO table for an automaton, which is just its transitions on nonterminals"""
+        return {
+            i: {n: row.get(n) for n in self.nonterminals_order}
+            for i, row in enumerate(transitions)
         }
 
-        for i, state in enumerate(dfa.state_list):
-            for n in self.N:
-                if (q_prime := dfa.delta(state, n)) != frozenset():
-                    goto_table[i][n] = dfa.state_list.index(q_prime)
-
-        return goto_table
-
     def print_slr1_goto(self) -> None:  # pragma: no cover
         rows: list[list[str]] = []
         rows.append([""] + [str(n) for n in self.nonterminals_order])
@@ -1,35 +1,192 @@
 from cfg import CFG, g3_prime
-from common import Symbol, NonTerminal, Terminal, dollar, epsilon
+from common import Symbol, NonTerminal, Terminal, Production, dollar, epsilon
+from packed_tables import ParseError
+
+from array import array
+from collections.abc import Iterable
+from functools import partial
+from typing import Any, Callable, Optional
+
+NO_RULE = -1
+
+
+class ParseTree:
+    """What Parser.parse gives you if you don't give it any semantic actions,
+    {production} is the one that was predicted and {children} are the trees and tokens for its RHS, without any εs"""
+
+    def __init__(self, production: Production, children: list[Any]):
+        self.production = production
+        self.children = children
+
+    def __str__(self) -> str:
+        return f"{self.production.LHS}({', '.join(str(c) for c in self.children)})"
+
+    def __repr__(self) -> str:
+        return str(self)
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, ParseTree)
+            and self.production == other.production
+            and self.children == other.children
+        )
 
 
 class Parser:
+    """An LL(1) parser, with CFG.ll1_parse_table turned into ints when it's made so that each step is a few array lookups.
+    Symbols are numbered with the terminals first and then the nonterminals,
+    so the stack is a list of ints and whether the top is a terminal is just a comparison.
+    Each prediction also pushes a marker under the RHS, which is number of symbols + the production number,
+    and when that's popped everything for the RHS has been parsed so we can do its semantic action.
+    Nothing about a parse is kept on the Parser, so one of them can parse as many inputs as you like."""
+
     def __init__(self, cfg: CFG):
         self.cfg = cfg
-        self.stack: list[Symbol] = [cfg.E]
-
-    def parse(self, tokens: list[Terminal]) -> None:
-        offset = 0
-        tokens.append(dollar)
-        while (X := self.stack.pop()) != dollar:
-            a = tokens[offset]
-            if X == a:
-                print(f"Consume {a}")
-                offset += 1
-            else:
-                assert isinstance(X, NonTerminal)
-                productions = list(self.cfg.ll1_parse_table[X][a])
-                assert len(productions) != 0, ("Parse Error - no rule", tokens, offset)
-                assert len(productions) == 1, (
-                    "Parse Error - ambuguous situation",
-                    tokens,
-                    offset,
-                    productions,
+        self.terminals = cfg.terminals_order + (
+            [] if dollar in cfg.terminals_order else [dollar]
+        )
+        self.nonterminals = cfg.nonterminals_order
+        self.productions = [prod for n in self.nonterminals for prod in cfg.P[n]]
+
+        self.terminal_ids = {t: i for i, t in enumerate(self.terminals)}
+        num_terminals = len(self.terminals)
+        symbol_ids: dict[Symbol, int] = {t: i for i, t in enumerate(self.terminals)}
+        for i, n in enumerate(self.nonterminals):
+            symbol_ids[n] = num_terminals + i
+        production_ids = {prod: p for p, prod in enumerate(self.productions)}
+        self.marker_base = num_terminals + len(self.nonterminals)
+
+        # table[n * len(terminals) + t] is the production to predict for nonterminal n on terminal t, or NO_RULE
+        self.table = array("i", [NO_RULE] * (len(self.nonterminals) * num_terminals))
+        conflicts = []
+        for n, row in cfg.ll1_parse_table.items():
+            for t, prods in row.items():
+                if len(prods) > 1:
+                    conflicts.append((n, t, prods))
+                elif len(prods) == 1:
+                    (prod,) = prods
+                    i = (symbol_ids[n] - num_terminals) * num_terminals
+                    self.table[i + self.terminal_ids[t]] = production_ids[prod]
+        assert len(conflicts) == 0, ("Grammar isn't LL(1)", conflicts)
+
+        # What to push for each production, i.e. its marker and then its RHS backwards, and how many values it makes
+        self.pushes = [
+            [self.marker_base + p]
+            + [symbol_ids[s] for s in reversed(prod.RHS) if s != epsilon]
+            for p, prod in enumerate(self.productions)
+        ]
+        self.lengths = [len(push) - 1 for push in self.pushes]
+        self.start = symbol_ids[cfg.E]
+
+    def valid_terminals(self, x: int) -> list[Terminal]:
+        """The terminals nonterminal number {x} can start with"""
+        num_terminals = len(self.terminals)
+        row = (x - num_terminals) * num_terminals
+        return [
+            t for i, t in enumerate(self.terminals) if self.table[row + i] != NO_RULE
+        ]
+
+    def parse(
+        self,
+        tokens: Iterable[Terminal],
+        semantic_actions: Optional[
+            dict[NonTerminal, Callable[[list[Any]], Any]]
+        ] = None,
+        trace: Optional[Callable[[str], None]] = None,
+        production_actions: Optional[
+            dict[Production, Callable[[list[Any]], Any]]
+        ] = None,
+    ) -> Any:
+        """Parses {tokens}, which can be any iterable, and which we only take from as we need them.
+        When they run out we carry on with $, so it doesn't matter whether they end with one.
+        Each time a production's RHS has been parsed, the semantic action for its LHS gets called with the values
+        of the RHS, which are the tokens themselves for terminals, and we return the value for the start symbol.
+        Without any semantic actions you get a ParseTree.
+        If there's a {trace} it gets called with a line for each Predict and Consume.
+        {production_actions} are actions for each production rather than for each LHS,
+        and are used instead if they're there, e.g. the ones from cfg_transforms.Transformation"""
+        actions: list[Callable[[list[Any]], Any]]
+        if production_actions is not None:
+            actions = [production_actions[prod] for prod in self.productions]
+        elif semantic_actions is None:
+            actions = [partial(ParseTree, prod) for prod in self.productions]
+        else:
+            actions = [semantic_actions[prod.LHS] for prod in self.productions]
+        table = self.table
+        pushes = self.pushes
+        lengths = self.lengths
+        terminal_ids = self.terminal_ids
+        num_terminals = len(self.terminals)
+        marker_base = self.marker_base
+
+        source = iter(tokens)
+        stack = [self.start]
+        values: list[Any] = []
+        source_index = 0
+
+        a = next(source, dollar)
+        t = terminal_ids.get(a, -1)
+        while stack:
+            x = stack.pop()
+            if x < num_terminals:
+                if x != t:
+                    raise ParseError(
+                        "Unexpected token, unable to proceed"
+                        if t >= 0
+                        else "Unexpected token, not a terminal of the grammar",
+                        source_index,
+                        a,
+                        [self.terminals[x]],
+                    )
+                if trace is not None:
+                    trace(f"Consume {a}")
+                values.append(a)
+                source_index += 1
+                a = next(source, dollar)
+                t = terminal_ids.get(a, -1)
+            elif x < marker_base:
+                # t < 0 is a token that isn't a terminal of the grammar, which nothing predicts on
+                p = (
+                    table[(x - num_terminals) * num_terminals + t]
+                    if t >= 0
+                    else NO_RULE
                 )
-                production = productions[0]
-                print(f"Predict {''.join(str(s) for s in production.RHS)}")
-                for s in production.RHS[::-1]:
-                    if s != epsilon:
-                        self.stack.append(s)
+                if p == NO_RULE:
+                    raise ParseError(
+                        "Unexpected token, unable to proceed"
+                        if t >= 0
+                        else "Unexpected token, not a terminal of the grammar",
+                        source_index,
+                        a,
+                        self.valid_terminals(x),
+                    )
+                if trace is not None:
+                    trace(f"Predict {''.join(str(s) for s in self.productions[p].RHS)}")
+                stack += pushes[p]
+            else:
+                p = x - marker_base
+                cut = len(values) - lengths[p]
+                children = values[cut:]
+                del values[cut:]
+                values.append(actions[p](children))
+
+        # Either the grammar or the caller can have the $, but anything after it is a mistake
+        if a != dollar:
+            raise ParseError(
+                "Unexpected tokens at end of file"
+                if t >= 0
+                else "Unexpected token, not a terminal of the grammar",
+                source_index,
+                a,
+                [dollar],
+            )
+        extra = next(source, None)
+        if extra is not None:
+            raise ParseError(
+                "Unexpected tokens at end of file", source_index + 1, extra, [dollar]
+            )
+        assert len(values) == 1, ("Error - invalid value stack", values)
+        return values[0]
 
 
 def main() -> None:
@@ -41,4 +198,4 @@ def main() -> None:
     o_bracket = Terminal("(")
     c_bracket = Terminal(")")
 
-    p.parse([o_bracket, x, plus, y, c_bracket])
+    print(p.parse([o_bracket, x, plus, y, c_bracket], trace=print))
@@ -0,0 +1,640 @@
+from cfg import CFG
+from cfg_parser import ParseTree
+from common import Symbol, NonTerminal, Production, epsilon
+from grammar_reader import Grammar
+
+from collections import deque
+from functools import partial
+from typing import Any, Callable, Optional
+
+"""Transformations that turn a grammar into an equivalent one which is easier to parse,
+mostly so that grammars written with left recursion, like g2 and slang, can be parsed by cfg_parser.Parser.
+Parsing with the new grammar still gives the values the original one would have,
+because each new production knows how to work out its value from the actions of the productions it came from.
+Like the grammar files and the LL(1) code they write A -> ε as [ε], whereas the LR code (the tables, GLRParser and
+the recursive ascent parser) wants an empty RHS, so empty_rhs turns one into the other."""
+
+# The action for a production of a grammar, which takes the values of its RHS (without any εs)
+Action = Callable[[list[Any]], Any]
+Actions = dict[Production, Action]
+# Given the Actions of the grammar it was made from, the Action for a production of the new grammar.
+# They're worked out once for each set of Actions, so parsing doesn't have to look anything up
+Rebuild = Callable[[Actions], Action]
+# A grammar part way through being transformed, i.e. the alternatives for each nonterminal and their Rebuilds
+Rules = dict[NonTerminal, list[tuple[list[Symbol], Rebuild]]]
+
+
+class Transformation:
+    """A grammar {cfg} made from {source} by one of the functions below.
+    Each production of {cfg} has a Rebuild in {rebuilds}, which is the mapping back to the productions of {source}.
+    Transformations can be chained with then, in which case {previous} is the one {source} came from."""
+
+    def __init__(
+        self,
+        source: CFG,
+        cfg: CFG,
+        rebuilds: dict[Production, Rebuild],
+        previous: Optional["Transformation"] = None,
+    ):
+        self.source = source
+        self.cfg = cfg
+        self.rebuilds = rebuilds
+        self.previous = previous
+
+    @property
+    def original(self) -> CFG:
+        """The grammar at the start of the chain"""
+        return self.source if self.previous is None else self.previous.original
+
+    def then(self, transform: Callable[[CFG], "Transformation"]) -> "Transformation":
+        """Apply {transform} to our grammar, and keep the way back to ours.
+        {transform} can make a chain of its own, in which case it's the start of that which comes after us"""
+        transformation = transform(self.cfg)
+        first = transformation
+        while first.previous is not None:
+            first = first.previous
+        first.previous = self
+        return transformation
+
+    def production_actions(
+        self,
+        semantic_actions: Optional[
+            dict[NonTerminal, Callable[[list[Any]], Any]]
+        ] = None,
+    ) -> Actions:
+        """Actions for the productions of {cfg} which give the same value as {semantic_actions} would have done
+        for the original grammar, or its ParseTree if there aren't any, for Parser.parse's {production_actions}"""
+        actions: Actions
+        if self.previous is not None:
+            actions = self.previous.production_actions(semantic_actions)
+        else:
+            actions = {
+                prod: partial(ParseTree, prod)
+                if semantic_actions is None
+                else semantic_actions[prod.LHS]
+                for prods in self.source.P.values()
+                for prod in prods
+            }
+        return {prod: rebuild(actions) for prod, rebuild in self.rebuilds.items()}
+
+
+def _values(rhs: list[Symbol]) -> int:
+    """How many values a production with {rhs} gets, because εs don't have one"""
+    return len([s for s in rhs if s != epsilon])
+
+
+def _rhs(symbols: list[Symbol]) -> list[Symbol]:
+    """{symbols} without any εs, or [ε] if that's all there was, which is how empty RHSs are written"""
+    rhs = [s for s in symbols if s != epsilon]
+    return rhs if len(rhs) > 0 else [epsilon]
+
+
+def _same(prod: Production) -> Rebuild:
+    """For a production that came from {prod} without changing"""
+
+    def rebuild(actions: Actions) -> Action:
+        return actions[prod]
+
+    return rebuild
+
+
+def _substitute(outer: Rebuild, inner: Rebuild, length: int) -> Rebuild:
+    """For A -> δγ made from A -> Bγ and B -> δ, where δ has {length} values"""
+
+    def rebuild(actions: Actions) -> Action:
+        outer_action = outer(actions)
+        inner_action = inner(actions)
+        return lambda xs: outer_action([inner_action(xs[:length])] + xs[length:])
+
+    return rebuild
+
+
+def _fill(original: Rebuild, fills: list[tuple[int, Rebuild]]) -> Rebuild:
+    """For a production with some nullable nonterminals left out,
+    {fills} is where they were (in order) and how to make their value from nothing"""
+
+    def rebuild(actions: Actions) -> Action:
+        original_action = original(actions)
+        fill_actions = [(i, fill(actions)) for i, fill in fills]
+
+        def action(xs: list[Any]) -> Any:
+            ys = list(xs)
+            for i, fill_action in fill_actions:
+                ys.insert(i, fill_action([]))
+            return original_action(ys)
+
+        return action
+
+    return rebuild
+
+
+def _unwind(units: list[Rebuild], original: Rebuild) -> Rebuild:
+    """For A -> γ made from A -> B, B -> C, ... C -> γ, where {units} are the unit productions in that order"""
+
+    def rebuild(actions: Actions) -> Action:
+        original_action = original(actions)
+        unit_actions = [unit(actions) for unit in reversed(units)]
+
+        def action(xs: list[Any]) -> Any:
+            value = original_action(xs)
+            for unit_action in unit_actions:
+                value = unit_action([value])
+            return value
+
+        return action
+
+    return rebuild
+
+
+def _fold(start: Rebuild) -> Rebuild:
+    """For A -> βA', where the value of A' is the A -> Aα we still need to do, last one first.
+    It's a loop rather than A' calling the next one, so long lists don't run out of stack"""
+
+    def rebuild(actions: Actions) -> Action:
+        start_action = start(actions)
+
+        def action(xs: list[Any]) -> Any:
+            value = start_action(xs[:-1])
+            for recursive_action, ys in reversed(xs[-1]):
+                value = recursive_action([value] + ys)
+            return value
+
+        return action
+
+    return rebuild
+
+
+def _push(recursive: Rebuild) -> Rebuild:
+    """For A' -> αA', made from A -> Aα"""
+
+    def rebuild(actions: Actions) -> Action:
+        recursive_action = recursive(actions)
+
+        def action(xs: list[Any]) -> list[tuple[Action, list[Any]]]:
+            pending = xs[-1]
+            pending.append((recursive_action, xs[:-1]))
+            return pending
+
+        return action
+
+    return rebuild
+
+
+def _nothing(actions: Actions) -> Action:
+    """For A' -> ε"""
+    return lambda xs: []
+
+
+def _choose(i: int) -> Rebuild:
+    """For A' -> β, where A -> αβ was factored into A -> αA'.
+    We don't have the values for α yet, so the value of A' is which of its alternatives it was and the values for β"""
+    return lambda actions: lambda xs: (i, xs)
+
+
+def _apply(originals: list[Rebuild]) -> Rebuild:
+    """For A -> αA', where {originals} are for the alternatives A -> αβ that A' is the βs of"""
+
+    def rebuild(actions: Actions) -> Action:
+        original_actions = [original(actions) for original in originals]
+
+        def action(xs: list[Any]) -> Any:
+            i, ys = xs[-1]
+            return original_actions[i](xs[:-1] + ys)
+
+        return action
+
+    return rebuild
+
+
+def _distinct(
+    alternatives: list[tuple[list[Symbol], Rebuild]],
+) -> list[tuple[list[Symbol], Rebuild]]:
+    """{alternatives} without the repeats, which would only make the grammar ambiguous"""
+    seen: set[tuple[Symbol, ...]] = set()
+    distinct = []
+    for rhs, rebuild in alternatives:
+        if tuple(rhs) not in seen:
+            seen.add(tuple(rhs))
+            distinct.append((rhs, rebuild))
+    return distinct
+
+
+def _rules(cfg: CFG) -> tuple[list[NonTerminal], Rules]:
+    """The productions of {cfg} for the transformations to work on, with empty RHSs written as [ε],
+    so they take grammars written for the LR code, e.g. from empty_rhs, as well.
+    If CFG added S -> E then that's left alone, so that the new grammar can have it too"""
+    order = [n for n in cfg.nonterminals_order if n != cfg.E or cfg.E == cfg.original_E]
+    rules: Rules = {
+        n: [(_rhs(prod.RHS), _same(prod)) for prod in cfg.P[n]] for n in order
+    }
+    return order, rules
+
+
+def _fresh(rules: Rules, cfg: CFG, base: NonTerminal, suffix: str) -> NonTerminal:
+    """A new nonterminal, named after the one it's helping"""
+    name = f"{base}_{suffix}"
+    i = 1
+    while NonTerminal(name) in rules or NonTerminal(name) in cfg.N:
+        i += 1
+        name = f"{base}_{suffix}{i}"
+    return NonTerminal(name)
+
+
+def _transformation(cfg: CFG, order: list[NonTerminal], rules: Rules) -> Transformation:
+    """Make the new grammar, without any repeated productions or nonterminals that can't be used,
+    i.e. that can't produce a string of terminals or that can't be got to from the start"""
+    start = cfg.original_E
+    productive: set[NonTerminal] = set()
+    changed = True
+    while changed:
+        changed = False
+        for n in order:
+            if n not in productive and any(
+                all(not isinstance(s, NonTerminal) or s in productive for s in rhs)
+                for rhs, _ in rules[n]
+            ):
+                productive.add(n)
+                changed = True
+
+    reachable = {start}
+    stack = [start]
+    while stack:
+        for rhs, _ in rules[stack.pop()]:
+            if all(not isinstance(s, NonTerminal) or s in productive for s in rhs):
+                for s in rhs:
+                    if isinstance(s, NonTerminal) and s not in reachable:
+                        reachable.add(s)
+                        stack.append(s)
+
+    P: dict[NonTerminal, list[list[Symbol]]] = {}
+    rebuilds: dict[Production, Rebuild] = {}
+    for n in order:
+        if n not in reachable:
+            continue
+        P[n] = []
+        for rhs, rebuild in rules[n]:
+            prod = Production(n, rhs)
+            if prod in rebuilds or not all(
+                not isinstance(s, NonTerminal) or s in productive for s in rhs
+            ):
+                continue
+            P[n].append(rhs)
+            rebuilds[prod] = rebuild
+
+    nonterminals = [n for n in order if n in reachable]
+    new = CFG(
+        set(nonterminals),
+        set(cfg.T),
+        P,
+        start,
+        terminals_order=list(cfg.terminals_order),
+        nonterminals_order=nonterminals,
+        add_unique_starting_production=cfg.E != cfg.original_E,
+    )
+    if new.E != new.original_E:
+        assert new.starting_prod is not None and cfg.starting_prod is not None
+        rebuilds[new.starting_prod] = _same(cfg.starting_prod)
+    return Transformation(cfg, new, rebuilds)
+
+
+def _left_corners(cfg: CFG) -> dict[NonTerminal, set[NonTerminal]]:
+    """The B with A -> αBβ for some nullable α, for each A"""
+    corners: dict[NonTerminal, set[NonTerminal]] = {n: set() for n in cfg.N}
+    for n, prods in cfg.P.items():
+        for prod in prods:
+            for s in prod.RHS:
+                if isinstance(s, NonTerminal):
+                    corners[n].add(s)
+                if not cfg.is_nullable(s):
+                    break
+    return corners
+
+
+def left_recursive(cfg: CFG) -> list[NonTerminal]:
+    """The nonterminals with A =>+ Aα, which unlike CFG.is_left_recursive includes going through other nonterminals"""
+    corners = _left_corners(cfg)
+    found = []
+    for n in cfg.nonterminals_order:
+        seen: set[NonTerminal] = set()
+        stack = list(corners[n])
+        while stack:
+            m = stack.pop()
+            if m == n:
+                found.append(n)
+                break
+            if m not in seen:
+                seen.add(m)
+                stack.extend(corners[m])
+    return found
+
+
+def remove_left_recursion(cfg: CFG) -> Transformation:
+    """Paull's algorithm: going through the nonterminals in order, A -> Bγ for B before A gets B's alternatives
+    substituted in, so that the only left recursion left is A -> Aα, which is turned into right recursion.
+    A -> Aα | β becomes A -> βA' and A' -> αA' | ε, so the value of A' is the list of A -> Aα still to do.
+    B only gets substituted in if it can start with A, which is all that's needed and keeps the grammar small.
+    A -> A on its own is dropped, because all it can do is make the grammar ambiguous.
+    Left recursion hidden behind nullable nonterminals isn't handled, remove_epsilon_productions gets rid of that"""
+    order, rules = _rules(cfg)
+    done: list[NonTerminal] = []
+
+    def starts_with(n: NonTerminal, target: NonTerminal) -> bool:
+        seen = {n}
+        stack = [n]
+        while stack:
+            for rhs, _ in rules[stack.pop()]:
+                s = rhs[0]
+                if s == target:
+                    return True
+                if isinstance(s, NonTerminal) and s not in seen:
+                    seen.add(s)
+                    stack.append(s)
+        return False
+
+    for A in list(order):
+        # Substituting B in can leave A starting with something else that can start with A, so keep going
+        substituting = True
+        while substituting:
+            substituting = False
+            for B in done:
+                if not any(rhs[0] == B for rhs, _ in rules[A]) or not starts_with(B, A):
+                    continue
+                substituting = True
+                alternatives: list[tuple[list[Symbol], Rebuild]] = []
+                for rhs, rebuild in rules[A]:
+                    if rhs[0] != B:
+                        alternatives.append((rhs, rebuild))
+                        continue
+                    for delta, inner in rules[B]:
+                        alternatives.append(
+                            (
+                                _rhs(delta + rhs[1:]),
+                                _substitute(rebuild, inner, _values(delta)),
+                            )
+                        )
+                rules[A] = alternatives
+        done.append(A)
+
+        # Before anything else, since otherwise it'd be substituted into later nonterminals with A left at the start
+        rules[A] = [(rhs, r) for rhs, r in rules[A] if rhs != [A]]
+        recursive = [(rhs[1:], r) for rhs, r in rules[A] if rhs[0] == A]
+        others = [(rhs, r) for rhs, r in rules[A] if rhs[0] != A]
+        if len(recursive) == 0:
+            continue
+        assert len(others) > 0, ("Left recursion with nothing to start it", A)
+        A_prime = _fresh(rules, cfg, A, "prime")
+        rules[A] = [(_rhs(rhs + [A_prime]), _fold(r)) for rhs, r in others]
+        rules[A_prime] = [(alpha + [A_prime], _push(r)) for alpha, r in recursive] + [
+            ([epsilon], _nothing)
+        ]
+        order.insert(order.index(A) + 1, A_prime)
+
+    transformation = _transformation(cfg, order, rules)
+    remaining = left_recursive(transformation.cfg)
+    assert len(remaining) == 0, (
+        "Still left recursive, try remove_epsilon_productions first",
+        remaining,
+    )
+    return transformation
+
+
+def left_factor(
+    cfg: CFG, max_depth: int = 8, max_alternatives: int = 2000
+) -> Transformation:
+    """Alternatives of A which start the same way, A -> αβ1 | αβ2, become A -> αA' and A' -> β1 | β2.
+    If two alternatives can start with the same terminal but not the same symbol (so one starts with a nonterminal),
+    then the nonterminals they start with get their alternatives substituted in until they do.
+    That can go on forever, e.g. for grammars that aren't LL(k), so a new nonterminal isn't factored
+    any more once it's {max_depth} deep, a nonterminal doesn't get substituted into more than {max_depth} times,
+    and we stop altogether once there are {max_alternatives} alternatives.
+    Whatever conflict is left is left for the parser to report.
+    Only the nonterminals that can be got to from the start are done, since the rest get dropped anyway.
+    The grammar can't be left recursive, or substituting wouldn't finish."""
+    remaining = left_recursive(cfg)
+    assert len(remaining) == 0, (
+        "Left recursive, use remove_left_recursion first",
+        remaining,
+    )
+    order, rules = _rules(cfg)
+
+    # Substituting and factoring don't change what a nonterminal produces, so its FIRST doesn't change,
+    # and the new ones get theirs from their alternatives when they're made
+    first_bits = dict(cfg.first_bits)
+
+    def first(rhs: list[Symbol]) -> int:
+        bits = 0
+        for s in rhs:
+            if s == epsilon:
+                continue
+            symbol_bits = (
+                first_bits[s]
+                if isinstance(s, NonTerminal)
+                else cfg.symbol_first_bits(s)
+            )
+            bits |= symbol_bits & ~cfg.epsilon_bit
+            if not symbol_bits & cfg.epsilon_bit:
+                return bits
+        return bits | cfg.epsilon_bit
+
+    reachable = {cfg.original_E}
+    stack = [cfg.original_E]
+    while stack:
+        for rhs, _ in rules[stack.pop()]:
+            for s in rhs:
+                if isinstance(s, NonTerminal) and s not in reachable:
+                    reachable.add(s)
+                    stack.append(s)
+
+    depths = {n: 0 for n in order}
+    substitutions = {n: 0 for n in order}
+    # The new nonterminals, by their alternatives, so that the same ones get used again
+    tails: dict[tuple[tuple[Symbol, ...], ...], NonTerminal] = {}
+    worklist = deque(n for n in order if n in reachable)
+    while worklist:
+        if sum(len(rules[n]) for n in reachable) >= max_alternatives:
+            break
+        A = worklist.popleft()
+        if depths[A] >= max_depth:
+            continue
+
+        rules[A] = _distinct(rules[A])
+        groups: dict[Symbol, list[tuple[list[Symbol], Rebuild]]] = {}
+        for rhs, rebuild in rules[A]:
+            groups.setdefault(rhs[0], []).append((rhs, rebuild))
+
+        if any(len(group) > 1 for group in groups.values()):
+            alternatives: list[tuple[list[Symbol], Rebuild]] = []
+            for group in groups.values():
+                if len(group) == 1:
+                    alternatives += group
+                    continue
+                prefix = group[0][0]
+                for rhs, _ in group[1:]:
+                    i = 0
+                    while i < min(len(prefix), len(rhs)) and prefix[i] == rhs[i]:
+                        i += 1
+                    prefix = prefix[:i]
+                rests = [_rhs(rhs[len(prefix) :]) for rhs, _ in group]
+                key = tuple(tuple(rest) for rest in rests)
+                # Using one again is only safe if the prefix can't be empty, otherwise the grammar could lose strings,
+                # e.g. A -> BA'' where B is nullable and A'' is A would just be A -> A
+                if key in tails and not first(prefix) & cfg.epsilon_bit:
+                    tail = tails[key]
+                else:
+                    tail = _fresh(rules, cfg, A, "tail")
+                    tails[key] = tail
+                    rules[tail] = [(rest, _choose(i)) for i, rest in enumerate(rests)]
+                    first_bits[tail] = 0
+                    for rest in rests:
+                        first_bits[tail] |= first(rest)
+                    depths[tail] = depths[A] + 1
+                    substitutions[tail] = 0
+                    reachable.add(tail)
+                    order.insert(order.index(A) + 1, tail)
+                    worklist.append(tail)
+                alternatives.append((prefix + [tail], _apply([r for _, r in group])))
+            rules[A] = alternatives
+            worklist.append(A)
+            continue
+
+        # Nothing to factor, but if two alternatives can start with the same terminal,
+        # substitute for the nonterminals they start with so that they might start the same way
+        firsts = [first(rhs) & ~cfg.epsilon_bit for rhs, _ in rules[A]]
+        expand = {
+            i
+            for i in range(len(firsts))
+            for j in range(len(firsts))
+            if i != j
+            and firsts[i] & firsts[j]
+            and isinstance(rules[A][i][0][0], NonTerminal)
+        }
+        if len(expand) == 0 or substitutions[A] >= max_depth:
+            continue
+        substitutions[A] += 1
+        alternatives = []
+        for i, (rhs, rebuild) in enumerate(rules[A]):
+            if i not in expand:
+                alternatives.append((rhs, rebuild))
+                continue
+            B = rhs[0]
+            assert isinstance(B, NonTerminal), B
+            for delta, inner in rules[B]:
+                alternatives.append(
+                    (
+                        _rhs(delta + rhs[1:]),
+                        _substitute(rebuild, inner, _values(delta)),
+                    )
+                )
+        rules[A] = alternatives
+        worklist.append(A)
+
+    return _transformation(cfg, order, rules)
+
+
+def remove_epsilon_productions(cfg: CFG) -> Transformation:
+    """For each production with nullable nonterminals in its RHS, add copies with each combination of them left out,
+    and get rid of all of the A -> ε, apart from for the start symbol, because otherwise the language changes.
+    The values of the ones left out come from the shortest way they have of producing ε"""
+    order, rules = _rules(cfg)
+
+    # Going round until nothing changes finds the shortest ones first, so none of them refer to themselves
+    empty: dict[NonTerminal, Rebuild] = {}
+    changed = True
+    while changed:
+        changed = False
+        for A in order:
+            if A in empty:
+                continue
+            for rhs, rebuild in rules[A]:
+                symbols = [s for s in rhs if s != epsilon]
+                if all(s in empty for s in symbols):
+                    fills = [
+                        (i, empty[s])
+                        for i, s in enumerate(symbols)
+                        if isinstance(s, NonTerminal)
+                    ]
+                    empty[A] = _fill(rebuild, fills)
+                    changed = True
+                    break
+
+    for A in order:
+        alternatives: list[tuple[list[Symbol], Rebuild]] = []
+        for rhs, rebuild in rules[A]:
+            symbols = [s for s in rhs if s != epsilon]
+            optional = [
+                (i, empty[s])
+                for i, s in enumerate(symbols)
+                if isinstance(s, NonTerminal) and s in empty
+            ]
+            for combination in range(1 << len(optional)):
+                fills = [
+                    fill for j, fill in enumerate(optional) if combination >> j & 1
+                ]
+                left_out = {i for i, _ in fills}
+                kept = [s for i, s in enumerate(symbols) if i not in left_out]
+                if len(kept) == 0 and A != cfg.original_E:
+                    continue
+                alternatives.append(
+                    (_rhs(kept), _fill(rebuild, fills) if fills else rebuild)
+                )
+        rules[A] = alternatives
+
+    return _transformation(cfg, order, rules)
+
+
+def remove_unit_productions(cfg: CFG) -> Transformation:
+    """A -> B where B -> γ becomes A -> γ, following chains of them, so there are no A -> B left.
+    The value of A comes from doing the actions for each unit production on the way back up the chain"""
+    order, rules = _rules(cfg)
+
+    new_rules: Rules = {}
+    for A in order:
+        alternatives: list[tuple[list[Symbol], Rebuild]] = []
+        # The unit productions to get from A to each B we can get to
+        seen = {A}
+        queue: deque[tuple[NonTerminal, list[Rebuild]]] = deque([(A, [])])
+        while queue:
+            B, units = queue.popleft()
+            for rhs, rebuild in rules[B]:
+                if len(rhs) == 1 and isinstance(rhs[0], NonTerminal):
+                    if rhs[0] not in seen:
+                        seen.add(rhs[0])
+                        queue.append((rhs[0], units + [rebuild]))
+                elif len(units) == 0:
+                    alternatives.append((rhs, rebuild))
+                else:
+                    alternatives.append((rhs, _unwind(units, rebuild)))
+        new_rules[A] = alternatives
+
+    return _transformation(cfg, order, new_rules)
+
+
+def empty_rhs(cfg: CFG) -> Transformation:
+    """The same grammar with each A -> ε written as an empty RHS rather than [ε], for the LR code,
+    since otherwise the LR(0) automaton tries to shift the ε. The values are the same, since εs don't have one"""
+    order, rules = _rules(cfg)
+    for A in order:
+        rules[A] = [
+            ([s for s in rhs if s != epsilon], rebuild) for rhs, rebuild in rules[A]
+        ]
+    return _transformation(cfg, order, rules)
+
+
+def to_ll1(cfg: CFG) -> Transformation:
+    """Remove the left recursion and then left factor, which for g2 and slang gives an LL(1) grammar.
+    For grammars that aren't LL(k) left_factor gives up after a while, and cfg_parser.Parser reports the conflicts"""
+    return remove_left_recursion(cfg).then(left_factor)
+
+
+def main() -> None:
+    for filename in ["g2.grammar", "slang.grammar"]:
+        g = Grammar.from_file(filename, add_starting_production=True)
+        transformation = to_ll1(g.cfg)
+        for n in transformation.cfg.nonterminals_order:
+            for prod in transformation.cfg.P[n]:
+                print(prod)
+        print()
+
+
+if __name__ == "__main__":
+    main()
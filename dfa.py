@@ -2,13 +2,64 @@ from collections.abc import Callable
 from string import ascii_lowercase
 from typing import Generic, Optional, TypeVar, Union
 
-from nfa import TypedNFA
+from intervals import ClassMap
+from nfa import CompactNFA, TypedNFA
 
 StateType = TypeVar("StateType")
 TokenType = TypeVar("TokenType")
 TagType = TypeVar("TagType")
 
 
+class TransitionTable(Generic[StateType, TokenType]):
+    """A materialised transition function.
+    States are numbered by their position in {states}, and symbols by their class.
+    Symbols in the same class behave identically, so they share a column of the table,
+    classes[i] is the class of symbols[i], or if it's not given then every symbol is its own class.
+    rows[i][a] is the number of the state you get to from states[i] on a symbol in class a
+    {dead} is the number of the state you can never leave or accept from, if there is one
+    If there's a {class_map} then the symbols are characters, and the class of any character comes from that,
+    in which case {symbols} only needs one character from each class"""
+
+    def __init__(
+        self,
+        states: list[StateType],
+        symbols: list[TokenType],
+        rows: list[list[int]],
+        dead: Optional[int] = None,
+        classes: Optional[list[int]] = None,
+        class_map: Optional[ClassMap] = None,
+    ):
+        self.states = states
+        self.symbols = symbols
+        self.rows = rows
+        self.dead = dead
+        self.classes = classes if classes is not None else list(range(len(symbols)))
+        self.num_classes = max(self.classes, default=-1) + 1
+        self.class_map = class_map
+
+        self.state_ids: dict[StateType, int] = {q: i for i, q in enumerate(states)}
+        self.symbol_ids: dict[TokenType, int] = dict(zip(symbols, self.classes))
+
+        assert len(self.classes) == len(self.symbols), (self.classes, self.symbols)
+        assert len(self.rows) == len(self.states), (self.rows, self.states)
+        for row in self.rows:
+            assert len(row) == self.num_classes, (row, self.num_classes)
+        if self.dead is not None:
+            assert all(q == self.dead for q in self.rows[self.dead]), self.dead
+        if self.class_map is not None:
+            assert self.class_map.num_classes == self.num_classes, self.class_map
+
+    def symbol_class(self, a: TokenType) -> int:
+        if self.class_map is not None:
+            return self.class_map.class_of(a)  # type: ignore # Symbols are characters if there's a class_map
+        symbol_id = self.symbol_ids.get(a)
+        assert symbol_id is not None, (a, self.symbols)
+        return symbol_id
+
+    def delta(self, q: StateType, a: TokenType) -> StateType:
+        return self.states[self.rows[self.state_ids[q]][self.symbol_class(a)]]
+
+
 class DFA(Generic[StateType, TokenType, TagType]):
     def __init__(
         self,
@@ -20,6 +71,7 @@ class DFA(Generic[StateType, TokenType, TagType]):
         tags: dict[
             StateType, Optional[TagType]
         ] = {},  # Optional mapping from states to tags
+        table: Optional[TransitionTable[StateType, TokenType]] = None,
     ):
         self.Q = Q
         self.Sigma = Sigma
@@ -41,6 +93,17 @@ class DFA(Generic[StateType, TokenType, TagType]):
                 if self.tags[q] is None:
                     assert q not in self.F, q
 
+        # If we've got a table then test_string runs on state numbers rather than states
+        self.table = table
+        self.accepting: list[bool] = []
+        self.accept_tags: list[Optional[TagType]] = []
+        if self.table is not None:
+            assert set(self.table.states) == self.Q, (self.table.states, self.Q)
+            self.accepting = [q in self.F for q in self.table.states]
+            self.accept_tags = [
+                self.tags[q] if len(self.tags) else None for q in self.table.states
+            ]
+
         self.num_chars_accepted = 0
         self.last_accept_state: Optional[StateType] = None
         self.last_accept_tag: Optional[TagType] = None
@@ -62,6 +125,9 @@ class DFA(Generic[StateType, TokenType, TagType]):
         else:
             token_list = string
 
+        if self.table is not None:
+            return self.test_token_list_with_table(token_list, self.table)
+
         q = self.q_0
         num_chars_consumed = 0  # Running total
         self.num_chars_accepted = 0  # Number of chars accepted
@@ -82,6 +148,164 @@ class DFA(Generic[StateType, TokenType, TagType]):
         # We've parsed the whole token list, so check if we're in an accept state
         return q in self.F
 
+    def test_token_list_with_table(
+        self, token_list: list[TokenType], table: TransitionTable[StateType, TokenType]
+    ) -> bool:
+        """Identical to the end of test_string, but it steps through the table by state number"""
+        rows = table.rows
+        symbol_class = table.symbol_class
+        accepting = self.accepting
+
+        q = table.state_ids[self.q_0]
+        num_chars_consumed = 0  # Running total
+        self.num_chars_accepted = 0  # Number of chars accepted
+        last_accept = q if accepting[q] else None
+
+        for c in token_list:
+            q = rows[q][symbol_class(c)]
+
+            num_chars_consumed += 1
+            if accepting[q]:
+                self.num_chars_accepted = num_chars_consumed
+                last_accept = q
+
+        if last_accept is None:
+            self.last_accept_state = None
+            self.last_accept_tag = None
+        else:
+            self.last_accept_state = table.states[last_accept]
+            self.last_accept_tag = self.accept_tags[last_accept]
+
+        # We've parsed the whole token list, so check if we're in an accept state
+        return accepting[q]
+
+    def longest_prefix(
+        self, string: Union[str, list[TokenType]], start: int = 0
+    ) -> int:
+        """Runs the DFA over string[start:] without copying it, and returns the length of the
+        longest prefix that it accepts. last_accept_state and last_accept_tag are set as in test_string.
+        Stops as soon as the DFA is in the dead state, because nothing after that can be accepted,
+        so this is proportional to the length of the match rather than the length of the string"""
+        table = self.table
+        assert table is not None, "longest_prefix needs a transition table"
+        rows = table.rows
+        symbol_class = table.symbol_class
+        accepting = self.accepting
+        dead = table.dead
+
+        q = table.state_ids[self.q_0]
+        last_accept = q if accepting[q] else None
+        last_accept_position = start
+
+        position = start
+        while position < len(string) and q != dead:
+            q = rows[q][symbol_class(string[position])]  # type: ignore # str is a list of str here
+
+            position += 1
+            if accepting[q]:
+                last_accept = q
+                last_accept_position = position
+
+        self.num_chars_accepted = last_accept_position - start
+        if last_accept is None:
+            self.last_accept_state = None
+            self.last_accept_tag = None
+        else:
+            self.last_accept_state = table.states[last_accept]
+            self.last_accept_tag = self.accept_tags[last_accept]
+        return self.num_chars_accepted
+
+    def minimize(self) -> "DFA[int, TokenType, TagType]":
+        """Hopcroft's partition refinement. Returns an equivalent DFA with the fewest states,
+        numbered from 0 (the start state) in breadth first order.
+        States with different tags are never merged, so a minimised lexer still emits the same tokens."""
+        table = self.table
+        assert table is not None, "minimize needs a transition table"
+        rows = table.rows
+        symbol_range = range(table.num_classes)
+
+        # Only the states we can actually get to matter
+        reachable = [table.state_ids[self.q_0]]
+        seen = set(reachable)
+        for q in reachable:
+            for q_prime in rows[q]:
+                if q_prime not in seen:
+                    seen.add(q_prime)
+                    reachable.append(q_prime)
+
+        # Start off with a block for each (accepting, tag) combination
+        initial_blocks: dict[tuple[bool, Optional[TagType]], set[int]] = {}
+        for q in reachable:
+            key = (
+                self.accepting[q],
+                self.accept_tags[q] if self.accepting[q] else None,
+            )
+            initial_blocks.setdefault(key, set()).add(q)
+        blocks = list(initial_blocks.values())
+        block_of = {q: i for i, block in enumerate(blocks) for q in block}
+
+        # inverse[a][q] is all the states that go to q on class a
+        inverse: list[dict[int, list[int]]] = [{} for _ in symbol_range]
+        for q in reachable:
+            for a in symbol_range:
+                inverse[a].setdefault(rows[q][a], []).append(q)
+
+        work_list = set(range(len(blocks)))
+        while len(work_list):
+            splitter = set(blocks[work_list.pop()])
+            for a in symbol_range:
+                # Everything that goes into the splitter on a, grouped by the block it's in
+                predecessors: dict[int, set[int]] = {}
+                for q in splitter:
+                    for p in inverse[a].get(q, []):
+                        predecessors.setdefault(block_of[p], set()).add(p)
+
+                for i, inside in predecessors.items():
+                    if len(inside) == len(blocks[i]):
+                        continue
+                    # Block i has some states that go into the splitter and some that don't, so split it
+                    outside = blocks[i] - inside
+                    blocks[i] = inside
+                    blocks.append(outside)
+                    for q in outside:
+                        block_of[q] = len(blocks) - 1
+                    if i in work_list or len(outside) <= len(inside):
+                        work_list.add(len(blocks) - 1)
+                    else:
+                        work_list.add(i)
+
+        # Number the blocks in breadth first order so that the output doesn't depend on set ordering
+        start = block_of[table.state_ids[self.q_0]]
+        block_order = [start]
+        new_ids = {start: 0}
+        new_rows: list[list[int]] = []
+        while len(new_rows) < len(block_order):
+            q = next(iter(blocks[block_order[len(new_rows)]]))
+            row: list[int] = []
+            for q_prime in rows[q]:
+                if (block := block_of[q_prime]) not in new_ids:
+                    new_ids[block] = len(block_order)
+                    block_order.append(block)
+                row.append(new_ids[block])
+            new_rows.append(row)
+
+        representatives = [next(iter(blocks[block])) for block in block_order]
+        Q = list(range(len(block_order)))
+        F = {i for i in Q if self.accepting[representatives[i]]}
+        tags: dict[int, Optional[TagType]] = {}
+        if len(self.tags):
+            tags = {
+                i: self.accept_tags[representatives[i]] if i in F else None for i in Q
+            }
+        dead = None if table.dead is None else new_ids[block_of[table.dead]]
+
+        minimised_table = TransitionTable(
+            Q, table.symbols, new_rows, dead, table.classes, table.class_map
+        )
+        return DFA(
+            set(Q), self.Sigma, minimised_table.delta, 0, F, tags, minimised_table
+        )
+
     @staticmethod
     def fromNFA(nfa: TypedNFA) -> "DFA":
         def epsilon_closure(
@@ -91,7 +315,7 @@ class DFA(Generic[StateType, TokenType, TagType]):
             stack = list(s)
             result = s.copy()
             while len(stack):
-                q, stack = stack[0], stack[1:]
+                q = stack.pop()
                 for u in delta(q, ""):
                     if u not in result:
                         result.add(u)
@@ -106,20 +330,37 @@ class DFA(Generic[StateType, TokenType, TagType]):
 
         q_0_prime = frozenset(epsilon_closure({nfa.q_0}, nfa.delta))
 
+        symbols = sorted(nfa.Sigma)
+        step: Callable[[frozenset, str], frozenset] = delta_prime
+        class_map: Optional[ClassMap] = None
+        if isinstance(nfa, CompactNFA):
+            # Same thing, but going straight to the arrays rather than through delta
+            step = nfa.subset_step
+            # And its edges are ranges of characters, so rather than going through Sigma
+            # we only need to go through one character from each class of characters the edges can tell apart
+            class_map = nfa.class_map()
+            symbols = class_map.representatives()
+
         # It's weird to compute the states after we've got the transition function
         # and start state, but because states are just sets of states it works
         # We're just computing the reachable sets here, rather than the full powerset
-        Q_prime = {q_0_prime}
-        work_list = [q_0_prime]
-        while len(work_list):
-            q = work_list[0]
-            for c in nfa.Sigma:
-                output = frozenset(delta_prime(q, c))
-                if output not in Q_prime:
-                    Q_prime.add(output)
-                    if output not in work_list:
-                        work_list.append(output)
-            work_list = work_list[1:]
+        # Each new set gets the next number, and we fill in its row of the table as we go
+        # so that delta_prime is only ever computed once per (state, class) pair
+        states: list[frozenset[str]] = [q_0_prime]
+        state_ids: dict[frozenset[str], int] = {q_0_prime: 0}
+        rows: list[list[int]] = []
+        while len(rows) < len(states):
+            q = states[len(rows)]
+            row: list[int] = []
+            for c in symbols:
+                output = step(q, c)
+                if output not in state_ids:
+                    state_ids[output] = len(states)
+                    states.append(output)
+                row.append(state_ids[output])
+            rows.append(row)
+
+        Q_prime = set(states)
 
         F_prime: set[frozenset[str]] = set()
         for S in Q_prime:
@@ -129,17 +370,20 @@ class DFA(Generic[StateType, TokenType, TagType]):
 
         tags_prime: dict[frozenset[str], Optional[TagType]] = {}
         if len(nfa.tags):
+            rankings = {s: i for i, s in enumerate(nfa.state_rankings)}
             for S in Q_prime:
-                S_list = sorted(
-                    [s for s in S if s in nfa.F],
-                    key=lambda x: nfa.state_rankings.index(x),
-                )
+                S_list = sorted([s for s in S if s in nfa.F], key=lambda x: rankings[x])
                 if S_list == []:
                     tags_prime[frozenset(S)] = None
                 else:
                     tags_prime[frozenset(S)] = nfa.tags[S_list[0]]
 
-        return DFA(Q_prime, nfa.Sigma, delta_prime, q_0_prime, F_prime, tags_prime)
+        table = TransitionTable(
+            states, symbols, rows, state_ids.get(frozenset()), class_map=class_map
+        )
+        return DFA(
+            Q_prime, nfa.Sigma, table.delta, q_0_prime, F_prime, tags_prime, table
+        )
 
 
 def main() -> None:
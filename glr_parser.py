@@ -0,0 +1,454 @@
+from cfg import CFG
+from cfg_parser import ParseTree
+from common import (
+    NonTerminal,
+    Symbol,
+    Terminal,
+    Production,
+    LR0_Shift,
+    LR0_Reduce,
+    LR0_Accept,
+    dollar,
+    epsilon,
+)
+from packed_tables import ParseError, NO_GOTO
+
+from array import array
+from collections.abc import Iterable, Iterator
+from itertools import product
+from typing import Any, Callable, Optional
+
+"""A generalised LR (Tomita) parser, for grammars that aren't LR because they're ambiguous or need more lookahead.
+It runs on CFG.slr1_action_lists or CFG.lalr1_action_lists, which keep every action for a cell rather than
+giving up on conflicts, and does all of them. The stacks are kept as a graph structured stack, where stacks that
+have got to the same state after the same number of tokens are the same node, so the work after that point is shared,
+and the parses are kept as a shared packed parse forest, where everything that derives the same tokens from the same
+nonterminal is one node however many ways it does it. On input where the tables don't have any conflicts there's
+only ever one stack and it's just an LR parser with some extra bookkeeping, so it stays linear.
+
+Like the rest of the LR code ε-productions need to be written with an empty RHS rather than [epsilon],
+which cfg_transforms.empty_rhs does for grammars that have them."""
+
+
+class ForestNode:
+    """The node of the shared packed parse forest for {symbol} deriving the tokens from {start} up to {end}.
+    Each of {families} is a production and the forest nodes and tokens for its RHS,
+    and there's more than one of them exactly where the parse is ambiguous"""
+
+    __slots__ = ("symbol", "start", "end", "families")
+
+    def __init__(self, symbol: NonTerminal, start: int, end: int):
+        self.symbol = symbol
+        self.start = start
+        self.end = end
+        self.families: list[tuple[Production, list[Any]]] = []
+
+    def __str__(self) -> str:
+        return f"{self.symbol}[{self.start}:{self.end}]"
+
+    def __repr__(self) -> str:
+        return str(self)
+
+    def _postorder(
+        self, choose: Optional[Callable[["ForestNode"], int]]
+    ) -> list["ForestNode"]:
+        """Every node under this one, children before parents, following all the families if there's no {choose}.
+        It's a loop rather than recursion so that long inputs don't run out of stack"""
+        done: set[ForestNode] = set()
+        visiting: set[ForestNode] = set()
+        order: list[ForestNode] = []
+        stack: list[tuple[ForestNode, bool]] = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                done.add(node)
+                order.append(node)
+                continue
+            if node in done:
+                continue
+            # Anything pushed since we started on it is under it, so seeing it again means it derives itself
+            assert node not in visiting, ("Cyclic parse forest, e.g. from A -> A", node)
+            visiting.add(node)
+            stack.append((node, True))
+            families = (
+                node.families if choose is None else [node.families[choose(node)]]
+            )
+            for _, children in families:
+                for child in reversed(children):
+                    if isinstance(child, ForestNode) and child not in done:
+                        stack.append((child, False))
+        return order
+
+    def count_trees(self) -> int:
+        """How many different parse trees there are in the forest, which can be exponential in its size"""
+        counts: dict[ForestNode, int] = {}
+        for node in self._postorder(None):
+            total = 0
+            for _, children in node.families:
+                ways = 1
+                for child in children:
+                    if isinstance(child, ForestNode):
+                        ways *= counts[child]
+                total += ways
+            counts[node] = total
+        return counts[self]
+
+    def size(self) -> tuple[int, int]:
+        """How many nodes there are in the forest and how many families they have between them,
+        which stays polynomial in the length of the input however many trees there are"""
+        nodes = self._postorder(None)
+        return len(nodes), sum(len(node.families) for node in nodes)
+
+    def is_ambiguous(self) -> bool:
+        return any(len(node.families) > 1 for node in self._postorder(None))
+
+    def trees(self) -> Iterator[ParseTree]:
+        """Every ParseTree in the forest, which is only sensible for small ones"""
+        for production, children in self.families:
+            options = [
+                list(child.trees()) if isinstance(child, ForestNode) else [child]
+                for child in children
+            ]
+            for combination in product(*options):
+                yield ParseTree(production, list(combination))
+
+    def evaluate(
+        self,
+        semantic_actions: Optional[
+            dict[NonTerminal, Callable[[list[Any]], Any]]
+        ] = None,
+        choose: Optional[Callable[["ForestNode"], int]] = None,
+        production_actions: Optional[
+            dict[Production, Callable[[list[Any]], Any]]
+        ] = None,
+    ) -> Any:
+        """Run the semantic actions over one of the trees, which is the same as what an LR parser would give
+        if the grammar wasn't ambiguous. {choose} picks which of a node's families to use, and by default it's
+        the first one. Without any semantic actions you get a ParseTree, like cfg_parser.Parser.parse"""
+        action: Callable[[Production, list[Any]], Any]
+        if production_actions is not None:
+            action = lambda prod, xs: production_actions[prod](xs)  # noqa: E731
+        elif semantic_actions is not None:
+            action = lambda prod, xs: semantic_actions[prod.LHS](xs)  # noqa: E731
+        else:
+            action = ParseTree
+
+        values: dict[ForestNode, Any] = {}
+        for node in self._postorder(choose):
+            production, children = node.families[0 if choose is None else choose(node)]
+            values[node] = action(
+                production,
+                [values[c] if isinstance(c, ForestNode) else c for c in children],
+            )
+        return values[self]
+
+
+class _StackNode:
+    """A node of the graph structured stack, i.e. being in LR state {state} after {level} tokens.
+    Each of {edges} is a node that we could have come from and the forest node or token for the symbol in between"""
+
+    __slots__ = ("state", "level", "edges", "done")
+
+    def __init__(self, state: int, level: int):
+        self.state = state
+        self.level = level
+        self.edges: list[tuple[_StackNode, Any]] = []
+        # Whether we've already done its reductions for this token
+        self.done = False
+
+
+_Edge = tuple[_StackNode, Any]
+
+
+class GLRParser:
+    """The action lists turned into ints when it's made, like packed_tables.
+    reductions[s * len(terminals) + t] are the productions to reduce by in state s when the next token is t,
+    where len(productions) means accept, and shifts[s * len(terminals) + t] is the state to shift to or 0 for none,
+    since nothing ever goes back to the start state. There's only ever one shift for a cell since the LR(0)
+    automaton is deterministic, so all the conflicts are in the reductions.
+    Nothing about a parse is kept on the GLRParser, so one of them can parse as many inputs as you like."""
+
+    def __init__(self, cfg: CFG, lalr1: bool = False):
+        self.cfg = cfg
+        self.terminals = cfg.terminals_order + (
+            [] if dollar in cfg.terminals_order else [dollar]
+        )
+        self.nonterminals = cfg.nonterminals_order
+        self.productions = [prod for n in self.nonterminals for prod in cfg.P[n]]
+        assert all(epsilon not in prod.RHS for prod in self.productions), (
+            "The LR(0) automaton can't shift ε, so write ε-productions with an empty RHS, e.g. with empty_rhs",
+            [prod for prod in self.productions if epsilon in prod.RHS],
+        )
+        assert cfg.starting_prod is not None, (
+            "GLRParser needs a unique starting production"
+        )
+        self.starting_length = len(cfg.starting_prod)
+
+        self.terminal_ids = {t: i for i, t in enumerate(self.terminals)}
+        nonterminal_ids = {n: i for i, n in enumerate(self.nonterminals)}
+        production_ids = {prod: p for p, prod in enumerate(self.productions)}
+        self.lengths = array("i", [len(prod) for prod in self.productions])
+        self.lhs = array("i", [nonterminal_ids[prod.LHS] for prod in self.productions])
+        self.accept = len(self.productions)
+
+        action_lists = cfg.lalr1_action_lists if lalr1 else cfg.slr1_action_lists
+        num_states = len(action_lists)
+        num_terminals = len(self.terminals)
+        self.reductions: list[tuple[int, ...]] = [()] * (num_states * num_terminals)
+        self.shifts = array("i", [0] * (num_states * num_terminals))
+        self.conflicts = 0
+        for s, row in action_lists.items():
+            for t, actions in row.items():
+                i = s * num_terminals + self.terminal_ids[t]
+                reductions = []
+                for action in actions:
+                    if isinstance(action, LR0_Shift):
+                        assert action.next_state is not None, action
+                        assert self.shifts[i] in [0, action.next_state], (s, t, actions)
+                        self.shifts[i] = action.next_state
+                    elif isinstance(action, LR0_Reduce):
+                        reductions.append(production_ids[action.prod])
+                    else:
+                        assert isinstance(action, LR0_Accept), action
+                        reductions.append(self.accept)
+                self.reductions[i] = tuple(reductions)
+                self.conflicts += len(reductions) + (self.shifts[i] != 0) > 1
+
+        num_nonterminals = len(self.nonterminals)
+        self.goto = array("i", [NO_GOTO] * (num_states * num_nonterminals))
+        for s, goto_row in cfg.slr1_goto.items():
+            for n, state in goto_row.items():
+                if state is not None:
+                    self.goto[s * num_nonterminals + nonterminal_ids[n]] = state
+
+    def valid_terminals(self, states: Iterable[int]) -> list[Terminal]:
+        """The terminals that any of {states} can do something with"""
+        num_terminals = len(self.terminals)
+        rows = [s * num_terminals for s in states]
+        return [
+            t
+            for i, t in enumerate(self.terminals)
+            if any(self.shifts[row + i] or self.reductions[row + i] for row in rows)
+        ]
+
+    def parse(self, tokens: Iterable[Terminal]) -> ForestNode:
+        """Parses {tokens}, which can be any iterable, and which we only take from as we need them,
+        and gives the forest node for the grammar's original start symbol, i.e. every parse of them.
+        For each token we do all the reductions that any of the stacks can do, including on the new stack nodes
+        that those make, and only then shift the token onto all of the stacks that can,
+        so that the stacks all move along the input together and can be merged when they get to the same state.
+        Raises a ParseError once none of the stacks can do anything with the next token"""
+        reductions = self.reductions
+        shifts = self.shifts
+        goto = self.goto
+        lengths = self.lengths
+        lhs = self.lhs
+        productions = self.productions
+        nonterminals = self.nonterminals
+        terminal_ids = self.terminal_ids
+        num_terminals = len(self.terminals)
+        num_nonterminals = len(nonterminals)
+        accept = self.accept
+
+        # These are all for the current token, i.e. the stack nodes by state and the forest nodes
+        # by nonterminal and start, since they all end here
+        frontier: dict[int, _StackNode] = {0: _StackNode(0, 0)}
+        made: dict[tuple[int, int], ForestNode] = {}
+        # Once a forest node has more than one family, or a stack node more than one edge, the ones they've got
+        # so that checking for repeats isn't a search, which would make ambiguous parses another factor of n slower
+        family_keys: dict[ForestNode, set[tuple[int, ...]]] = {}
+        edge_ends: dict[_StackNode, set[int]] = {}
+        todo: list[_StackNode] = []
+        finished: list[_StackNode] = []
+        # Whether any edges go between stack nodes for this token, from reducing by something that derived ε,
+        # since then a new edge can be in the middle of a path and not just at the start of one
+        empty_edges = False
+
+        def reduce(
+            v: _StackNode, p: int, first: Optional[_Edge], through: Optional[_Edge]
+        ) -> None:
+            """Reduce by production {p} along every path back from {v}, or just the ones starting with
+            the edge {first} or going through the edge {through} if we've done the others already"""
+            nonlocal empty_edges
+            length = lengths[p]
+            paths: list[tuple[_StackNode, list[Any], bool]]
+            if first is not None:
+                paths = [(first[0], [first[1]], True)]
+                length -= 1
+            else:
+                paths = [(v, [], through is None)]
+            for _ in range(length):
+                paths = [
+                    (edge[0], [edge[1], *xs], used or edge is through)
+                    for w, xs, used in paths
+                    for edge in w.edges
+                ]
+
+            n = lhs[p]
+            production = productions[p]
+            for u, children, used in paths:
+                if not used:
+                    continue
+                node = made.get((n, u.level))
+                if node is None:
+                    node = made[(n, u.level)] = ForestNode(
+                        nonterminals[n], u.level, source_index
+                    )
+                    node.families.append((production, children))
+                else:
+                    keys = family_keys.get(node)
+                    if keys is None:
+                        keys = family_keys[node] = {
+                            (id(prod), *map(id, xs)) for prod, xs in node.families
+                        }
+                    key = (id(production), *map(id, children))
+                    if key not in keys:
+                        keys.add(key)
+                        node.families.append((production, children))
+
+                state = goto[u.state * num_nonterminals + n]
+                w = frontier.get(state)
+                if w is None:
+                    w = frontier[state] = _StackNode(state, source_index)
+                    w.edges.append((u, node))
+                    todo.append(w)
+                    empty_edges = empty_edges or u.level == source_index
+                    continue
+                ends = edge_ends.get(w)
+                if ends is None:
+                    ends = edge_ends[w] = {id(edge[0]) for edge in w.edges}
+                if id(u) not in ends:
+                    ends.add(id(u))
+                    new_edge = (u, node)
+                    w.edges.append(new_edge)
+                    empty_edges = empty_edges or u.level == source_index
+                    # If we've already reduced along w's other edges then just do the paths that use the new one
+                    if w.done and empty_edges:
+                        for v2 in list(finished):
+                            for q in reductions[v2.state * num_terminals + t]:
+                                if q != accept and lengths[q] > 0:
+                                    reduce(v2, q, None, new_edge)
+                    elif w.done:
+                        for q in reductions[state * num_terminals + t]:
+                            if q != accept and lengths[q] > 0:
+                                reduce(w, q, new_edge, None)
+
+        source = iter(tokens)
+        source_index = 0
+        a = next(source, dollar)
+        t = terminal_ids.get(a, -1)
+        while True:
+            if t < 0:
+                raise ParseError(
+                    "Unexpected token, not a terminal of the grammar",
+                    source_index,
+                    a,
+                    self.valid_terminals(frontier),
+                )
+            todo.extend(frontier.values())
+            accepting: Optional[_StackNode] = None
+            while todo:
+                v = todo.pop()
+                v.done = True
+                finished.append(v)
+                for p in reductions[v.state * num_terminals + t]:
+                    if p == accept:
+                        accepting = v
+                    else:
+                        reduce(v, p, None, None)
+
+            if accepting is not None:
+                # Either the grammar or the caller can have the $, but anything after it is a mistake
+                extra = next(source, None)
+                if extra is not None:
+                    raise ParseError(
+                        "Unexpected tokens at end of file",
+                        source_index + 1,
+                        extra,
+                        [dollar],
+                    )
+                paths: list[tuple[_StackNode, list[Any]]] = [(accepting, [])]
+                for _ in range(self.starting_length):
+                    paths = [(u, [x, *xs]) for w, xs in paths for u, x in w.edges]
+                roots = {id(xs[0]): xs[0] for _, xs in paths}
+                assert len(roots) == 1, ("Error - more than one root", roots)
+                (root,) = roots.values()
+                return root
+
+            shifted: dict[int, _StackNode] = {}
+            for v in frontier.values():
+                state = shifts[v.state * num_terminals + t]
+                if state:
+                    w = shifted.get(state)
+                    if w is None:
+                        w = shifted[state] = _StackNode(state, source_index + 1)
+                    w.edges.append((v, a))
+            if not shifted:
+                raise ParseError(
+                    "Unexpected token, unable to proceed",
+                    source_index,
+                    a,
+                    self.valid_terminals(frontier),
+                )
+
+            frontier = shifted
+            made.clear()
+            family_keys.clear()
+            edge_ends.clear()
+            finished.clear()
+            empty_edges = False
+            source_index += 1
+            a = next(source, dollar)
+            t = terminal_ids.get(a, -1)
+
+
+def ambiguous_expressions() -> CFG:
+    """E -> E + E | E * E | ( E ) | id, which has a Catalan number of parses for a string of +s"""
+    E = NonTerminal("E")
+    plus = Terminal("+")
+    times = Terminal("*")
+    o_bracket = Terminal("(")
+    c_bracket = Terminal(")")
+    ident = Terminal("id")
+    P: dict[NonTerminal, list[list[Symbol]]] = {
+        E: [[E, plus, E], [E, times, E], [o_bracket, E, c_bracket], [ident]]
+    }
+    return CFG(
+        {E},
+        {plus, times, o_bracket, c_bracket, ident},
+        P,
+        E,
+        terminals_order=[plus, times, o_bracket, c_bracket, ident],
+        nonterminals_order=[E],
+        add_unique_starting_production=True,
+    )
+
+
+def main() -> None:
+    cfg = ambiguous_expressions()
+    parser = GLRParser(cfg)
+    print(f"{parser.conflicts} conflicts in the SLR(1) tables")
+
+    tokens = [
+        Terminal("id", "1"),
+        Terminal("+"),
+        Terminal("id", "2"),
+        Terminal("*"),
+        Terminal("id", "3"),
+        Terminal("+"),
+        Terminal("id", "4"),
+    ]
+    root = parser.parse(tokens)
+    print(f"{root.count_trees()} parses of {' '.join(str(t) for t in tokens)}")
+
+    def value(xs: list[Any]) -> int:
+        if len(xs) == 1:
+            return int(xs[0].value)
+        if xs[0] == Terminal("("):
+            return xs[1]
+        return xs[0] + xs[2] if xs[1] == Terminal("+") else xs[0] * xs[2]
+
+    for tree in root.trees():
+        print(tree)
+    print(f"First parse: {root.evaluate({cfg.original_E: value})}")
+    print(f"Last parse: {root.evaluate({cfg.original_E: value}, lambda node: -1)}")
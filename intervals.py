@@ -0,0 +1,167 @@
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable
+from sys import byteorder
+
+"""Sets of characters stored as ranges of code points, so that automata can have edges like [a-z]
+or "anything except a newline" without listing every character in Sigma.
+ClassMap is the runtime half, it's what the lexer uses to find out which column of the table a character uses,
+so this doesn't import anything from the regex/NFA/DFA code."""
+
+MAX_CODE_POINT = 0x10FFFF
+
+
+class IntervalSet:
+    """An immutable set of characters.
+    {ranges} is a sorted list of (first, last) code points, inclusive at both ends,
+    and they're merged on the way in so no two of them overlap or touch."""
+
+    def __init__(self, ranges: Iterable[tuple[int, int]] = ()):
+        merged: list[tuple[int, int]] = []
+        for first, last in sorted(ranges):
+            assert 0 <= first <= last <= MAX_CODE_POINT, (first, last)
+            if len(merged) and first <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+            else:
+                merged.append((first, last))
+        self.ranges = tuple(merged)
+        self.firsts = [first for first, _ in self.ranges]
+
+    @staticmethod
+    def from_characters(characters: Iterable[str]) -> "IntervalSet":
+        return IntervalSet((ord(c), ord(c)) for c in characters)
+
+    def __contains__(self, c: object) -> bool:
+        if not isinstance(c, str) or len(c) != 1:
+            return False
+        i = bisect_right(self.firsts, ord(c)) - 1
+        return i >= 0 and ord(c) <= self.ranges[i][1]
+
+    def __len__(self) -> int:
+        return sum(last - first + 1 for first, last in self.ranges)
+
+    def __or__(self, other: "IntervalSet") -> "IntervalSet":
+        return IntervalSet(self.ranges + other.ranges)
+
+    def complement(self) -> "IntervalSet":
+        gaps: list[tuple[int, int]] = []
+        next_first = 0
+        for first, last in self.ranges:
+            if first > next_first:
+                gaps.append((next_first, first - 1))
+            next_first = last + 1
+        if next_first <= MAX_CODE_POINT:
+            gaps.append((next_first, MAX_CODE_POINT))
+        return IntervalSet(gaps)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, IntervalSet) and self.ranges == other.ranges
+
+    def __hash__(self) -> int:
+        return hash(self.ranges)
+
+    def __str__(self) -> str:
+        return (
+            "["
+            + "".join(
+                chr(first) if first == last else f"{chr(first)}-{chr(last)}"
+                for first, last in self.ranges
+            )
+            + "]"
+        )
+
+    def __repr__(self) -> str:
+        return f"IntervalSet({self.ranges})"
+
+
+def partition(sets: list[IntervalSet]) -> "ClassMap":
+    """Splits every code point into classes, so that two code points are in the same class
+    iff every one of {sets} contains both or neither of them.
+    Classes are numbered in code point order of where they first appear, so class 0 is the one containing chr(0)"""
+    # Cut the code points up everywhere one of the sets starts or stops
+    boundaries = {0}
+    for s in sets:
+        for first, last in s.ranges:
+            boundaries.add(first)
+            boundaries.add(last + 1)
+    boundaries.discard(MAX_CODE_POINT + 1)
+    starts = sorted(boundaries)
+
+    # Then each piece is either entirely in or entirely out of each set
+    signatures: list[list[int]] = [[] for _ in starts]
+    for i, s in enumerate(sets):
+        for first, last in s.ranges:
+            piece = bisect_right(starts, first) - 1
+            while piece < len(starts) and starts[piece] <= last:
+                signatures[piece].append(i)
+                piece += 1
+
+    class_ids: dict[tuple[int, ...], int] = {}
+    class_starts: list[int] = []
+    classes: list[int] = []
+    for start, signature in zip(starts, signatures):
+        class_id = class_ids.setdefault(tuple(signature), len(class_ids))
+        # Neighbouring pieces in the same class don't need to be kept separate
+        if len(classes) == 0 or classes[-1] != class_id:
+            class_starts.append(start)
+            classes.append(class_id)
+    return ClassMap(class_starts, classes)
+
+
+class ClassMap:
+    """Which class every code point is in.
+    The code points from starts[i] up to (but not including) starts[i + 1] are all in class classes[i],
+    and the last one carries on to the end of unicode."""
+
+    def __init__(self, starts: list[int], classes: list[int]):
+        self.starts = starts
+        self.classes = classes
+        assert len(self.starts) == len(self.classes), (self.starts, self.classes)
+        assert self.starts[0] == 0, self.starts
+        assert all(a < b for a, b in zip(self.starts, self.starts[1:])), self.starts
+        self.num_classes = max(self.classes) + 1
+
+    def class_of(self, c: str) -> int:
+        return self.classes[bisect_right(self.starts, ord(c)) - 1]
+
+    def representatives(self) -> list[str]:
+        """One character from each class, in class order"""
+        representatives: dict[int, str] = {}
+        for start, a in zip(self.starts, self.classes):
+            representatives.setdefault(a, chr(start))
+        return [representatives[a] for a in range(self.num_classes)]
+
+    def translation(self) -> "ClassTranslation":
+        return ClassTranslation(self)
+
+    @staticmethod
+    def encode_starts(starts: list[int]) -> str:
+        encoded = array("I", starts)
+        assert encoded.itemsize == 4, encoded.itemsize
+        if byteorder == "big":  # pragma: no cover
+            encoded.byteswap()
+        return encoded.tobytes().hex()
+
+    @staticmethod
+    def decode_starts(encoded: str) -> list[int]:
+        decoded = array("I", bytes.fromhex(encoded))
+        if byteorder == "big":  # pragma: no cover
+            decoded.byteswap()
+        return decoded.tolist()
+
+
+class ClassTranslation(dict[int, int]):
+    """A str.translate table from code points to their classes.
+    ASCII is filled in up front, and anything else is looked up the first time it turns up and then remembered,
+    so after the first occurrence of a character it costs the same as ASCII however far into unicode it is"""
+
+    def __init__(self, class_map: ClassMap):
+        super().__init__()
+        self.class_map = class_map
+        for c in range(128):
+            self[c] = class_map.class_of(chr(c))
+
+    def __missing__(self, c: int) -> int:
+        a = self.class_map.class_of(chr(c))
+        self[c] = a
+        return a
@@ -1,70 +1,82 @@
 from dfa import DFA
-from nfa import TypedNFA
+from nfa import CompactNFA
 from regex import Regex
 from common import Terminal
+from lexer_table import DEFAULT_CHUNK_SIZE, LexerTable
+from lexer_table import LexerError as LexerError  # Re-exported for lexer.LexerError
 
+from collections.abc import Iterator
+from functools import lru_cache
 from string import printable
-
-
-class LexerError(BaseException):
-    def __init__(self, message: str, characters_consumed: int, input_string: str):
-        self.message = message
-        self.characters_consumed = characters_consumed
-        self.input_string = input_string
-
-    def __str__(self) -> str:
-        return self.message
-
-    def __repr__(self) -> str:
-        return str((self.message, self.characters_consumed, self.input_string))
+from typing import TextIO
 
 
 class Lexer:
     def __init__(self, token_descriptions: list[tuple[Terminal, str, list[str]]]):
         self.token_descriptions = token_descriptions
-        nfas = [
-            TypedNFA[str, str, Terminal].from_regex(
-                Regex.parse(r),
-                set(printable),
-                accept_tag=t,  # type: ignore # For some reason it can't figure this specific line out
-            )
-            for (t, r, _) in token_descriptions
-        ]
-        self.dfa: DFA[str, str, Terminal] = DFA.fromNFA(TypedNFA.merge_nfas(nfas))
+        # The NFA's edges are ranges of characters, so it lexes any unicode,
+        # printable is just the Sigma used by things that go through the whole alphabet, like plotting
+        nfa = CompactNFA[Terminal].from_regexes(
+            [(Regex.parse(r), t) for (t, r, _) in token_descriptions], set(printable)
+        )
+        self.dfa: DFA[int, str, Terminal] = DFA.fromNFA(nfa).minimize()
+        self.table = self.build_table()
+
+    def build_table(self) -> LexerTable:
+        """Flatten the DFA into the form used at runtime, see lexer_table.py"""
+        table = self.dfa.table
+        assert table is not None
+        token_ids = {
+            t: i for i, (t, _, _) in reversed(list(enumerate(self.token_descriptions)))
+        }
+        accept: dict[int, int] = {}
+        for i, q in enumerate(table.states):
+            tag = self.dfa.tags[q]
+            if tag is not None:
+                accept[i] = token_ids[tag]
+
+        assert table.class_map is not None
+
+        return LexerTable(
+            table.class_map.starts,
+            table.class_map.classes,
+            table.rows,
+            table.state_ids[self.dfa.q_0],
+            table.dead,
+            accept,
+            [(t, actions) for (t, _, actions) in self.token_descriptions],
+        )
 
     def lex(self, input_string: str) -> list[Terminal]:
-        characters_consumed = 0
-        tokens: list[Terminal] = []
-        while characters_consumed < len(input_string):
-            self.dfa.test_string(input_string[characters_consumed:])
-            if self.dfa.num_chars_accepted == 0 or self.dfa.last_accept_tag is None:
-                raise LexerError(
-                    f"Lexing error after {characters_consumed} characters, next character is {input_string[characters_consumed]}",
-                    characters_consumed,
-                    input_string,
-                )
-            token = self.dfa.last_accept_tag
-
-            token_actions = next(
-                td[2] for td in self.token_descriptions if td[0] == token
-            )
-            if "IGNORE" not in token_actions:
-                if "STORE" in token_actions:
-                    tokens.append(
-                        Terminal(
-                            token.name,
-                            input_string[
-                                characters_consumed : (
-                                    characters_consumed + self.dfa.num_chars_accepted
-                                )
-                            ],
-                        )
-                    )
-                else:
-                    tokens.append(Terminal(token.name))
-            characters_consumed += self.dfa.num_chars_accepted
-
-        return tokens
+        return self.table.lex(input_string)
+
+    def iter_tokens(
+        self, stream: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Terminal]:
+        """Like lex, but reads from a file (or anything with a read method) a chunk at a time,
+        and yields the tokens as it goes rather than making a list of them, see LexerTable.iter_tokens"""
+        return self.table.iter_tokens(stream, chunk_size)
+
+
+# Building a Lexer means running the whole regex -> NFA -> DFA pipeline
+# So keep the most recently used ones around rather than doing it every time
+LEXER_CACHE_SIZE = 8
+
+
+@lru_cache(maxsize=LEXER_CACHE_SIZE)
+def cached_lexer(
+    token_descriptions: tuple[tuple[str, str, tuple[str, ...]], ...],
+) -> Lexer:
+    """token_descriptions is the hashable version of the terminal triples, see get_lexer"""
+    return Lexer(
+        [(Terminal(t), r, list(actions)) for t, r, actions in token_descriptions]
+    )
+
+
+def get_lexer(token_descriptions: list[tuple[Terminal, str, list[str]]]) -> Lexer:
+    return cached_lexer(
+        tuple((t.name, r, tuple(actions)) for t, r, actions in token_descriptions)
+    )
 
 
 def main() -> None:
@@ -0,0 +1,178 @@
+from common import Terminal
+from intervals import ClassMap
+
+from array import array
+from collections.abc import Iterator
+from sys import byteorder
+from typing import Optional, TextIO
+
+"""The part of the lexer that's needed at runtime.
+The Lexer builds one of these from its DFA, and the parser generator writes one into the generated parser,
+so that lexing doesn't need the regex, NFA or DFA code, and doesn't need to rebuild the automaton."""
+
+
+# How many characters iter_tokens reads at a time
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+class LexerError(BaseException):
+    def __init__(self, message: str, characters_consumed: int, input_string: str):
+        self.message = message
+        self.characters_consumed = characters_consumed
+        self.input_string = input_string
+
+    def __str__(self) -> str:
+        return self.message
+
+    def __repr__(self) -> str:
+        return str((self.message, self.characters_consumed, self.input_string))
+
+
+class LexerTable:
+    """A DFA transition table plus what to do with each token.
+    {starts} and {classes} group all of unicode into classes that the DFA treats identically,
+    the code points from starts[i] up to starts[i + 1] are in class classes[i], see intervals.ClassMap
+    {rows} is the table, rows[q][a] is the state you go to from q on a character in class a
+    {accept} maps each accepting state to the index in {tokens} of the token it accepts
+    {tokens} is each token, and its actions (STORE or IGNORE)
+
+    Starts can be given as a hex string with 4 bytes per entry, classes as a hex string with 1 byte per entry,
+    and rows as a hex string of the flattened table with 2 bytes per entry,
+    which is how the parser generator writes them out, see ClassMap.encode_starts, encode_classes and encode_rows."""
+
+    def __init__(
+        self,
+        starts: list[int] | str,
+        classes: list[int] | str,
+        rows: list[list[int]] | str,
+        start: int,
+        dead: Optional[int],
+        accept: dict[int, int],
+        tokens: list[tuple[Terminal, list[str]]],
+    ):
+        self.class_map = ClassMap(
+            ClassMap.decode_starts(starts) if isinstance(starts, str) else starts,
+            list(bytes.fromhex(classes)) if isinstance(classes, str) else classes,
+        )
+        self.num_classes = self.class_map.num_classes
+        # lex turns the input into a byte per character, so there can't be more classes than that
+        assert self.num_classes <= 0x100, self.num_classes
+        self.translation = self.class_map.translation()
+        self.rows = (
+            LexerTable.decode_rows(rows, self.num_classes)
+            if isinstance(rows, str)
+            else rows
+        )
+        self.start = start
+        self.dead = dead
+        self.accept = accept
+        self.tokens = tokens
+
+        # What to do with the token accepted in each state, so that lex doesn't have to look it up
+        self.accept_tokens: list[Optional[Terminal]] = [None] * len(self.rows)
+        self.accept_actions: list[list[str]] = [[] for _ in self.rows]
+        for q, token_index in self.accept.items():
+            self.accept_tokens[q], self.accept_actions[q] = self.tokens[token_index]
+
+    @staticmethod
+    def encode_classes(classes: list[int]) -> str:
+        return bytes(classes).hex()
+
+    @staticmethod
+    def encode_rows(rows: list[list[int]]) -> str:
+        flattened = array("H", [q for row in rows for q in row])
+        if byteorder == "big":  # pragma: no cover
+            flattened.byteswap()
+        return flattened.tobytes().hex()
+
+    @staticmethod
+    def decode_rows(encoded: str, num_classes: int) -> list[list[int]]:
+        flattened = array("H", bytes.fromhex(encoded))
+        if byteorder == "big":  # pragma: no cover
+            flattened.byteswap()
+        return [
+            flattened[i : i + num_classes].tolist()
+            for i in range(0, len(flattened), num_classes)
+        ]
+
+    def lex(self, input_string: str) -> list[Terminal]:
+        """Maximal munch: repeatedly take the longest prefix of the rest of the input that's a token.
+        The DFA scans forward from where the last token finished, and stops once it's dead,
+        so the whole input is lexed in a single pass."""
+        tokens, _ = self.lex_prefix(input_string, True)
+        return tokens
+
+    def iter_tokens(
+        self, stream: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Terminal]:
+        """Lex {stream} {chunk_size} characters at a time, yielding tokens as soon as they're complete.
+        Whatever's left at the end of a chunk, i.e. a token that might carry on into the next one,
+        is kept and lexed again with the next chunk, so only the current token has to be in memory."""
+        assert chunk_size > 0, chunk_size
+        pending = ""
+        offset = 0  # How many characters have been lexed before the start of pending
+        while True:
+            chunk = stream.read(chunk_size)
+            buffer = pending + chunk
+            tokens, consumed = self.lex_prefix(buffer, len(chunk) == 0, offset)
+            yield from tokens
+            if len(chunk) == 0:
+                return
+            pending = buffer[consumed:]
+            offset += consumed
+
+    def lex_prefix(
+        self, input_string: str, final: bool, offset: int = 0
+    ) -> tuple[list[Terminal], int]:
+        """Lexes as much of input_string as possible, and returns the tokens and the number of characters they used up.
+        If it's not {final}, there might be more input after it, so a token that runs into the end of
+        input_string might be longer than it looks, so lexing stops before it.
+        {offset} is how far into the whole input input_string starts, for error messages"""
+        # Look up the class of every character in one go, which is much quicker than doing it one by one
+        # Classes all fit in a byte, so this gives a bytes where classified[i] is the class of input_string[i]
+        classified = input_string.translate(self.translation).encode("latin-1")
+
+        rows = self.rows
+        accept_tokens = self.accept_tokens
+        dead = self.dead
+
+        characters_consumed = 0
+        tokens: list[Terminal] = []
+        while characters_consumed < len(input_string):
+            q = self.start
+            last_accept = q
+            token_end = characters_consumed
+
+            position = characters_consumed
+            while position < len(input_string) and q != dead:
+                q = rows[q][classified[position]]
+                position += 1
+                if accept_tokens[q] is not None:
+                    last_accept = q
+                    token_end = position
+
+            if q != dead and not final:
+                # We ran out of input while this could still be getting longer, so wait for more
+                break
+
+            token = accept_tokens[last_accept]
+            if token_end == characters_consumed or token is None:
+                raise LexerError(
+                    f"Lexing error after {offset + characters_consumed} characters, next character is {input_string[characters_consumed]}",
+                    offset + characters_consumed,
+                    input_string,
+                )
+
+            token_actions = self.accept_actions[last_accept]
+            if "IGNORE" not in token_actions:
+                if "STORE" in token_actions:
+                    tokens.append(
+                        Terminal(
+                            token.name, input_string[characters_consumed:token_end]
+                        )
+                    )
+                else:
+                    tokens.append(Terminal(token.name))
+            characters_consumed = token_end
+
+        return tokens, characters_consumed
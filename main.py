@@ -1,8 +1,11 @@
 import argparse
 
+import benchmark
 import cfg
 import cfg_parser
+import cfg_transforms
 import dfa
+import glr_parser
 import lexer
 import nfa
 import recursive_descent_parser_example
@@ -23,7 +26,10 @@ def main() -> None:
     parser.add_argument("--recursive-descent-parser-example", action="store_true")
     parser.add_argument("--cfg", action="store_true")
     parser.add_argument("--cfg-parser", action="store_true")
+    parser.add_argument("--cfg-transforms", action="store_true")
+    parser.add_argument("--glr-parser", action="store_true")
     parser.add_argument("--parser-generator", action="store_true")
+    parser.add_argument("--benchmark", action="store_true")
 
     args = parser.parse_args()
 
@@ -41,8 +47,14 @@ def main() -> None:
         cfg.main()
     if args.cfg_parser:
         cfg_parser.main()
+    if args.cfg_transforms:
+        cfg_transforms.main()
+    if args.glr_parser:
+        glr_parser.main()
     if args.parser_generator:
         parser_generator.main()
+    if args.benchmark:
+        benchmark.main()
 
 
 if __name__ == "__main__":
@@ -7,6 +7,7 @@ from typing import Generic, Optional, TypeVar
 import matplotlib.pyplot as plt
 import networkx as nx  # type: ignore
 
+from intervals import ClassMap, IntervalSet, partition
 from regex import (
     Regex,
     EmptyRegex,
@@ -112,8 +113,7 @@ class TypedNFA(Generic[StateType, TokenType, TagType]):
         last_accept_states: set[StateType] = current_states.intersection(self.F)
 
         for c in token_list:
-            assert c in self.Sigma, (c, self.Sigma)
-
+            # Anything not in Sigma just doesn't go anywhere, so there's no need to check for it
             next_states = set()
             for q in current_states:
                 next_states |= self.delta(q, c)
@@ -179,7 +179,7 @@ class TypedNFA(Generic[StateType, TokenType, TagType]):
             created_nfa = TypedNFA(
                 {"0", "1"},
                 Sigma,
-                lambda q, c: {"1"} if c in regex.characters and q == "0" else set(),
+                lambda q, c: {"1"} if regex.test_string(c) and q == "0" else set(),
                 "0",
                 {"1"},
                 "",
@@ -442,6 +442,138 @@ class TypedNFA(Generic[StateType, TokenType, TagType]):
         )
 
 
+class CompactNFA(TypedNFA[int, str, TagType]):
+    """An NFA built by Thompson's construction straight into arrays, rather than out of nested delta functions.
+    States are ints, epsilons[q] is the states that q has an epsilon transition to,
+    and edges[q] is q's other transitions, as (set of characters, next state) pairs.
+    It's still a TypedNFA, so everything that works on those works on this,
+    but delta is just an array lookup rather than unpicking state names all the way down the regex.
+    F is a list so that it can give the priority order of the accept states if there are tags
+    The character sets are IntervalSets, so the edges work on any unicode character, not just the ones in Sigma.
+    Sigma is only needed by the TypedNFA methods that go through the whole alphabet, e.g. plot"""
+
+    def __init__(
+        self,
+        Sigma: set[str],
+        epsilons: list[list[int]],
+        edges: list[list[tuple[IntervalSet, int]]],
+        q_0: int,
+        F: list[int],
+        tags: dict[int, Optional[TagType]] = {},
+    ):
+        self.epsilons = epsilons
+        self.edges = edges
+        assert len(self.epsilons) == len(self.edges), (self.epsilons, self.edges)
+
+        Q = set(range(len(self.epsilons)))
+        all_tags: dict[int, Optional[TagType]] = {}
+        state_rankings: list[int] = []
+        if len(tags):
+            all_tags = {q: tags.get(q) for q in Q}
+            state_rankings = F + [q for q in range(len(Q)) if q not in F]
+
+        super().__init__(
+            Q, Sigma, self.compact_delta, q_0, set(F), "", all_tags, state_rankings
+        )
+
+    def compact_delta(self, q: int, c: str) -> set[int]:
+        if c == "":
+            return set(self.epsilons[q])
+        return {q_prime for characters, q_prime in self.edges[q] if c in characters}
+
+    def class_map(self) -> ClassMap:
+        """Partitions all of unicode into classes that the NFA can't tell apart,
+        i.e. two characters are in the same class iff every edge either allows both or neither"""
+        return partition(
+            list({characters for edges in self.edges for characters, _ in edges})
+        )
+
+    def subset_step(self, S: frozenset[int], c: str) -> frozenset[int]:
+        """The subset construction's transition function, the epsilon closure of everywhere S goes on c"""
+        epsilons = self.epsilons
+        next_states = {
+            q_prime for q in S for chars, q_prime in self.edges[q] if c in chars
+        }
+        stack = list(next_states)
+        while len(stack):
+            for q_prime in epsilons[stack.pop()]:
+                if q_prime not in next_states:
+                    next_states.add(q_prime)
+                    stack.append(q_prime)
+        return frozenset(next_states)
+
+    @staticmethod
+    def from_regex(
+        regex: Regex, Sigma: set[str] = set(), accept_tag: Optional[TagType] = None
+    ) -> "CompactNFA":
+        return CompactNFA.from_regexes([(regex, accept_tag)], Sigma)
+
+    @staticmethod
+    def from_regexes(
+        regexes: list[tuple[Regex, Optional[TagType]]], Sigma: set[str] = set()
+    ) -> "CompactNFA":
+        """Equivalent to merging the NFAs for each regex (see merge_nfas),
+        but without building them separately first. Priority is in the order they're given."""
+        epsilons: list[list[int]] = []
+        edges: list[list[tuple[IntervalSet, int]]] = []
+
+        def new_state() -> int:
+            epsilons.append([])
+            edges.append([])
+            return len(epsilons) - 1
+
+        def build(regex: Regex) -> tuple[int, int]:
+            """Adds the states for regex, and returns its (start, accept) states"""
+            if isinstance(regex, ConcatenationRegex):
+                start_1, end_1 = build(regex.r1)
+                start_2, end_2 = build(regex.r2)
+                epsilons[end_1].append(start_2)
+                return (start_1, end_2)
+
+            start = new_state()
+            if isinstance(regex, EmptyRegex):
+                end = new_state()
+            elif isinstance(regex, EpsilonRegex):
+                end = new_state()
+                epsilons[start].append(end)
+            elif isinstance(regex, CharacterRegex):
+                end = new_state()
+                edges[start].append((IntervalSet.from_characters(regex.character), end))
+            elif isinstance(regex, RangeRegex):
+                end = new_state()
+                edges[start].append((regex.characters, end))
+                if regex.nullable:
+                    epsilons[start].append(end)
+            elif isinstance(regex, OrRegex):
+                start_1, end_1 = build(regex.r1)
+                start_2, end_2 = build(regex.r2)
+                end = new_state()
+                epsilons[start].extend([start_1, start_2])
+                epsilons[end_1].append(end)
+                epsilons[end_2].append(end)
+            elif isinstance(regex, StarRegex):
+                start_1, end_1 = build(regex.r)
+                end = new_state()
+                epsilons[start].extend([start_1, end])
+                epsilons[end_1].extend([start_1, end])
+            else:
+                assert isinstance(regex, Regex), regex
+                assert False, "Regex is an abstract base class"
+            return (start, end)
+
+        q_0 = new_state()
+        F: list[int] = []
+        tags: dict[int, Optional[TagType]] = {}
+        for regex, tag in regexes:
+            start, end = build(regex)
+            epsilons[q_0].append(start)
+            F.append(end)
+            if tag is not None:
+                tags[end] = tag
+
+        return CompactNFA(Sigma, epsilons, edges, q_0, F, tags)
+
+
 class NFA(TypedNFA[str, str, str]):
     def __init__(
         self,
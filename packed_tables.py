@@ -0,0 +1,521 @@
+from common import (
+    Terminal,
+    NonTerminal,
+    Production,
+    LR0_Action,
+    LR0_Shift,
+    LR0_Reduce,
+    LR0_Accept,
+    dollar,
+)
+
+from array import array
+from collections.abc import Iterable, Sequence
+from sys import byteorder
+from typing import Any, Callable, Optional, Protocol
+
+"""The LR parse tables packed into arrays of ints, and the parsers that run on them.
+Like lexer_table.py this is needed at runtime, so it only depends on common."""
+
+ERROR = 0
+NO_GOTO = -1
+
+
+class ParseError(Exception):
+    """{token} is the one we couldn't handle, and {source_index} is how many tokens came before it"""
+
+    def __init__(
+        self,
+        message: str,
+        source_index: int,
+        token: Terminal,
+        valid_terminals: list[Terminal],
+    ):
+        self.message = message
+        self.source_index = source_index
+        self.token = token
+        self.valid_terminals = valid_terminals
+
+    def __str__(self) -> str:
+        return f"""Parse Error {self.message} at index {self.source_index} ({self.token}).
+        Expected one of {[str(t) for t in self.valid_terminals]}"""
+
+
+class Lookup(Protocol):
+    """What lr_parse looks things up in, which is just the array for PackedTables"""
+
+    def __getitem__(self, i: int) -> int: ...
+
+
+def lr_parse(
+    action: Lookup,
+    goto: Lookup,
+    valid_terminals: Callable[[int], list[Terminal]],
+    terminal_ids: dict[Terminal, int],
+    num_nonterminals: int,
+    prod_lengths: Sequence[int],
+    prod_lhs: Sequence[int],
+    semantic_actions: Sequence[Callable[[list[Any]], Any]],
+    source: Iterable[Terminal],
+    debug: bool = False,
+    accept: Optional[int] = None,
+) -> Any:
+    """The LR parser, which all of the table formats share, so they only differ in how they look things up.
+    action[s * len(terminal_ids) + t] and goto[s * num_nonterminals + n] are as described in PackedTables,
+    with terminals numbered by {terminal_ids}, and the semantic action for nonterminal n is semantic_actions[n].
+    They're indexed like PackedTables' arrays so that it can just give them, since this is the hot loop.
+    Reducing by production {accept} means accept, which is len(prod_lengths) unless it's given.
+    Tokens are only taken from {source} when they're needed, so lexing and parsing can happen together.
+    When it runs out we carry on with $, so it doesn't matter whether source ends with one, but anything after
+    a $ is a mistake. Tokens that aren't terminals of the grammar are a ParseError like any other unexpected token.
+    The checks that the stacks are still consistent happen on every step, so they're only done if {debug}"""
+    if accept is None:
+        accept = len(prod_lengths)
+    num_terminals = len(terminal_ids)
+
+    def check_stacks() -> None:
+        assert len(parser_stack) == len(semantic_stack) + 1, (
+            "Error - invalid stack lengths",
+            parser_stack,
+            semantic_stack,
+        )
+
+    tokens = iter(source)
+    parser_stack = [0]
+    semantic_stack: list[Any] = []
+    source_index = 0
+
+    a = next(tokens, dollar)
+    t = terminal_ids.get(a, -1)
+    while True:
+        s = parser_stack[-1]
+        n = action[s * num_terminals + t] if t >= 0 else ERROR
+        if n > 0:
+            parser_stack.append(n)
+            semantic_stack.append(a)
+            source_index += 1
+            a = next(tokens, dollar)
+            t = terminal_ids.get(a, -1)
+        elif n < 0:
+            p = -n - 1
+            if p == accept:
+                extra = next(tokens, None)
+                if extra is not None:
+                    raise ParseError(
+                        "Unexpected tokens at end of file",
+                        source_index + 1,
+                        extra,
+                        [dollar],
+                    )
+                check_stacks()
+                assert len(parser_stack) == 2 and parser_stack[0] == 0, (
+                    "Unexpected tokens on parser_stack",
+                    parser_stack,
+                )
+                return semantic_stack[0]
+
+            if debug:
+                check_stacks()
+                assert len(parser_stack) > prod_lengths[p], (
+                    "Invalid Reduce Action",
+                    s,
+                    a,
+                    p,
+                    parser_stack,
+                )
+            # Pop the RHS off both stacks in place, rather than copying what's left of them
+            # Not [-len(prod):] because that's the whole stack for an epsilon production
+            cut = len(semantic_stack) - prod_lengths[p]
+            semantic_elements = semantic_stack[cut:]
+            del semantic_stack[cut:]
+            del parser_stack[cut + 1 :]
+
+            lhs = prod_lhs[p]
+            next_state = goto[parser_stack[-1] * num_nonterminals + lhs]
+            assert next_state != NO_GOTO, (
+                "Unable to GOTO due to invalid stack state",
+                source_index,
+                a,
+                valid_terminals(s),
+            )
+            parser_stack.append(next_state)
+            semantic_stack.append(semantic_actions[lhs](semantic_elements))
+        else:
+            raise ParseError(
+                "Unexpected token, unable to proceed"
+                if t >= 0
+                else "Unexpected token, not a terminal of the grammar",
+                source_index,
+                a,
+                valid_terminals(s),
+            )
+
+
+class PackedTables:
+    """ACTION and GOTO as flat arrays of ints, so each step of the parse is a few integer operations
+    rather than looking Terminals up in dicts and checking which type of action we've got.
+    Terminals are numbered by their position in {terminals}, which should include $,
+    and nonterminals by their position in {nonterminals}, and productions are numbered from 0.
+    action[s * len(terminals) + t] is what to do in state s when the next token is terminal t:
+        n > 0 means shift and go to state n (nothing ever goes back to state 0, it's the start state)
+        n < 0 means reduce by production -n - 1, or accept if that's len(prod_lengths)
+        ERROR means there's nothing we can do with it
+    goto[s * len(nonterminals) + n] is the state to go to after reducing to nonterminal n in state s, or NO_GOTO
+    prod_lengths[p] is the length of the RHS of production p, and prod_lhs[p] is the number of its LHS
+
+    The arrays can be given as hex strings, which is how the parser generator writes them out, see encode."""
+
+    def __init__(
+        self,
+        terminals: list[Terminal],
+        nonterminals: list[NonTerminal],
+        action: array | str,
+        goto: array | str,
+        prod_lengths: array | str,
+        prod_lhs: array | str,
+    ):
+        self.terminals = terminals
+        self.nonterminals = nonterminals
+        self.action = PackedTables.decode(action) if isinstance(action, str) else action
+        self.goto = PackedTables.decode(goto) if isinstance(goto, str) else goto
+        self.prod_lengths = (
+            PackedTables.decode(prod_lengths)
+            if isinstance(prod_lengths, str)
+            else prod_lengths
+        )
+        self.prod_lhs = (
+            PackedTables.decode(prod_lhs) if isinstance(prod_lhs, str) else prod_lhs
+        )
+
+        self.terminal_ids = {t: i for i, t in enumerate(self.terminals)}
+        self.num_states = len(self.action) // len(self.terminals)
+        assert len(self.action) == self.num_states * len(self.terminals), (
+            len(self.action),
+            len(self.terminals),
+        )
+        assert len(self.goto) == self.num_states * len(self.nonterminals), (
+            len(self.goto),
+            len(self.nonterminals),
+        )
+        assert len(self.prod_lengths) == len(self.prod_lhs), (
+            self.prod_lengths,
+            self.prod_lhs,
+        )
+
+    @staticmethod
+    def from_tables(
+        Action: dict[int, dict[Terminal, Optional[LR0_Action]]],
+        Goto: dict[int, dict[NonTerminal, Optional[int]]],
+        terminals: list[Terminal],
+        nonterminals: list[NonTerminal],
+        productions: list[Production],
+    ) -> "PackedTables":
+        """Packs the tables from e.g. CFG.slr1_action and CFG.slr1_goto"""
+        production_ids = {prod: p for p, prod in enumerate(productions)}
+        terminal_ids = {t: i for i, t in enumerate(terminals)}
+        nonterminal_ids = {n: i for i, n in enumerate(nonterminals)}
+        accept = -len(productions) - 1
+
+        action = array("i", [ERROR] * (len(Action) * len(terminals)))
+        for s, row in Action.items():
+            for t, a in row.items():
+                i = s * len(terminals) + terminal_ids[t]
+                if isinstance(a, LR0_Shift):
+                    assert a.next_state is not None and a.next_state > 0, (s, t, a)
+                    action[i] = a.next_state
+                elif isinstance(a, LR0_Reduce):
+                    action[i] = -production_ids[a.prod] - 1
+                elif isinstance(a, LR0_Accept):
+                    action[i] = accept
+                else:
+                    assert a is None, a
+
+        goto = array("i", [NO_GOTO] * (len(Action) * len(nonterminals)))
+        for s, goto_row in Goto.items():
+            for n, next_state in goto_row.items():
+                if next_state is not None:
+                    goto[s * len(nonterminals) + nonterminal_ids[n]] = next_state
+
+        return PackedTables(
+            terminals,
+            nonterminals,
+            action,
+            goto,
+            array("i", [len(prod) for prod in productions]),
+            array("i", [nonterminal_ids[prod.LHS] for prod in productions]),
+        )
+
+    @staticmethod
+    def encode(table: array) -> str:
+        encoded = array("i", table)
+        assert encoded.itemsize == 4, encoded.itemsize
+        if byteorder == "big":  # pragma: no cover
+            encoded.byteswap()
+        return encoded.tobytes().hex()
+
+    @staticmethod
+    def decode(encoded: str) -> array:
+        decoded = array("i", bytes.fromhex(encoded))
+        if byteorder == "big":  # pragma: no cover
+            decoded.byteswap()
+        return decoded
+
+    def valid_terminals(self, state: int) -> list[Terminal]:
+        row = state * len(self.terminals)
+        return [
+            t for i, t in enumerate(self.terminals) if self.action[row + i] != ERROR
+        ]
+
+    def parse(
+        self,
+        semantic_actions: dict[NonTerminal, Callable[[list[Any]], Any]],
+        source: Iterable[Terminal],
+        debug: bool = False,
+    ) -> Any:
+        """lr_parse on the packed tables"""
+        return lr_parse(
+            self.action,
+            self.goto,
+            self.valid_terminals,
+            self.terminal_ids,
+            len(self.nonterminals),
+            self.prod_lengths,
+            self.prod_lhs,
+            [semantic_actions[n] for n in self.nonterminals],
+            source,
+            debug,
+        )
+
+
+def comb(rows: list[dict[int, int]], width: int) -> tuple[array, array, array]:
+    """Row displacement, aka a comb vector. Slides each of the sparse {rows} along one shared array
+    until its entries land in gaps left by the rows already placed, so they're interleaved like the teeth of combs.
+    Row r's entry for column c ends up at value[base[r] + c], with check[base[r] + c] == r to say it's really there.
+    Rows with the most entries go first, since they're the hardest to fit in, and then it's first fit.
+    Everything's padded out to {width} past the last base so that base[r] + c is always in range."""
+    base = array("i", [0] * len(rows))
+    check = array("i")
+    value = array("i")
+    for r in sorted(range(len(rows)), key=lambda r: -len(rows[r])):
+        row = rows[r]
+        b = 0
+        while any(b + c < len(check) and check[b + c] != -1 for c in row):
+            b += 1
+        base[r] = b
+        if len(check) < b + width:
+            check.extend([-1] * (b + width - len(check)))
+            value.extend([0] * (b + width - len(value)))
+        for c, v in row.items():
+            check[b + c] = r
+            value[b + c] = v
+    return base, check, value
+
+
+class CombLookup:
+    """Row r, column c of a comb vector with a default for each row, as a Lookup indexed by r * width + c,
+    i.e. CompressedTables.action but the way lr_parse looks things up"""
+
+    def __init__(
+        self, base: array, check: array, value: array, defaults: array, width: int
+    ):
+        self.base = base
+        self.check = check
+        self.value = value
+        self.defaults = defaults
+        self.width = width
+
+    def __getitem__(self, i: int) -> int:
+        r, c = divmod(i, self.width)
+        j = self.base[r] + c
+        return self.value[j] if self.check[j] == r else self.defaults[r]
+
+
+class TransposedCombLookup(CombLookup):
+    """The same but indexed by c * width + r, for CompressedTables.goto, where the rows are the nonterminals"""
+
+    def __getitem__(self, i: int) -> int:
+        c, r = divmod(i, self.width)
+        j = self.base[r] + c
+        return self.value[j] if self.check[j] == r else self.defaults[r]
+
+
+class CompressedTables:
+    """The same tables as PackedTables, squashed down so they don't take up much space in the generated parsers.
+    Most of a row of ACTION is errors, and most of the rest is usually a single reduce, so
+    each state gets a default reduction (or ERROR if it only shifts), and only the entries that differ from that are kept.
+    That does turn errors into reductions, but an LR parser will always hit the error before it shifts the bad token,
+    it just does a few more reductions first.
+    GOTO is the other way round, each nonterminal gets a default state and only the others are kept.
+    The rows that are left are packed together with comb, so a lookup is still just a few array accesses:
+        action(s, t) = action_value[i] if action_check[i] == s else default_reductions[s], where i = action_base[s] + t
+        goto(s, n) = goto_value[i] if goto_check[i] == n else default_gotos[n], where i = goto_base[n] + s
+    with the entries encoded as in PackedTables.
+
+    The arrays can be given as hex strings, see PackedTables.encode."""
+
+    def __init__(
+        self,
+        terminals: list[Terminal],
+        nonterminals: list[NonTerminal],
+        default_reductions: array | str,
+        action_base: array | str,
+        action_check: array | str,
+        action_value: array | str,
+        default_gotos: array | str,
+        goto_base: array | str,
+        goto_check: array | str,
+        goto_value: array | str,
+        prod_lengths: array | str,
+        prod_lhs: array | str,
+    ):
+        def decode(a: array | str) -> array:
+            return PackedTables.decode(a) if isinstance(a, str) else a
+
+        self.terminals = terminals
+        self.nonterminals = nonterminals
+        self.default_reductions = decode(default_reductions)
+        self.action_base = decode(action_base)
+        self.action_check = decode(action_check)
+        self.action_value = decode(action_value)
+        self.default_gotos = decode(default_gotos)
+        self.goto_base = decode(goto_base)
+        self.goto_check = decode(goto_check)
+        self.goto_value = decode(goto_value)
+        self.prod_lengths = decode(prod_lengths)
+        self.prod_lhs = decode(prod_lhs)
+
+        self.terminal_ids = {t: i for i, t in enumerate(self.terminals)}
+        self.num_states = len(self.default_reductions)
+        assert len(self.action_base) == self.num_states, (
+            len(self.action_base),
+            self.num_states,
+        )
+        assert len(self.action_check) == len(self.action_value), (
+            len(self.action_check),
+            len(self.action_value),
+        )
+        assert all(
+            0 <= b and b + len(self.terminals) <= len(self.action_check)
+            for b in self.action_base
+        ), (self.action_base, len(self.action_check))
+        assert (
+            len(self.default_gotos) == len(self.goto_base) == len(self.nonterminals)
+        ), (self.default_gotos, self.goto_base, self.nonterminals)
+        assert len(self.goto_check) == len(self.goto_value), (
+            len(self.goto_check),
+            len(self.goto_value),
+        )
+        assert all(
+            0 <= b and b + self.num_states <= len(self.goto_check)
+            for b in self.goto_base
+        ), (self.goto_base, len(self.goto_check))
+        assert len(self.prod_lengths) == len(self.prod_lhs), (
+            self.prod_lengths,
+            self.prod_lhs,
+        )
+
+    @staticmethod
+    def from_packed(tables: PackedTables) -> "CompressedTables":
+        num_terminals = len(tables.terminals)
+        num_nonterminals = len(tables.nonterminals)
+
+        default_reductions = array("i", [ERROR] * tables.num_states)
+        action_rows: list[dict[int, int]] = []
+        for s in range(tables.num_states):
+            row = tables.action[s * num_terminals : (s + 1) * num_terminals]
+            accept = -len(tables.prod_lengths) - 1
+            reductions = [n for n in row if n < 0 and n != accept]
+            if reductions:
+                default_reductions[s] = max(set(reductions), key=reductions.count)
+            action_rows.append(
+                {
+                    t: n
+                    for t, n in enumerate(row)
+                    if n != ERROR and n != default_reductions[s]
+                }
+            )
+
+        default_gotos = array("i", [NO_GOTO] * num_nonterminals)
+        goto_rows: list[dict[int, int]] = []
+        for n in range(num_nonterminals):
+            column = tables.goto[n::num_nonterminals]
+            targets = [q for q in column if q != NO_GOTO]
+            if targets:
+                default_gotos[n] = max(set(targets), key=targets.count)
+            # The missing entries can become the default too, we never GOTO from a state that doesn't have one
+            goto_rows.append(
+                {
+                    s: q
+                    for s, q in enumerate(column)
+                    if q != NO_GOTO and q != default_gotos[n]
+                }
+            )
+
+        action_base, action_check, action_value = comb(action_rows, num_terminals)
+        goto_base, goto_check, goto_value = comb(goto_rows, tables.num_states)
+        return CompressedTables(
+            tables.terminals,
+            tables.nonterminals,
+            default_reductions,
+            action_base,
+            action_check,
+            action_value,
+            default_gotos,
+            goto_base,
+            goto_check,
+            goto_value,
+            tables.prod_lengths,
+            tables.prod_lhs,
+        )
+
+    def action(self, state: int, t: int) -> int:
+        i = self.action_base[state] + t
+        if self.action_check[i] == state:
+            return self.action_value[i]
+        return self.default_reductions[state]
+
+    def goto(self, state: int, n: int) -> int:
+        i = self.goto_base[n] + state
+        if self.goto_check[i] == n:
+            return self.goto_value[i]
+        return self.default_gotos[n]
+
+    def valid_terminals(self, state: int) -> list[Terminal]:
+        """Only the entries that were kept, but we only give up in states without a default reduction anyway"""
+        return [
+            t for i, t in enumerate(self.terminals) if self.action(state, i) != ERROR
+        ]
+
+    def parse(
+        self,
+        semantic_actions: dict[NonTerminal, Callable[[list[Any]], Any]],
+        source: Iterable[Terminal],
+        debug: bool = False,
+    ) -> Any:
+        """lr_parse on the compressed tables"""
+        num_terminals = len(self.terminals)
+        num_nonterminals = len(self.nonterminals)
+        return lr_parse(
+            CombLookup(
+                self.action_base,
+                self.action_check,
+                self.action_value,
+                self.default_reductions,
+                num_terminals,
+            ),
+            TransposedCombLookup(
+                self.goto_base,
+                self.goto_check,
+                self.goto_value,
+                self.default_gotos,
+                num_nonterminals,
+            ),
+            self.valid_terminals,
+            self.terminal_ids,
+            num_nonterminals,
+            self.prod_lengths,
+            self.prod_lhs,
+            [semantic_actions[n] for n in self.nonterminals],
+            source,
+            debug,
+        )
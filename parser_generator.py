@@ -1,5 +1,19 @@
-from common import NonTerminal, Terminal, LR0_Action, LR0_Shift, LR0_Reduce, LR0_Accept
+from common import (
+    NonTerminal,
+    Terminal,
+    LR0_Action,
+    LR0_Shift,
+    LR0_Reduce,
+    LR0_Accept,
+    Production,
+    dollar,
+    epsilon,
+)
 from grammar_reader import Grammar
+from lexer import get_lexer
+from intervals import ClassMap
+from lexer_table import LexerTable
+from packed_tables import PackedTables, CompressedTables
 
 from typing import Optional
 
@@ -10,6 +24,15 @@ class ParserGenerator:
     That file will have a class for each NonTerminal of the AST
     That class will have member variables for it's children, plus those specified in {ast_members}
     It will have the functions in {ast_functions}, plus standard ones
+    If {packed} then the parse tables are written out as arrays of ints (see packed_tables.py),
+    otherwise they're dicts of LR0_Actions
+    If {compressed} then they're the arrays of ints squashed down with default reductions and comb vectors,
+    which is smaller but a bit slower, whatever {packed} says
+    If {lalr1} then the tables are LALR(1) rather than SLR(1), which has the same states but accepts more grammars
+    If {lr1} then they're LR(1), with states merged where possible (see CFG.lr1_automaton), which accepts more still
+    If {recursive_descent} then there aren't any tables, it's an LL(1) recursive descent parser instead,
+    which needs the grammar to be LL(1), but is faster when it is
+    If {recursive_ascent} then it's still LR, but the tables are turned into code, see recursive_ascent_to_string
     """
 
     def __init__(
@@ -18,14 +41,29 @@ class ParserGenerator:
         filename: str,
         ast_members: list[str],
         ast_functions: list[str],
+        packed: bool = True,
+        compressed: bool = False,
+        lalr1: bool = False,
+        lr1: bool = False,
+        recursive_descent: bool = False,
+        recursive_ascent: bool = False,
     ):
         self.g = g
         self.cfg = g.cfg
         self.filename = filename
         self.ast_members = ast_members
         self.ast_functions = ast_functions
+        self.packed = packed
+        self.compressed = compressed
+        self.lalr1 = lalr1
+        self.lr1 = lr1
+        self.recursive_descent = recursive_descent
+        self.recursive_ascent = recursive_ascent
         # Squash the dict of lists
         self.production_list = [x for y in self.cfg.P.values() for x in y]
+        self.production_ids = {prod: p for p, prod in enumerate(self.production_list)}
+        self.terminal_ids = {t: i for i, t in enumerate(self.g.terminals)}
+        self.nonterminal_ids = {n: i for i, n in enumerate(self.g.nonterminals)}
 
     @staticmethod
     def dict_to_string(d: dict[str, str], indent: int = 0) -> str:
@@ -35,12 +73,22 @@ class ParserGenerator:
         dict_string += f"{' ' * (indent)}}}"
         return dict_string
 
+    def action_table(self) -> dict[int, dict[Terminal, Optional[LR0_Action]]]:
+        if self.lr1:
+            return self.cfg.lr1_action
+        return self.cfg.lalr1_action if self.lalr1 else self.cfg.slr1_action
+
+    def goto_table(self) -> dict[int, dict[NonTerminal, Optional[int]]]:
+        if self.lr1:
+            return self.cfg.lr1_goto
+        return self.cfg.lalr1_goto if self.lalr1 else self.cfg.slr1_goto
+
     def action_to_string(self) -> str:
         def stringify(a: LR0_Action) -> str:
             if isinstance(a, LR0_Shift):
                 return f'LR0_Shift(Terminal("{a.t.name}"), {a.next_state})'
             elif isinstance(a, LR0_Reduce):
-                return f"LR0_Reduce(_P[{self.production_list.index(a.prod)}])"
+                return f"LR0_Reduce(_P[{self.production_ids[a.prod]}])"
             else:
                 assert isinstance(a, LR0_Accept), a
                 return "LR0_Accept()"
@@ -52,7 +100,7 @@ class ParserGenerator:
                 )
                 for t, action in row.items()
             }
-            for i, row in self.cfg.slr1_action.items()
+            for i, row in self.action_table().items()
         }
         stringified_Action_1_level = {
             k: ParserGenerator.dict_to_string(v, indent=4)
@@ -69,7 +117,7 @@ class ParserGenerator:
             str(i): {
                 f'NonTerminal("{n}")': str(goto_item) for n, goto_item in row.items()
             }
-            for i, row in self.cfg.slr1_goto.items()
+            for i, row in self.goto_table().items()
         }
         stringified_Goto_1_level = {
             k: ParserGenerator.dict_to_string(v, indent=4)
@@ -81,6 +129,53 @@ class ParserGenerator:
             + "\n\n"
         )
 
+    def packed_tables(self) -> PackedTables:
+        return PackedTables.from_tables(
+            self.action_table(),
+            self.goto_table(),
+            self.g.terminals + [dollar],
+            self.g.nonterminals,
+            self.production_list,
+        )
+
+    def packed_tables_to_string(self) -> str:
+        tables = self.packed_tables()
+        return (
+            "_Tables = PackedTables(\n"
+            + "    terminals=_T + [dollar],\n"
+            + "    nonterminals=_N,\n"
+            + f'    action="{PackedTables.encode(tables.action)}",\n'
+            + f'    goto="{PackedTables.encode(tables.goto)}",\n'
+            + f'    prod_lengths="{PackedTables.encode(tables.prod_lengths)}",\n'
+            + f'    prod_lhs="{PackedTables.encode(tables.prod_lhs)}",\n'
+            + ")\n\n"
+        )
+
+    def compressed_tables_to_string(self) -> str:
+        tables = CompressedTables.from_packed(self.packed_tables())
+        arrays = [
+            "default_reductions",
+            "action_base",
+            "action_check",
+            "action_value",
+            "default_gotos",
+            "goto_base",
+            "goto_check",
+            "goto_value",
+            "prod_lengths",
+            "prod_lhs",
+        ]
+        return (
+            "_Tables = CompressedTables(\n"
+            + "    terminals=_T + [dollar],\n"
+            + "    nonterminals=_N,\n"
+            + "".join(
+                f'    {name}="{PackedTables.encode(getattr(tables, name))}",\n'
+                for name in arrays
+            )
+            + ")\n\n"
+        )
+
     def terminals_to_string(self) -> str:
         return (
             "_T: list[Terminal] = [\n"
@@ -98,15 +193,17 @@ class ParserGenerator:
     def productions_to_string(self) -> str:
         production_strings: list[str] = []
         for prod in self.production_list:
-            rhs = f"_N[{self.g.nonterminals.index(prod.LHS)}]"
+            rhs = f"_N[{self.nonterminal_ids[prod.LHS]}]"
 
             rhs_strings: list[str] = []
             for symbol in prod.RHS:
-                if isinstance(symbol, Terminal):
-                    rhs_strings.append(f"_T[{self.g.terminals.index(symbol)}]")
+                if symbol == epsilon:
+                    rhs_strings.append("epsilon")
+                elif isinstance(symbol, Terminal):
+                    rhs_strings.append(f"_T[{self.terminal_ids[symbol]}]")
                 else:
                     assert isinstance(symbol, NonTerminal)
-                    rhs_strings.append(f"_N[{self.g.nonterminals.index(symbol)}]")
+                    rhs_strings.append(f"_N[{self.nonterminal_ids[symbol]}]")
             if len(rhs_strings) < 8:  # Fairly arbitrary limit
                 production_string = f"    Production({rhs}, ["
                 production_string += ", ".join(rhs_strings)
@@ -123,20 +220,28 @@ class ParserGenerator:
             production_strings.append(production_string)
         return "_P: list[Production] = [\n" + "".join(production_strings) + "]\n\n"
 
-    def regexes_to_string(self) -> str:
-        regex_string_list: list[str] = []
-        for t, r, actions in self.g.terminal_triples:
-            escaped_r = (
-                r.replace("\\", "\\\\").replace("\n", "\\n").replace("\t", "\\t")
-            )
-            regex_string = f'    (Terminal("{t.name}"), "{escaped_r}", ['
-            regex_string += ", ".join(f'"{action}"' for action in actions)
-            regex_string += "]),\n"
-            regex_string_list.append(regex_string)
+    def lexer_table_to_string(self) -> str:
+        """The lexer for the grammar's terminals, already run through the regex -> NFA -> DFA pipeline"""
+        table = get_lexer(self.g.terminal_triples).table
+        accept = {str(q): str(token_index) for q, token_index in table.accept.items()}
+        token_strings = [
+            f'        (Terminal("{t.name}"), ['
+            + ", ".join(f'"{action}"' for action in actions)
+            + "]),\n"
+            for t, actions in table.tokens
+        ]
         return (
-            "_Regexes: list[tuple[Terminal, str, list[str]]] = [\n"
-            + "".join(regex_string_list)
-            + "]\n\n"
+            "_LexerTable = LexerTable(\n"
+            + f'    starts="{ClassMap.encode_starts(table.class_map.starts)}",\n'
+            + f'    classes="{LexerTable.encode_classes(table.class_map.classes)}",\n'
+            + f'    rows="{LexerTable.encode_rows(table.rows)}",\n'
+            + f"    start={table.start},\n"
+            + f"    dead={table.dead},\n"
+            + f"    accept={ParserGenerator.dict_to_string(accept, indent=4)},\n"
+            + "    tokens=[\n"
+            + "".join(token_strings)
+            + "    ],\n"
+            + ")\n\n"
         )
 
     def generate_ast_classes(self) -> str:
@@ -192,16 +297,315 @@ class {n}(GeneratedAST):
         generated += "}\n\n"
         return generated
 
+    def recursive_descent_to_string(self) -> str:
+        """An LL(1) recursive descent parser, with a function for each NonTerminal which picks a production
+        by comparing the kind of the next token, which is its number in _T (or len(_T) for $), against the ones
+        CFG.ll1_parse_table predicts it on, and then parses each symbol of it in turn.
+        They share a _Tokens with the next token in it, which pulls them from the source one at a time, so it streams.
+        If a production ends with its own NonTerminal, e.g. E' -> + T E', then that's a loop rather than a call,
+        and the semantic actions get done on the way back out, so long lists don't need deep recursion.
+        Like the LR parsers it gives back the value of the original start symbol, not the S -> E we added.
+        It has to go after the semantic actions, because it looks them up once up front"""
+        terminal_ids = dict(self.terminal_ids)
+        terminal_ids[dollar] = len(self.g.terminals)
+        table = self.cfg.ll1_parse_table
+        conflicts = [
+            (n, t, prods)
+            for n, row in table.items()
+            for t, prods in row.items()
+            if len(prods) > 1
+        ]
+        assert len(conflicts) == 0, ("Grammar isn't LL(1)", conflicts)
+
+        def kinds_test(kinds: list[int]) -> str:
+            # A production that's never predicted gets "k in ()", which is never true
+            if len(kinds) == 1:
+                return f"k == {kinds[0]}"
+            return f"k in ({', '.join(str(k) for k in kinds)})"
+
+        generated = (
+            "_TerminalIds: dict[Terminal, int] = {t: i for i, t in enumerate(_T)}\n"
+        )
+        generated += "_TerminalIds[dollar] = len(_T)\n"
+        for i, n in enumerate(self.g.nonterminals):
+            generated += f"_action_{n} = _semantic_actions[_N[{i}]]\n"
+        generated += '''
+
+class _Tokens:
+    """The next token and its kind, pulled from {source} one at a time, so it can be a stream"""
+
+    __slots__ = ("source", "token", "kind", "i")
+
+    def __init__(self, source: Iterator[Terminal]):
+        self.source = source
+        self.i = -1
+        self.next()
+
+    def next(self) -> None:
+        self.token = next(self.source, dollar)
+        self.kind = _TerminalIds.get(self.token, -1)
+        self.i += 1
+
+    def error(self, kinds: list[int]) -> ParseError:
+        return ParseError(
+            "Unexpected token, unable to proceed"
+            if self.kind >= 0
+            else "Unexpected token, not a terminal of the grammar",
+            self.i,
+            self.token,
+            [(_T + [dollar])[k] for k in kinds],
+        )
+
+'''
+
+        for n in self.g.nonterminals:
+            productions = self.cfg.P[n]
+            predicted: dict[Production, list[int]] = {prod: [] for prod in productions}
+            for t, prods in table[n].items():
+                for prod in prods:
+                    predicted[prod].append(terminal_ids[t])
+            loops = any(len(prod.RHS) > 0 and prod.RHS[-1] == n for prod in productions)
+            indent = "        " if loops else "    "
+
+            generated += f"""
+def _parse_{n}(p: _Tokens) -> Any:
+"""
+            if loops:
+                generated += "    frames: list[list[Any]] = []\n"
+                generated += "    while True:\n"
+            generated += f"{indent}k = p.kind\n"
+            for prod in productions:
+                generated += f"{indent}if {kinds_test(sorted(predicted[prod]))}:\n"
+                rhs = [s for s in prod.RHS if s != epsilon]
+                is_loop = loops and len(rhs) > 0 and rhs[-1] == n
+                if is_loop:
+                    rhs = rhs[:-1]
+                for j, symbol in enumerate(rhs):
+                    if isinstance(symbol, NonTerminal):
+                        generated += f"{indent}    x{j} = _parse_{symbol}(p)\n"
+                        continue
+                    assert isinstance(symbol, Terminal), symbol
+                    k = terminal_ids[symbol]
+                    if j > 0:
+                        # The first one is what we predicted on, so it's already been checked
+                        generated += f"{indent}    if p.kind != {k}:\n"
+                        generated += f"{indent}        raise p.error([{k}])\n"
+                    generated += f"{indent}    x{j} = p.token\n"
+                    generated += f"{indent}    p.next()\n"
+                children = "[" + ", ".join(f"x{j}" for j in range(len(rhs))) + "]"
+                if is_loop:
+                    generated += f"{indent}    frames.append({children})\n"
+                    generated += f"{indent}    continue\n"
+                elif loops:
+                    generated += f"{indent}    result = _action_{n}({children})\n"
+                    generated += f"{indent}    break\n"
+                else:
+                    generated += f"{indent}    return _action_{n}({children})\n"
+            expected = sorted(k for kinds in predicted.values() for k in kinds)
+            generated += f"{indent}raise p.error({expected})\n"
+            if loops:
+                generated += "    while frames:\n"
+                generated += "        xs = frames.pop()\n"
+                generated += "        xs.append(result)\n"
+                generated += f"        result = _action_{n}(xs)\n"
+                generated += "    return result\n"
+            generated += "\n"
+
+        generated += f"""
+def _parse(source: Iterable[Terminal]) -> Any:
+    p = _Tokens(iter(source))
+    result = _parse_{self.cfg.original_E}(p)
+    if p.token != dollar:
+        raise ParseError("Unexpected tokens at end of file", p.i, p.token, [dollar])
+    # The $ can be there or not, but there can't be anything after it
+    extra = next(p.source, None)
+    if extra is not None:
+        raise ParseError("Unexpected tokens at end of file", p.i + 1, extra, [dollar])
+    return result
+
+"""
+        return generated
+
+    def recursive_ascent_to_string(self) -> str:
+        """The LR parser as code rather than tables, in the style of recursive ascent,
+        with a function for each state which chooses what to do by comparing the kind of the next token
+        (its number in _T, or len(_T) for $), so there's no table lookup on each step.
+        Shifting calls the function for the state we go to, so the Python stack is the parser's stack of states.
+        Reducing by A -> α pushes A's value and returns (A, |α|), and each function that gets that back
+        passes it on with one less, until it gets to the state α started from, which then does the GOTO on A
+        by calling that state's function and carries on with whatever comes back from it.
+        Accepting returns _ACCEPT as the count, which is big enough that it goes all the way back out.
+        It has to go after the semantic actions, because it looks them up once up front"""
+        terminal_ids = dict(self.terminal_ids)
+        terminal_ids[dollar] = len(self.g.terminals)
+        actions = self.action_table()
+        gotos = self.goto_table()
+
+        def mask(kinds: list[int]) -> str:
+            return "0x" + format(sum(1 << k for k in kinds), "X")
+
+        def kinds_test(kinds: list[int]) -> str:
+            # Lots of kinds would be a long line and a long tuple to go through, so they're a bitset instead
+            if len(kinds) == 1:
+                return f"k == {kinds[0]}"
+            elif len(kinds) <= 3:
+                return f"k in ({', '.join(str(k) for k in kinds)})"
+            return f"(1 << k) & {mask(kinds)}"
+
+        generated = (
+            "_TerminalIds: dict[Terminal, int] = {t: i for i, t in enumerate(_T)}\n"
+        )
+        generated += "_TerminalIds[dollar] = len(_T)\n"
+        generated += "_ACCEPT = sys.maxsize\n"
+        for i, n in enumerate(self.g.nonterminals):
+            generated += f"_action_{n} = _semantic_actions[_N[{i}]]\n"
+        generated += '''
+
+class _Parse:
+    """Where we've got to in the input, and the values of everything on the stack.
+    The tokens are pulled from {source} one at a time, so it can be a stream"""
+
+    __slots__ = ("source", "token", "kind", "i", "values", "limit", "grow_at")
+
+    def __init__(self, source: Iterator[Terminal]):
+        self.source = source
+        self.values: list[Any] = []
+        self.limit = sys.getrecursionlimit()
+        self.grow_at = 1024
+        self.i = -1
+        self.next()
+
+    def next(self) -> None:
+        self.token = next(self.source, dollar)
+        # Something that's not a terminal of the grammar gets a kind that none of the bitsets have
+        self.kind = _TerminalIds.get(self.token, len(_T) + 1)
+        self.i += 1
+        if self.i == self.grow_at:
+            # The Python stack is the parser's stack, which can get as deep as the input is long,
+            # and we don't know how long that is until we get there
+            # Python functions calling each other don't use up the C stack, so this is fine
+            self.grow_at *= 2
+            sys.setrecursionlimit(self.limit + 2 * self.grow_at)
+
+    def error(self, kinds: int) -> ParseError:
+        """{kinds} is a bitset of the kinds of token we could have had"""
+        return ParseError(
+            "Unexpected token, unable to proceed"
+            if self.kind <= len(_T)
+            else "Unexpected token, not a terminal of the grammar",
+            self.i,
+            self.token,
+            [t for k, t in enumerate(_T + [dollar]) if kinds >> k & 1],
+        )
+
+'''
+
+        for s, row in actions.items():
+            # Terminals with the same action get one test between them
+            groups: dict[tuple[str, int], list[int]] = {}
+            for t, action in row.items():
+                if isinstance(action, LR0_Shift):
+                    assert action.next_state is not None, (s, t, action)
+                    key = ("shift", action.next_state)
+                elif isinstance(action, LR0_Reduce):
+                    key = ("reduce", self.production_ids[action.prod])
+                elif isinstance(action, LR0_Accept):
+                    key = ("accept", 0)
+                else:
+                    assert action is None, action
+                    continue
+                groups.setdefault(key, []).append(terminal_ids[t])
+            goto_row = [(n, g) for n, g in gotos[s].items() if g is not None]
+            if len(groups) == 0 and len(goto_row) == 0:
+                # The empty state at the end of the LR(0) automaton, which nothing goes to
+                continue
+            returns = len(goto_row) > 0 or any(kind == "shift" for kind, _ in groups)
+
+            generated += f"""
+def _state_{s}(p: _Parse) -> tuple[int, int]:
+    k = p.kind
+"""
+            first = True
+            for (kind, target), kinds in groups.items():
+                generated += (
+                    f"    {'if' if first else 'elif'} {kinds_test(sorted(kinds))}:\n"
+                )
+                first = False
+                if kind == "shift":
+                    generated += "        p.values.append(p.token)\n"
+                    generated += "        p.next()\n"
+                    generated += f"        lhs, depth = _state_{target}(p)\n"
+                elif kind == "accept":
+                    generated += "        return -1, _ACCEPT\n"
+                else:
+                    prod = self.production_list[target]
+                    lhs = self.nonterminal_ids[prod.LHS]
+                    length = len([x for x in prod.RHS if x != epsilon])
+                    if length == 0:
+                        # Nothing to pop, so it's this state that does the GOTO
+                        generated += (
+                            f"        p.values.append(_action_{prod.LHS}([]))\n"
+                        )
+                        generated += f"        lhs, depth = {lhs}, 1\n"
+                    else:
+                        generated += "        values = p.values\n"
+                        generated += f"        xs = values[-{length}:]\n"
+                        generated += f"        del values[-{length}:]\n"
+                        generated += f"        values.append(_action_{prod.LHS}(xs))\n"
+                        generated += f"        return {lhs}, {length}\n"
+            expected = [k for kinds in groups.values() for k in kinds]
+            generated += "    else:\n"
+            generated += f"        raise p.error({mask(expected)})\n"
+
+            if returns:
+                if len(goto_row) == 0:
+                    # Only shifts, so whatever comes back has to be popping this state too
+                    generated += '    assert depth > 1, ("Unable to GOTO", lhs)\n'
+                else:
+                    generated += "    while depth == 1:\n"
+                for j, (n, g) in enumerate(goto_row):
+                    if j == len(goto_row) - 1:
+                        # It has to be this one, the tables wouldn't have had this reduction otherwise
+                        test = "else" if j > 0 else ""
+                    else:
+                        test = f"{'if' if j == 0 else 'elif'} lhs == {self.nonterminal_ids[n]}"
+                    if test == "":
+                        generated += f"        lhs, depth = _state_{g}(p)\n"
+                    else:
+                        generated += f"        {test}:\n"
+                        generated += f"            lhs, depth = _state_{g}(p)\n"
+                generated += "    return lhs, depth - 1\n"
+            generated += "\n"
+
+        generated += """
+def _parse(source: Iterable[Terminal]) -> Any:
+    p = _Parse(iter(source))
+    sys.setrecursionlimit(p.limit + 2 * p.grow_at)
+    try:
+        _state_0(p)
+    finally:
+        sys.setrecursionlimit(p.limit)
+    # It only accepts on $, which can be there or not, but there can't be anything after it
+    extra = next(p.source, None)
+    if extra is not None:
+        raise ParseError("Unexpected tokens at end of file", p.i + 1, extra, [dollar])
+    return p.values[0]
+
+"""
+        return generated
+
     def generate(
         self,
     ) -> None:  # pragma: no cover, This is tested by testing the generated parsers
-        imports: list[tuple[Optional[str], str]] = [
-            ("common", "Production"),
-            (None, "argparse"),
-        ]
+        # parser_stub has the rest of what they need, e.g. Production and Terminal
+        imports: list[tuple[Optional[str], str]] = [(None, "argparse")]
 
         if "Class Methods" in self.g.optional_data:
             imports.append((None, "abc"))
+        if any(epsilon in prod.RHS for prod in self.production_list):
+            imports.append(("common", "epsilon"))
+        if self.recursive_ascent:
+            imports.append((None, "sys"))
 
         with open(self.filename, "w+", encoding="utf-8") as f:
             if "Prefix" in self.g.optional_data:
@@ -220,18 +624,50 @@ class {n}(GeneratedAST):
             f.write(self.terminals_to_string())
             f.write(self.nonterminals_to_string())
             f.write(self.productions_to_string())
-            f.write(self.action_to_string())
-            f.write(self.goto_to_string())
-            f.write(self.regexes_to_string())
+            # The recursive parsers use the Python stack, so there are no stacks for debug to check
+            debug = not (self.recursive_descent or self.recursive_ascent)
+            if self.recursive_descent or self.recursive_ascent:
+                parse_call = "_parse(source)"
+            elif self.compressed:
+                f.write(self.compressed_tables_to_string())
+                parse_call = "_Tables.parse(_semantic_actions, source, debug)"
+            elif self.packed:
+                f.write(self.packed_tables_to_string())
+                parse_call = "_Tables.parse(_semantic_actions, source, debug)"
+            else:
+                f.write(self.action_to_string())
+                f.write(self.goto_to_string())
+                parse_call = (
+                    "parse_internal(_Action, _Goto, _semantic_actions, source, debug)"
+                )
+            f.write(self.lexer_table_to_string())
             f.write(self.generate_ast_classes())
             f.write(self.generate_semantic_actions())
+            if self.recursive_descent:
+                f.write(self.recursive_descent_to_string())
+            elif self.recursive_ascent:
+                f.write(self.recursive_ascent_to_string())
+            debug_parameter = ", debug: bool = False" if debug else ""
+            debug_argument = ", args.debug" if debug else ""
+            debug_option = (
+                """
+    parser.add_argument(
+        "--debug", action="store_true", help="Check the parser's stacks on every step"
+    )"""
+                if debug
+                else ""
+            )
             f.write(f"""
 def lex(source: str) -> list[Terminal]:
-    return lex_internal(_Regexes, source)
+    return lex_internal(_LexerTable, source)
+
 
+def iter_tokens(stream: TextIO) -> Iterator[Terminal]:
+    return iter_tokens_internal(_LexerTable, stream)
 
-def parse(source: list[Terminal]) -> str:
-    return parse_internal(_Action, _Goto, _semantic_actions, source)
+
+def parse(source: Iterable[Terminal]{debug_parameter}) -> Any:
+    return {parse_call}
 
 
 def main() -> None:
@@ -241,18 +677,18 @@ def main() -> None:
     )
 
     parser.add_argument("filename", nargs="?")
-    parser.add_argument("--source", action="store")
+    parser.add_argument("--source", action="store"){debug_option}
 
     args = parser.parse_args()
 
     if args.source:
-        print(parse(lex(args.source)))
+        print(parse(lex(args.source){debug_argument}))
     else:
         if not args.filename:
             parser.print_help()
             exit()
         with open(args.filename, "r", encoding="utf-8") as f:
-            print(parse(lex(f.read())))
+            print(parse(iter_tokens(f){debug_argument}))
 
 
 if __name__ == "__main__":
@@ -268,3 +704,19 @@ def main() -> None:
     g = Grammar.from_file("slang.grammar", add_starting_production=True)
     pg = ParserGenerator(g, "generated_slang_parser.py", [], [])
     pg.generate()
+
+    g = Grammar.from_file("g2.grammar", add_starting_production=True)
+    pg = ParserGenerator(g, "generated_g2_ra_parser.py", [], [], recursive_ascent=True)
+    pg.generate()
+
+    g = Grammar.from_file("slang.grammar", add_starting_production=True)
+    pg = ParserGenerator(
+        g, "generated_slang_ra_parser.py", [], [], recursive_ascent=True
+    )
+    pg.generate()
+
+    g = Grammar.from_file("g2_ll1.grammar", add_starting_production=True)
+    pg = ParserGenerator(
+        g, "generated_g2_ll1_parser.py", [], [], recursive_descent=True
+    )
+    pg.generate()
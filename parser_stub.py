@@ -1,141 +1,122 @@
 from common import (
     Terminal,
     NonTerminal,
+    Production,
     LR0_Action,
     LR0_Shift,
     LR0_Reduce,
     LR0_Accept,
     dollar,
 )
-from lexer import Lexer
+from lexer_table import LexerTable
+from packed_tables import ParseError as ParseError  # Used by the generated parsers
+from packed_tables import lr_parse, ERROR, NO_GOTO
+from packed_tables import PackedTables as PackedTables  # Used by the generated parsers
+from packed_tables import CompressedTables as CompressedTables  # Ditto
 
-from typing import Any, Callable, Optional
+from collections.abc import Iterable, Iterator
+from typing import Any, Callable, Optional, TextIO
 
 
-def lex_internal(
-    Regexes: list[tuple[Terminal, str, list[str]]], source: str
-) -> list[Terminal]:
-    # I don't particularly want to be importing the entire Lexer implementation here
-    # But it gets it working for now
-    lexer = Lexer(Regexes)
-    return lexer.lex(source) + [dollar]
+def lex_internal(lexer_table: LexerTable, source: str) -> list[Terminal]:
+    return lexer_table.lex(source) + [dollar]
 
 
-class ParseError(Exception):
+def iter_tokens_internal(lexer_table: LexerTable, stream: TextIO) -> Iterator[Terminal]:
+    return lexer_table.iter_tokens(stream)
+
+
+class DictAction:
+    """An ACTION table as dicts, e.g. CFG.slr1_action, as a Lookup for lr_parse.
+    Every row has every terminal in, so they're numbered by the first one.
+    Productions get numbered as we come across them, so that nothing has to be worked out from the whole of
+    the table on every parse, and number 0 is saved for accepting"""
+
     def __init__(
         self,
-        message: str,
-        source_index: int,
-        source: list[Terminal],
-        valid_terminals: list[Terminal],
+        Action: dict[int, dict[Terminal, Optional[LR0_Action]]],
+        nonterminal_ids: dict[NonTerminal, int],
+        semantic_actions: dict[NonTerminal, Callable[[list[Any]], Any]],
+        debug: bool,
     ):
-        self.message = message
-        self.source_index = source_index
-        self.source = source
-        self.valid_terminals = valid_terminals
+        self.Action = Action
+        self.terminals = list(Action[0])
+        self.nonterminal_ids = nonterminal_ids
+        self.semantic_actions = semantic_actions
+        self.debug = debug
+        self.production_ids: dict[Production, int] = {}
+        self.prod_lengths = [0]
+        self.prod_lhs = [-1]
+        # Only filled in for the nonterminals we reduce to, so there don't have to be actions for the others
+        self.actions_by_id: list[Callable[[list[Any]], Any]] = [
+            lambda xs: None for _ in nonterminal_ids
+        ]
+
+    def __getitem__(self, i: int) -> int:
+        s, t = divmod(i, len(self.terminals))
+        a = self.Action[s].get(self.terminals[t])
+        if isinstance(a, LR0_Shift):
+            assert a.next_state is not None, ("Invalid Shift Action", s, a)
+            if self.debug:
+                assert a.t == self.terminals[t], ("Invalid Shift Action", s, a)
+            return a.next_state
+        if isinstance(a, LR0_Reduce):
+            p = self.production_ids.get(a.prod)
+            if p is None:
+                lhs = self.nonterminal_ids[a.prod.LHS]
+                self.actions_by_id[lhs] = self.semantic_actions[a.prod.LHS]
+                p = self.production_ids[a.prod] = len(self.prod_lengths)
+                self.prod_lengths.append(len(a.prod))
+                self.prod_lhs.append(lhs)
+            return -p - 1
+        if isinstance(a, LR0_Accept):
+            return -1
+        assert a is None, ("Invalid ACTION table", s, a)
+        return ERROR
+
+    def valid_terminals(self, state: int) -> list[Terminal]:
+        return [t for t, a in self.Action[state].items() if a is not None]
 
-    def __str__(self) -> str:
-        return f"""Parse Error {self.message} at index {self.source_index} ({self.source[self.source_index]}).
-        Expected one of {[str(t) for t in self.valid_terminals]}
-        Full text: {self.source}"""
+
+class DictGoto:
+    """A GOTO table as dicts, e.g. CFG.slr1_goto, as a Lookup for lr_parse, with the nonterminals numbered by
+    the first row"""
+
+    def __init__(self, Goto: dict[int, dict[NonTerminal, Optional[int]]]):
+        self.Goto = Goto
+        self.nonterminals = list(Goto[0])
+
+    def __getitem__(self, i: int) -> int:
+        s, n = divmod(i, len(self.nonterminals))
+        next_state = self.Goto[s][self.nonterminals[n]]
+        return NO_GOTO if next_state is None else next_state
 
 
 def parse_internal(
     Action: dict[int, dict[Terminal, Optional[LR0_Action]]],
     Goto: dict[int, dict[NonTerminal, Optional[int]]],
     semantic_actions: dict[NonTerminal, Callable[[list[Any]], Any]],
-    source: list[Terminal],
-) -> str:
-    def valid_terminals(state: int) -> list[Terminal]:
-        return [t for t, a in Action[state].items() if a is not None]
-
-    parser_stack = [0]
-    semantic_stack: list[Any] = []
-    source_index = 0
-    assert len(parser_stack) == len(semantic_stack) + 1, (
-        "Error - invalid stack lengths",
-        parser_stack,
-        semantic_stack,
+    source: Iterable[Terminal],
+    debug: bool = False,
+) -> Any:
+    """lr_parse on the dict tables, e.g. CFG.slr1_action and CFG.slr1_goto, or the ones in a generated parser"""
+    goto = DictGoto(Goto)
+    action = DictAction(
+        Action,
+        {n: i for i, n in enumerate(goto.nonterminals)},
+        semantic_actions,
+        debug,
+    )
+    return lr_parse(
+        action,
+        goto,
+        action.valid_terminals,
+        {t: i for i, t in enumerate(action.terminals)},
+        len(goto.nonterminals),
+        action.prod_lengths,
+        action.prod_lhs,
+        action.actions_by_id,
+        source,
+        debug,
+        accept=0,
     )
-
-    while True:
-        assert source_index < len(source), (
-            "Unexpected EOF, are you missing the dollar?",
-            source_index - 1,
-            source,
-        )
-        a = source[source_index]
-        s = parser_stack[-1]
-        action = Action[s][a]
-        if action is None:
-            raise ParseError(
-                "Unexpected token, unable to proceed",
-                source_index,
-                source,
-                valid_terminals(s),
-            )
-        if isinstance(action, LR0_Shift):
-            assert a == action.t, ("Invalid Shift Action", s, a, action)
-            assert action.next_state is not None, ("Invalid Shift Action", s, a, action)
-            parser_stack.append(action.next_state)
-            semantic_stack.append(a)
-            assert len(parser_stack) == len(semantic_stack) + 1, (
-                "Error - invalid stack lengths",
-                parser_stack,
-                semantic_stack,
-            )
-            source_index += 1
-        elif isinstance(action, LR0_Reduce):
-            assert len(parser_stack) > len(action.prod), (
-                "Invalid Reduce Action",
-                s,
-                a,
-                action,
-                parser_stack,
-            )
-            assert len(semantic_stack) >= len(action.prod), (
-                "Invalid Reduce Action",
-                s,
-                a,
-                action,
-                semantic_stack,
-            )
-            parser_stack = parser_stack[: -1 * len(action.prod)]
-            semantic_elements = semantic_stack[-1 * len(action.prod) :]
-            semantic_stack = semantic_stack[: -1 * len(action.prod)]
-
-            next_state = Goto[parser_stack[-1]][action.prod.LHS]
-            assert next_state is not None, (
-                "Unable to GOTO due to invalid stack state",
-                source_index,
-                source,
-                valid_terminals(s),
-            )
-            parser_stack.append(next_state)
-            semantic_stack.append(semantic_actions[action.prod.LHS](semantic_elements))
-            assert len(parser_stack) == len(semantic_stack) + 1, (
-                "Error - invalid stack lengths",
-                parser_stack,
-                semantic_stack,
-            )
-        else:
-            assert isinstance(action, LR0_Accept), (
-                "Invalid ACTION table",
-                s,
-                a,
-                action,
-            )
-            assert source_index == len(source) - 1, (
-                "Unexpected tokens at end of file",
-                source_index,
-                source,
-            )
-            assert len(parser_stack) == 2 and parser_stack[0] == 0, (
-                "Unexpected tokens on parser_stack",
-                parser_stack,
-            )
-            assert len(semantic_stack) == 1, (
-                "Incorrect semantic stack",
-                semantic_stack,
-            )
-            return semantic_stack[0]
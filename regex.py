@@ -1,3 +1,4 @@
+from intervals import IntervalSet
 import util
 
 import abc
@@ -25,6 +26,7 @@ class Regex:
            | (r + r) # Using + for OR
            | rr
            | (r)*
+           | [a-z...] # Any of the characters, or [^a-z...] for any character except them
         """
 
         escapable_chars = ["(", ")", "\\"]
@@ -98,9 +100,18 @@ class Regex:
         elif regex_string[0] == "[":
             # Range Regex
             close_bracket_position = regex_string.find("]")
-            first_part = RangeRegex(
-                util.range_string_to_set(regex_string[: close_bracket_position + 1])
-            )
+            if regex_string.startswith("[^"):
+                # Negated, so this is everything that's not in the rest of it, including non-ascii
+                excluded = util.range_string_to_set(
+                    "[" + regex_string[2 : close_bracket_position + 1]
+                )
+                first_part = RangeRegex(
+                    IntervalSet.from_characters(excluded - {""}).complement()
+                )
+            else:
+                first_part = RangeRegex(
+                    util.range_string_to_set(regex_string[: close_bracket_position + 1])
+                )
             continuation = regex_string[close_bracket_position + 1 :]
         elif regex_string[0] == "\\":
             assert regex_string[1] in escapable_chars, regex_string
@@ -145,16 +156,24 @@ class CharacterRegex(Regex):
 
 
 class RangeRegex(Regex):
-    def __init__(self, characters: set[str]):
-        self.characters: set[str] = characters
-        for character in self.characters:
-            assert len(character) == 1, character
+    """Any one of {characters}, which are stored as ranges of code points so it can be huge.
+    If it's given a set with ε in it, then it matches the empty string as well"""
+
+    def __init__(self, characters: set[str] | IntervalSet):
+        self.nullable = False
+        if isinstance(characters, IntervalSet):
+            self.characters = characters
+        else:
+            for character in characters:
+                assert len(character) in {0, 1}, character
+            self.nullable = "" in characters
+            self.characters = IntervalSet.from_characters(characters - {""})
 
     def __str__(self) -> str:
-        return f"RangeRegex({self.characters})"
+        return f"RangeRegex({'ε' if self.nullable else ''}{self.characters})"
 
     def test_string(self, string: str) -> bool:
-        return string in self.characters
+        return (self.nullable and string == "") or string in self.characters
 
 
 class OrRegex(Regex):
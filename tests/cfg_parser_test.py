@@ -1,11 +1,9 @@
-from cfg_parser import Parser
-from cfg import g3_prime
-from common import Terminal
+from cfg_parser import Parser, ParseTree
+from cfg import CFG, g3_prime
+from common import NonTerminal, Terminal, Production, dollar, epsilon
+from packed_tables import ParseError
 
-"""
-No great way to test this as the parser doesn't produce a parse tree.
-So just check the Predict/Consume lines in stdout
-"""
+import pytest
 
 
 def test_g3_prime_output(capfd):
@@ -17,7 +15,7 @@ def test_g3_prime_output(capfd):
     o_bracket = Terminal("(")
     c_bracket = Terminal(")")
 
-    p.parse([o_bracket, x, plus, y, c_bracket])
+    p.parse([o_bracket, x, plus, y, c_bracket], trace=print)
 
     out, _ = capfd.readouterr()
     lines = out.strip().split("\n")
@@ -43,6 +41,148 @@ Predict ε
 Consume )
 Predict ε
 Predict ε
+Consume $
     """.strip().split("\n")
 
     assert lines == expected_output
+
+
+def test_no_output_without_trace(capfd):
+    p = Parser(g3_prime())
+    tokens = [Terminal("id", "x"), Terminal("*"), Terminal("id", "y")]
+    p.parse(tokens)
+
+    out, _ = capfd.readouterr()
+    assert out == ""
+    assert len(tokens) == 3, "The $ shouldn't be added to the caller's list"
+
+
+def test_parse_tree():
+    cfg = g3_prime()
+    S, E, E_prime, T, T_prime, F = cfg.nonterminals_order
+    x = Terminal("id", "x")
+    times = Terminal("*")
+
+    tree = Parser(cfg).parse(iter([x, times, x]))
+
+    def F_x() -> ParseTree:
+        return ParseTree(Production(F, [Terminal("id")]), [x])
+
+    T_prime_epsilon = ParseTree(Production(T_prime, [epsilon]), [])
+    E_prime_epsilon = ParseTree(Production(E_prime, [epsilon]), [])
+    T_tree = ParseTree(
+        Production(T, [F, T_prime]),
+        [
+            F_x(),
+            ParseTree(
+                Production(T_prime, [times, F, T_prime]),
+                [times, F_x(), T_prime_epsilon],
+            ),
+        ],
+    )
+    E_tree = ParseTree(Production(E, [T, E_prime]), [T_tree, E_prime_epsilon])
+    assert tree == ParseTree(Production(S, [E, dollar]), [E_tree, dollar])
+    assert tree.children[1].identical_to(dollar)
+
+
+def test_semantic_actions():
+    # Evaluate expressions, where E' and T' give back the function that applies the rest of the operators
+    cfg = g3_prime()
+    S, E, E_prime, T, T_prime, F = cfg.nonterminals_order
+
+    def rest(xs, op):
+        if len(xs) == 0:
+            return lambda v: v
+        _, operand, then = xs
+        return lambda v: then(op(v, operand))
+
+    semantic_actions = {
+        S: lambda xs: xs[0],
+        E: lambda xs: xs[1](xs[0]),
+        E_prime: lambda xs: rest(xs, lambda a, b: a + b),
+        T: lambda xs: xs[1](xs[0]),
+        T_prime: lambda xs: rest(xs, lambda a, b: a * b),
+        F: lambda xs: int(xs[0].value) if len(xs) == 1 else xs[1],
+    }
+
+    def tokens(s: str) -> list[Terminal]:
+        return [Terminal("id", c) if c.isdigit() else Terminal(c) for c in s]
+
+    p = Parser(cfg)
+    # The same parser for each, and the caller's $ is fine too
+    assert p.parse(tokens("2+3*4"), semantic_actions) == 14
+    assert p.parse(tokens("(2+3)*4"), semantic_actions) == 20
+    assert p.parse(tokens("2*3+4*5+6$"), semantic_actions) == 32
+
+
+def test_errors():
+    p = Parser(g3_prime())
+    x = Terminal("id", "x")
+    plus = Terminal("+")
+    c_bracket = Terminal(")")
+
+    with pytest.raises(ParseError) as e:
+        p.parse([x, plus, plus])
+    assert e.value.source_index == 2
+    assert e.value.token == plus
+    assert set(e.value.valid_terminals) == {Terminal("id"), Terminal("(")}
+
+    with pytest.raises(ParseError) as e:
+        p.parse([Terminal("("), x, plus, x])
+    assert e.value.token == dollar
+    assert e.value.valid_terminals == [c_bracket]
+
+    with pytest.raises(ParseError) as e:
+        p.parse([x, dollar, x])
+    assert e.value.message == "Unexpected tokens at end of file"
+
+    # It still works after all that
+    assert p.parse([x]).production.LHS == NonTerminal("S")
+
+
+def test_start_production_without_dollar():
+    # S -> E gets added without a $, so the parser has to check for the end itself
+    E = NonTerminal("E")
+    a = Terminal("a")
+    b = Terminal("b")
+    cfg = CFG({E}, {a, b}, {E: [[a, E], [b]]}, E, add_unique_starting_production=True)
+    p = Parser(cfg)
+
+    assert p.parse([a, a, b]).children[0].children[0] == a
+    with pytest.raises(ParseError) as e:
+        p.parse([a, b, b])
+    assert e.value.message == "Unexpected tokens at end of file"
+    assert e.value.source_index == 2
+    with pytest.raises(ParseError) as e:
+        p.parse([b, dollar, b])
+    assert e.value.message == "Unexpected tokens at end of file"
+    assert e.value.source_index == 2
+    assert e.value.valid_terminals == [dollar]
+
+
+def test_unknown_terminal():
+    E = NonTerminal("E")
+    a = Terminal("a")
+    b = Terminal("b")
+    cfg = CFG({E}, {a, b}, {E: [[a, E], [b]]}, E, add_unique_starting_production=True)
+    p = Parser(cfg)
+
+    # Where we predict on it, and where we wanted the end of the input
+    for tokens, index in [
+        ([Terminal("c")], 0),
+        ([a, Terminal("c")], 1),
+        ([b, Terminal("c")], 1),
+    ]:
+        with pytest.raises(ParseError) as e:
+            p.parse(tokens)
+        assert e.value.message == "Unexpected token, not a terminal of the grammar"
+        assert e.value.source_index == index
+        assert e.value.token == Terminal("c")
+
+
+def test_not_ll1():
+    E = NonTerminal("E")
+    a = Terminal("a")
+    cfg = CFG({E}, {a}, {E: [[E, a], [a]]}, E)
+    with pytest.raises(AssertionError):
+        Parser(cfg)
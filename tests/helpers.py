@@ -0,0 +1,42 @@
+from cfg import CFG
+from cfg_parser import ParseTree
+from common import NonTerminal, Symbol, Terminal, Production, epsilon
+from parser_stub import parse_internal
+
+from functools import partial
+from typing import Any
+
+"""Things more than one of the test files need"""
+
+
+def make_cfg(
+    P: dict[NonTerminal, list[list[Symbol]]],
+    T: list[Terminal],
+    start: NonTerminal = NonTerminal("A"),
+) -> CFG:
+    """A CFG with S -> {start} added, and the nonterminals and terminals in the order they're given"""
+    nonterminals = list(P.keys())
+    return CFG(
+        set(nonterminals),
+        set(T),
+        P,
+        start,
+        terminals_order=T,
+        nonterminals_order=nonterminals,
+        add_unique_starting_production=True,
+    )
+
+
+def lr_tree(cfg: CFG, tokens: list[Terminal], lalr1: bool = False) -> ParseTree:
+    """The ParseTree from the SLR(1) or LALR(1) parser, which works for left recursive grammars"""
+
+    def action(n: NonTerminal, xs: list[Any]) -> ParseTree:
+        rhs = [x.production.LHS if isinstance(x, ParseTree) else x for x in xs]
+        return ParseTree(Production(n, rhs if rhs else [epsilon]), xs)
+
+    semantic_actions = {n: partial(action, n) for n in cfg.N}
+    if lalr1:
+        return parse_internal(
+            cfg.lalr1_action, cfg.lalr1_goto, semantic_actions, tokens
+        )  # type: ignore
+    return parse_internal(cfg.slr1_action, cfg.slr1_goto, semantic_actions, tokens)  # type: ignore
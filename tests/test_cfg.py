@@ -1,4 +1,5 @@
-from cfg import CFG, g3_prime
+from cfg import CFG, LR0_Item, LR1_Item, TerminalSets, g3_prime, digraph
+from grammar_reader import Grammar
 from common import (
     dollar,
     epsilon,
@@ -118,6 +119,56 @@ def test_nullable_first_symbol():
         assert cfg.get_first(n) == expected_values[n.name], n
 
 
+def test_first_follow_cycles():
+    # A and B start with each other and follow each other, and C is nullable two ways
+    A = NonTerminal("A")
+    B = NonTerminal("B")
+    C = NonTerminal("C")
+    a = Terminal("a")
+    b = Terminal("b")
+    c = Terminal("c")
+    cfg = CFG(
+        {A, B, C},
+        {a, b, c},
+        {
+            A: [[B, a], [epsilon]],
+            B: [[A, b], [C, c]],
+            C: [[A, B, c], [A, A], []],
+        },
+        A,
+    )
+
+    assert cfg.nullable == {A, C}
+    assert cfg.is_nullable([A, C])
+    assert not cfg.is_nullable([A, B])
+    # a only ever comes after a B, which can't be empty
+    assert cfg.first == {A: {b, c, epsilon}, B: {b, c}, C: {b, c, epsilon}}
+    assert cfg.get_first([C, A]) == {b, c, epsilon}
+    assert cfg.get_first([C, A, B, A]) == {b, c}
+    assert cfg.get_first(a) == {a}
+    assert cfg.get_first([]) == set()
+    assert cfg.follow == {A: {b, c, dollar}, B: {a, c}, C: {c}}
+
+
+def test_first_follow_long_chain():
+    # A0 -> A1 a0 | ε, ... which is deep enough that anything recursive would fall over
+    n = 2000
+    A = [NonTerminal(f"A{i}") for i in range(n + 1)]
+    a = [Terminal(f"a{i}") for i in range(n + 1)]
+    P = {A[i]: [[A[i + 1], a[i]], []] for i in range(n)}
+    P[A[n]] = [[a[n]]]
+    cfg = CFG(set(A), set(a), P, A[0])
+
+    assert cfg.nullable == set(A[:n])
+    # A{n} isn't nullable, so a{n-1} can't come first
+    assert cfg.first[A[0]] == set(a) - {a[n - 1]} | {epsilon}
+    assert cfg.first[A[n]] == {a[n]}
+    assert cfg.follow[A[0]] == {dollar}
+    assert cfg.follow[A[n]] == {a[n - 1]}
+    assert cfg.follow[A[1]] == {a[0]}
+    assert cfg.follow[A[2]] == {a[1]}
+
+
 def test_G3_prime_follow():
     G3_prime = g3_prime()
 
@@ -603,6 +654,7 @@ def test_lr0_dfa_notes():
         frozenset({str(item) for item in state}) for state in dfa.state_list
     ]
     assert stringified_state_list == expected_states
+    assert all(dfa.state_ids[state] == i for i, state in enumerate(dfa.state_list))
 
     def index(state):
         return dfa.state_list.index(state)
@@ -797,6 +849,9 @@ def test_slr1_shift_reduce_conflict_detection(capsys):
     assert "Shift(c, " in captured.out
     assert "Reduce(B -> d)" in captured.out
 
+    # B -> d is only followed by c after a b, so LALR(1) has no problem
+    assert len(cfg.lalr1_action) == len(cfg.lr0_dfa.state_list)
+
 
 def test_slr1_reduce_reduce_conflict_detection(capsys):
     A = NonTerminal("A")
@@ -827,3 +882,365 @@ def test_slr1_reduce_reduce_conflict_detection(capsys):
     assert "with terminal b" in captured.out
     assert "Reduce(B -> d)" in captured.out
     assert "Reduce(C -> d)" in captured.out
+
+    # C -> d is only followed by c after an a, so LALR(1) has no problem
+    assert len(cfg.lalr1_action) == len(cfg.lr0_dfa.state_list)
+
+
+def test_table_caching():
+    E = NonTerminal("E")
+    plus = Terminal("+")
+    ident = Terminal("id")
+    cfg = CFG(
+        {E},
+        {plus, ident},
+        {E: [[ident]]},
+        E,
+        add_unique_starting_production=True,
+    )
+
+    action = cfg.slr1_action
+    goto = cfg.slr1_goto
+    assert cfg.slr1_action is action
+    assert cfg.slr1_goto is goto
+    assert cfg.lalr1_action is cfg.lalr1_action
+    assert cfg.lr1_action is cfg.lr1_action
+    assert cfg.lr1_goto is cfg.lr1_goto
+    assert cfg.follow[E] == {dollar}
+    assert cfg.follow_bits is cfg.follow_bits
+    assert all(row[plus] is None for row in action.values())
+
+    cfg.add_production(E, [E, plus, ident])
+    assert cfg.P[E] == [Production(E, [ident]), Production(E, [E, plus, ident])]
+    assert cfg.follow[E] == {plus, dollar}
+    assert cfg.slr1_action is not action
+    assert len(cfg.slr1_action) > len(action)
+    assert any(isinstance(row[plus], LR0_Shift) for row in cfg.slr1_action.values())
+    assert len(cfg.lr1_action) == len(cfg.slr1_action) - 1
+    for i, row in cfg.lalr1_action.items():
+        assert row == cfg.slr1_action[i]
+
+
+def test_lr0_dfa_epsilon():
+    # An ε on the RHS is an ε move, so the item after it is in the same state
+    A = NonTerminal("A")
+    B = NonTerminal("B")
+    a = Terminal("a")
+    b = Terminal("b")
+    cfg = CFG(
+        {A, B},
+        {a, b},
+        {A: [[a, B], [b, epsilon]], B: [[epsilon]]},
+        A,
+        terminals_order=[a, b],
+        nonterminals_order=[A, B],
+        add_unique_starting_production=True,
+    )
+    states = cfg.lr0_dfa.state_list
+    transitions = cfg.lr0_transitions()
+
+    after_a = states[transitions[0][a]]
+    B_epsilon = Production(B, [epsilon])
+    assert LR0_Item(B_epsilon, 0) in after_a
+    assert LR0_Item(B_epsilon, 1) in after_a
+
+    after_b = states[transitions[0][b]]
+    assert {str(item) for item in after_b} == {"A -> b⋅ε", "A -> bε⋅"}
+    assert all(epsilon not in row for row in transitions)
+
+
+def test_digraph():
+    # 0 -> 1 -> 2 -> 1 and 3 -> 0, so 1 and 2 are a cycle
+    R = {0: [1], 1: [2], 2: [1], 3: [0], 4: []}
+    F = digraph(range(5), lambda x: R[x], lambda x: 1 << x)
+    assert F == {
+        0: 0b00111,
+        1: 0b00110,
+        2: 0b00110,
+        3: 0b01111,
+        4: 0b10000,
+    }
+
+    # Long enough that recursion would fall over
+    n = 3000
+    F = digraph(range(n), lambda x: [x + 1] if x + 1 < n else [0], lambda x: 1 << x)
+    assert F[0] == F[n - 1] == (1 << n) - 1
+
+
+def test_terminal_sets():
+    a = Terminal("a")
+    b = Terminal("b")
+    c = Terminal("c")
+    sets = TerminalSets({"x": 0b101, "y": 0, "z": 0b010}, [a, b, c])
+    assert sets == {"x": {a, c}, "y": set(), "z": {b}}
+    assert list(sets) == ["x", "y", "z"]
+    assert sets["x"] is sets["x"], "Only decoded once"
+
+
+def pointers():
+    """The classic grammar that's LALR(1) but not SLR(1), from the dragon book"""
+    S = NonTerminal("P")
+    L = NonTerminal("L")
+    R = NonTerminal("R")
+
+    equals = Terminal("=")
+    star = Terminal("*")
+    ident = Terminal("id")
+
+    return CFG(
+        {S, L, R},
+        {equals, star, ident},
+        {S: [[L, equals, R], [R]], L: [[star, R], [ident]], R: [[L]]},
+        S,
+        terminals_order=[equals, star, ident],
+        nonterminals_order=[S, L, R],
+        add_unique_starting_production=True,
+    )
+
+
+def test_lalr1_pointers(capsys):
+    cfg = pointers()
+    P = NonTerminal("P")
+    L = NonTerminal("L")
+    R = NonTerminal("R")
+    equals = Terminal("=")
+    star = Terminal("*")
+    ident = Terminal("id")
+
+    _ = capsys.readouterr()
+    with pytest.raises(AssertionError):
+        _ = cfg.slr1_action
+    assert "Shift/Reduce Conflict" in capsys.readouterr().out
+
+    action = cfg.lalr1_action
+    goto = cfg.lalr1_goto
+    assert len(action) == len(goto) == len(cfg.lr0_dfa.state_list)
+    assert goto == cfg.slr1_goto
+
+    # In the state after an L at the start, R -> L is only reduced at the end
+    state = goto[0][L]
+    assert state is not None
+    assert isinstance(action[state][equals], LR0_Shift)
+    assert action[state][dollar] == LR0_Reduce(Production(R, [L]))
+
+    lookaheads = cfg.lalr1_lookaheads
+    assert lookaheads[(state, Production(R, [L]))] == {dollar}
+    assert lookaheads[(goto[0][P], Production(NonTerminal("S"), [P]))] == set()
+    for prod in [Production(L, [star, R]), Production(L, [ident])]:
+        for (_, p), la in lookaheads.items():
+            if p == prod:
+                assert la == {equals, dollar}
+                assert la <= cfg.follow[prod.LHS]
+
+
+def test_lalr1_not_lalr1(capsys):
+    # This one's LR(1), but merging the two states with A -> c⋅ and B -> c⋅ causes a conflict
+    S = NonTerminal("Z")
+    A = NonTerminal("A")
+    B = NonTerminal("B")
+    a, b, c, d, e = (
+        Terminal("a"),
+        Terminal("b"),
+        Terminal("c"),
+        Terminal("d"),
+        Terminal("e"),
+    )
+
+    cfg = CFG(
+        {S, A, B},
+        {a, b, c, d, e},
+        {S: [[a, A, d], [b, B, d], [a, B, e], [b, A, e]], A: [[c]], B: [[c]]},
+        S,
+        add_unique_starting_production=True,
+    )
+
+    _ = capsys.readouterr()
+    with pytest.raises(AssertionError) as e_info:
+        _ = cfg.lalr1_action
+    captured = capsys.readouterr()
+    assert e_info.value.args[0].startswith("2 Grammar conflict")
+    assert "Reduce/Reduce Conflict in state " in captured.out
+
+
+def test_lalr1_nullable():
+    # Balanced brackets, where what follows L depends on nullable Ls
+    L = NonTerminal("L")
+    o_bracket = Terminal("(")
+    c_bracket = Terminal(")")
+    cfg = CFG(
+        {L},
+        {o_bracket, c_bracket},
+        {L: [[o_bracket, L, c_bracket, L], []]},
+        L,
+        terminals_order=[o_bracket, c_bracket],
+        nonterminals_order=[L],
+        add_unique_starting_production=True,
+    )
+    lalr1_action = cfg.lalr1_action
+    slr1_action = cfg.slr1_action
+    # At the start there can't be a ) next, but FOLLOW(L) doesn't know that
+    assert lalr1_action[0][c_bracket] is None
+    assert slr1_action[0][c_bracket] == LR0_Reduce(Production(L, []))
+    for i, row in lalr1_action.items():
+        for t, a in row.items():
+            assert a is None or a == slr1_action[i][t]
+    for (_, prod), la in cfg.lalr1_lookaheads.items():
+        if prod.LHS == L:
+            assert la <= cfg.follow[L]
+
+
+def test_lr1_item():
+    E = NonTerminal("E")
+    plus = Terminal("+")
+    ident = Terminal("id")
+    production = Production(E, [E, plus, ident])
+
+    item = LR1_Item(production, 1, frozenset({plus, dollar}))
+    assert str(item) == "[E -> E ⋅ + id, $/+]"
+    assert item.core == LR0_Item(production, 1)
+    assert item.symbol_after_dot() == plus
+    assert item.actions == [LR0_Shift(plus)]
+
+    after = item.item_after_dot()
+    assert isinstance(after, LR1_Item)
+    assert after == LR1_Item(production, 2, frozenset({dollar, plus}))
+    assert hash(after) == hash(LR1_Item(production, 2, frozenset({dollar, plus})))
+    assert after != LR1_Item(production, 2, frozenset({dollar}))
+    assert after != LR0_Item(production, 2)
+
+    with pytest.raises(AssertionError):
+        LR1_Item(production, 3, frozenset()).item_after_dot()
+
+
+def test_lr1_g2():
+    g = Grammar.from_file("g2.grammar", add_starting_production=True)
+    cfg = g.cfg
+
+    canonical, _ = cfg.lr1_automaton(merge=False)
+    merged, transitions = cfg.lr1_automaton()
+    # The LR(0) states include the empty one that everything goes to on an error
+    assert len(merged) == len(cfg.lr0_states()) - 1 < len(canonical)
+    for state, lr0_state in zip(merged, cfg.lr0_states()):
+        assert {item.core for item in state} == lr0_state
+
+    # The start state only has the lookaheads that can really follow each item
+    E = NonTerminal("E")
+    S = NonTerminal("S")
+    plus = Terminal("PLUS")
+    assert LR1_Item(Production(S, [E]), 0, frozenset({dollar})) in merged[0]
+    assert any(
+        item.production.LHS == E and item.lookaheads == {plus, dollar}
+        for item in merged[0]
+    )
+
+    # It's SLR(1), so the tables should be the same, apart from the empty state
+    slr1_action = cfg.slr1_action
+    slr1_goto = cfg.slr1_goto
+    lr1_goto = cfg.lr1_goto
+    for i, row in cfg.lr1_action.items():
+        assert row == slr1_action[i]
+        assert lr1_goto[i] == slr1_goto[i]
+        assert transitions[i].get(E) == lr1_goto[i][E]
+
+
+def test_lr1_not_lalr1(capsys):
+    S = NonTerminal("Z")
+    A = NonTerminal("A")
+    B = NonTerminal("B")
+    a, b, c, d, e = (
+        Terminal("a"),
+        Terminal("b"),
+        Terminal("c"),
+        Terminal("d"),
+        Terminal("e"),
+    )
+
+    cfg = CFG(
+        {S, A, B},
+        {a, b, c, d, e},
+        {S: [[a, A, d], [b, B, d], [a, B, e], [b, A, e]], A: [[c]], B: [[c]]},
+        S,
+        terminals_order=[a, b, c, d, e],
+        nonterminals_order=[S, A, B],
+        add_unique_starting_production=True,
+    )
+
+    _ = capsys.readouterr()
+    with pytest.raises(AssertionError):
+        _ = cfg.lalr1_action
+    _ = capsys.readouterr()
+
+    # The state after a c is split in two, because merging them would cause a conflict
+    merged, transitions = cfg.lr1_automaton()
+    assert len(merged) == len(cfg.lr0_dfa.state_list)
+    assert len(merged) == len(cfg.lr1_automaton(merge=False)[0])
+
+    action = cfg.lr1_action
+    assert "Conflict" not in capsys.readouterr().out
+    after_ac = transitions[transitions[0][a]][c]
+    after_bc = transitions[transitions[0][b]][c]
+    assert after_ac != after_bc
+    assert action[after_ac][d] == LR0_Reduce(Production(A, [c]))
+    assert action[after_ac][e] == LR0_Reduce(Production(B, [c]))
+    assert action[after_bc][d] == LR0_Reduce(Production(B, [c]))
+    assert action[after_bc][e] == LR0_Reduce(Production(A, [c]))
+
+
+def test_lr1_conflict(capsys):
+    # Properly ambiguous, so not even LR(1) can do it
+    E = NonTerminal("E")
+    plus = Terminal("+")
+    ident = Terminal("id")
+    cfg = CFG(
+        {E},
+        {plus, ident},
+        {E: [[E, plus, E], [ident]]},
+        E,
+        add_unique_starting_production=True,
+    )
+
+    _ = capsys.readouterr()
+    with pytest.raises(AssertionError):
+        _ = cfg.lr1_action
+    assert "Shift/Reduce Conflict" in capsys.readouterr().out
+
+
+def test_lr1_non_productive():
+    # Nothing can follow C in A -> C D, since D never produces anything, but C -> ⋅c still has to be in the closure
+    Z = NonTerminal("Z")
+    A = NonTerminal("A")
+    C = NonTerminal("C")
+    D = NonTerminal("D")
+    a, c, d = Terminal("a"), Terminal("c"), Terminal("d")
+    cfg = CFG(
+        {Z, A, C, D},
+        {a, c, d},
+        {Z: [[A]], A: [[C, D], [a]], C: [[c]], D: [[D, d]]},
+        Z,
+        terminals_order=[a, c, d],
+        nonterminals_order=[Z, A, C, D],
+        add_unique_starting_production=True,
+    )
+    assert C in cfg.lr1_closure_lookaheads(A)
+    lr0_cores = {frozenset(state) for state in cfg.lr0_states() if len(state) > 0}
+    for merge in [False, True]:
+        states, _ = cfg.lr1_automaton(merge=merge)
+        assert {frozenset(item.core for item in state) for state in states} == lr0_cores
+
+
+def test_lr1_pointers():
+    cfg = pointers()
+    canonical, _ = cfg.lr1_automaton(merge=False)
+    merged, _ = cfg.lr1_automaton()
+    assert len(merged) < len(canonical)
+    lalr1_action = cfg.lalr1_action
+    for i, row in cfg.lr1_action.items():
+        assert row == lalr1_action[i]
+
+
+def test_lr1_slang():
+    g = Grammar.from_file("slang.grammar", add_starting_production=True)
+    cfg = g.cfg
+    lalr1_action = cfg.lalr1_action
+    for i, row in cfg.lr1_action.items():
+        assert row == lalr1_action[i]
@@ -0,0 +1,432 @@
+from cfg import CFG
+from cfg_parser import Parser, ParseTree
+from cfg_transforms import (
+    Transformation,
+    empty_rhs,
+    left_factor,
+    left_recursive,
+    remove_epsilon_productions,
+    remove_left_recursion,
+    remove_unit_productions,
+    to_ll1,
+)
+from common import NonTerminal, Symbol, Terminal, Production, epsilon
+from glr_parser import GLRParser
+from grammar_reader import Grammar
+from lexer import Lexer
+from packed_tables import ParseError
+from parser_stub import parse_internal
+from tests.helpers import make_cfg, lr_tree
+
+from functools import partial
+from typing import Any
+
+import pytest
+import random
+import time
+
+A = NonTerminal("A")
+B = NonTerminal("B")
+C = NonTerminal("C")
+
+a = Terminal("a")
+b = Terminal("b")
+c = Terminal("c")
+d = Terminal("d")
+x = Terminal("x")
+y = Terminal("y")
+
+
+def random_sentences(cfg: CFG, count: int, seed: int = 0) -> list[list[Terminal]]:
+    """Sentences of {cfg}, which stop growing once they're a few nonterminals deep"""
+    rng = random.Random(seed)
+
+    # How deep the shallowest derivation for each nonterminal is
+    height: dict[NonTerminal, int] = {}
+    while len(height) < len(cfg.N):
+        for n in cfg.nonterminals_order:
+            heights = [
+                max([height.get(s, -1) + 1 if s in cfg.N else 0 for s in prod.RHS])
+                for prod in cfg.P[n]
+                if all(s in height or s not in cfg.N for s in prod.RHS)
+            ]
+            if n not in height and len(heights) > 0:
+                height[n] = min(heights)
+
+    def expand(n: NonTerminal, depth: int) -> list[Terminal]:
+        prods = cfg.P[n]
+        if depth > 6:
+            lowest = min(
+                max([height[s] if s in cfg.N else 0 for s in prod.RHS])
+                for prod in prods
+            )
+            prods = [
+                prod
+                for prod in prods
+                if max([height[s] if s in cfg.N else 0 for s in prod.RHS]) == lowest
+            ]
+        sentence = []
+        for s in rng.choice(prods).RHS:
+            if isinstance(s, NonTerminal):
+                sentence += expand(s, depth + 1)
+            elif s != epsilon:
+                assert isinstance(s, Terminal)
+                sentence.append(Terminal(s.name, f"{s.name}{len(sentence)}"))
+        return sentence
+
+    return [expand(cfg.original_E, 0) for _ in range(count)]
+
+
+def mutations(cfg: CFG, sentences: list[list[Terminal]]) -> list[list[Terminal]]:
+    """Sentences with a token left out, added in or swapped, most of which won't be in the language any more"""
+    rng = random.Random(1)
+    mutated = []
+    for sentence in sentences:
+        i = rng.randrange(len(sentence) + 1)
+        t = rng.choice(cfg.terminals_order)
+        mutated.append(sentence[:i] + sentence[i + 1 :])
+        mutated.append(sentence[:i] + [t] + sentence[i:])
+        mutated.append(sentence[:i] + [t] + sentence[i + 1 :])
+    return mutated
+
+
+def check_derivation(cfg: CFG, tree: ParseTree, tokens: list[Terminal]) -> None:
+    """Check that {tree} only uses productions of {cfg} and that its leaves are {tokens}"""
+    leaves: list[Terminal] = []
+    stack: list[Any] = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Terminal):
+            leaves.append(node)
+            continue
+        assert node.production in cfg.P[node.production.LHS], node.production
+        rhs = [s for s in node.production.RHS if s != epsilon]
+        assert len(rhs) == len(node.children), node
+        for s, child in zip(rhs, node.children):
+            assert s == (child if isinstance(child, Terminal) else child.production.LHS)
+        stack.extend(reversed(node.children))
+    assert all(leaf.identical_to(t) for leaf, t in zip(leaves, tokens)), (
+        leaves,
+        tokens,
+    )
+    assert len(leaves) == len(tokens)
+
+
+def check_against_lr(
+    transformation: Transformation, sentences: list[list[Terminal]]
+) -> None:
+    """The LL(1) parser for the new grammar gives the same trees as the SLR(1) parser for the original,
+    and they agree about which sentences aren't in the language"""
+    original = transformation.original
+    parser = Parser(transformation.cfg)
+    production_actions = transformation.production_actions()
+    for tokens in sentences + mutations(original, sentences):
+        try:
+            expected = lr_tree(original, tokens)
+        except ParseError:
+            with pytest.raises(ParseError):
+                parser.parse(tokens, production_actions=production_actions)
+            continue
+        tree = parser.parse(tokens, production_actions=production_actions)
+        assert tree.production == original.starting_prod
+        assert tree.children == [expected]
+        check_derivation(original, tree, tokens)
+
+
+def test_to_ll1_g2():
+    g = Grammar.from_file("g2.grammar", add_starting_production=True)
+    transformation = to_ll1(g.cfg)
+    assert transformation.original is g.cfg
+    assert left_recursive(g.cfg) == [NonTerminal("E"), NonTerminal("T")]
+    assert left_recursive(transformation.cfg) == []
+    check_against_lr(transformation, random_sentences(g.cfg, 200))
+
+    # Long lists are a loop, not recursion
+    ident = Terminal("ID")
+    plus = Terminal("PLUS")
+    tokens = [ident] + [plus, ident] * 5000
+    tree = Parser(transformation.cfg).parse(
+        tokens,
+        production_actions=transformation.production_actions({n: len for n in g.cfg.N}),
+    )
+    assert tree == 1
+
+
+def test_to_ll1_slang():
+    g = Grammar.from_file("slang.grammar", add_starting_production=True)
+    transformation = to_ll1(g.cfg)
+    lexer = Lexer(g.terminal_triples)
+    sentences = []
+    for filename in ["slang/fib.slang", "slang/if.slang", "slang/two_plus_three.slang"]:
+        with open(filename, "r", encoding="utf-8") as f:
+            sentences.append(lexer.lex(f.read()))
+    check_against_lr(transformation, sentences + random_sentences(g.cfg, 100))
+
+    # The semantic actions for the original grammar work too
+    semantic_actions = {n: partial(lambda n, xs: (n, xs), n) for n in g.cfg.N}
+    assert Parser(transformation.cfg).parse(
+        sentences[0],
+        production_actions=transformation.production_actions(semantic_actions),
+    ) == (
+        g.cfg.E,
+        [
+            parse_internal(
+                g.cfg.slr1_action, g.cfg.slr1_goto, semantic_actions, sentences[0]
+            )
+        ],
+    )
+
+
+def test_remove_left_recursion_indirect():
+    # B comes first, so it's A that gets B substituted in, and then B isn't needed
+    cfg = make_cfg({B: [[A, b], [d]], A: [[B, a], [c]]}, [a, b, c, d])
+    assert cfg.is_left_recursive() is False
+    assert left_recursive(cfg) == [B, A]
+
+    transformation = remove_left_recursion(cfg)
+    assert left_recursive(transformation.cfg) == []
+    check_against_lr(transformation, random_sentences(cfg, 50))
+
+
+def test_remove_left_recursion_cycle():
+    # A -> B -> A means A' -> B' A' where B' is nullable, so the cycles have to go first
+    cfg = make_cfg({A: [[B], [A, x], [a]], B: [[A], [b]]}, [a, b, x])
+    with pytest.raises(AssertionError):
+        remove_left_recursion(cfg)
+
+    transformation = remove_unit_productions(cfg).then(to_ll1)
+    assert transformation.original is cfg
+    assert left_recursive(transformation.cfg) == []
+    parser = Parser(transformation.cfg)
+    production_actions = transformation.production_actions()
+    for tokens in random_sentences(cfg, 50):
+        tree = parser.parse(tokens, production_actions=production_actions)
+        check_derivation(cfg, tree, tokens)
+
+    with pytest.raises(AssertionError):
+        remove_left_recursion(make_cfg({A: [[A, x]]}, [x]))
+
+
+def test_remove_left_recursion_self_loop():
+    # E -> E on its own used to be left in, so substituting E into T brought it straight back forever
+    E = NonTerminal("E")
+    T = NonTerminal("T")
+    cfg = make_cfg({E: [[E], [T]], T: [[E, x], [y]]}, [x, y], E)
+    transformation = remove_left_recursion(cfg)
+    assert left_recursive(transformation.cfg) == []
+    assert all(prod.RHS != [E] for prod in transformation.cfg.P[E])
+    parser = Parser(transformation.cfg)
+    production_actions = transformation.production_actions()
+    for tokens in random_sentences(cfg, 20):
+        tree = parser.parse(tokens, production_actions=production_actions)
+        check_derivation(cfg, tree, tokens)
+
+
+def test_remove_left_recursion_hidden():
+    # B can't be anything else, or the grammar would be ambiguous
+    cfg = make_cfg({A: [[B, A, x], [y]], B: [[epsilon]]}, [x, y])
+    assert left_recursive(cfg) == [A]
+    with pytest.raises(AssertionError):
+        remove_left_recursion(cfg)
+
+    # Without the ε-productions it's SLR(1)
+    without_epsilon = remove_epsilon_productions(cfg)
+    production_actions = without_epsilon.production_actions()
+    for tokens in random_sentences(cfg, 50):
+        tree = evaluate(lr_tree(without_epsilon.cfg, tokens), production_actions)
+        check_derivation(cfg, tree, tokens)
+
+    # B -> ε is how B gets a value when it's left out
+    tree = evaluate(lr_tree(without_epsilon.cfg, [y, x]), production_actions)
+    assert str(tree) == "A(B(), A(y), x)"
+
+    transformation = without_epsilon.then(remove_left_recursion)
+    assert transformation.original is cfg
+    assert left_recursive(transformation.cfg) == []
+
+
+def test_left_factor():
+    cfg = make_cfg(
+        {A: [[a, b], [a, c], [B, d], [a]], B: [[a, x, y], [c]]}, [a, b, c, d, x, y]
+    )
+    transformation = left_factor(cfg)
+    assert Production(A, [a, b]) not in transformation.cfg.P[A]
+    check_against_lr(transformation, random_sentences(cfg, 50))
+
+    with pytest.raises(AssertionError):
+        left_factor(make_cfg({A: [[A, x], [y]]}, [x, y]))
+
+
+def test_left_factor_not_ll1():
+    # B x and C y both start with any number of as, so no amount of factoring finishes it,
+    # apart from by noticing that what's left is what we had before
+    cfg = make_cfg({A: [[B, x], [C, y]], B: [[a, B], [a]], C: [[a, C], [a]]}, [a, x, y])
+    transformation = left_factor(cfg)
+    check_against_lr(transformation, random_sentences(cfg, 50))
+
+    # If it can't go round then it stops when it gets too deep, and the parser reports the conflict
+    cfg = make_cfg(
+        {A: [[B, x], [C, y]], B: [[a, B, b], [a]], C: [[a, C, b], [a]]}, [a, b, x, y]
+    )
+    transformation = left_factor(cfg, max_depth=3)
+    with pytest.raises(AssertionError):
+        Parser(transformation.cfg)
+
+
+def test_to_ll1_gives_up():
+    # Substituting for N1 and N3 keeps making more alternatives that conflict, and used to grow exponentially
+    N0, N1, N2, N3 = (NonTerminal(f"N{i}") for i in range(4))
+    t0 = Terminal("t0")
+    P: dict[NonTerminal, list[list[Symbol]]] = {
+        N0: [[N1]],
+        N1: [[t0, N1, N3], [epsilon], [N2, t0, N3]],
+        N2: [[t0, N3]],
+        N3: [[epsilon], [N1]],
+    }
+    start = time.perf_counter()
+    transformation = to_ll1(make_cfg(P, [t0], N0))
+    with pytest.raises(AssertionError):
+        Parser(transformation.cfg)
+
+    # The same when they can't be got to from the start, when they shouldn't be looked at at all
+    P[A] = [[t0]]
+    transformation = to_ll1(make_cfg(P, [t0], A))
+    assert transformation.cfg.nonterminals_order == [NonTerminal("S"), A]
+    assert time.perf_counter() - start < 5
+
+
+def test_remove_epsilon_productions():
+    g = Grammar.from_file("g2_ll1.grammar", add_starting_production=True)
+    transformation = remove_epsilon_productions(g.cfg)
+    assert not any(
+        epsilon in prod.RHS for prods in transformation.cfg.P.values() for prod in prods
+    )
+
+    # The original is LL(1) and the new one is SLR(1)
+    parser = Parser(g.cfg)
+    production_actions = transformation.production_actions()
+    sentences = random_sentences(g.cfg, 100)
+    for tokens in sentences + mutations(g.cfg, sentences):
+        try:
+            expected = parser.parse(tokens)
+        except ParseError:
+            with pytest.raises(ParseError):
+                lr_tree(transformation.cfg, tokens)
+            continue
+        tree = lr_tree(transformation.cfg, tokens)
+        assert evaluate(tree, production_actions) == expected.children[0]
+        assert tree.production.LHS == g.cfg.original_E
+
+
+def evaluate(tree: ParseTree, actions: dict[Production, Any]) -> Any:
+    return actions[tree.production](
+        [evaluate(c, actions) if isinstance(c, ParseTree) else c for c in tree.children]
+    )
+
+
+def test_remove_epsilon_productions_start():
+    # The start symbol keeps its A -> ε, because otherwise the language would change
+    cfg = make_cfg({A: [[a, A], [B]], B: [[epsilon]]}, [a])
+    transformation = remove_epsilon_productions(cfg)
+    assert transformation.cfg.P[A] == [
+        Production(A, [a, A]),
+        Production(A, [a]),
+        Production(A, [epsilon]),
+    ]
+    assert B not in transformation.cfg.N
+
+    production_actions = transformation.production_actions()
+    assert str(production_actions[Production(A, [epsilon])]([])) == "A(B())"
+    assert str(production_actions[Production(A, [a])]([a])) == "A(a, A(B()))"
+
+
+def test_empty_rhs():
+    # to_ll1 writes its ε-productions as [ε], which the LR code can't shift
+    g = Grammar.from_file("g2.grammar", add_starting_production=True)
+    ll1 = to_ll1(g.cfg)
+    assert any(prod.RHS == [epsilon] for prods in ll1.cfg.P.values() for prod in prods)
+    with pytest.raises(AssertionError):
+        GLRParser(ll1.cfg)
+
+    transformation = ll1.then(empty_rhs)
+    assert transformation.original is g.cfg
+    assert not any(
+        epsilon in prod.RHS for prods in transformation.cfg.P.values() for prod in prods
+    )
+
+    # The LR tables accept the same sentences, and GLRParser gives the values the original grammar would have
+    production_actions = transformation.production_actions()
+    parser = GLRParser(transformation.cfg)
+    assert parser.conflicts == 0
+    sentences = random_sentences(g.cfg, 100)
+    for tokens in sentences + mutations(g.cfg, sentences):
+        try:
+            expected = lr_tree(g.cfg, tokens)
+        except ParseError:
+            with pytest.raises(ParseError):
+                lr_tree(transformation.cfg, tokens)
+            with pytest.raises(ParseError):
+                parser.parse(tokens)
+            continue
+        lr_tree(transformation.cfg, tokens)
+        tree = parser.parse(tokens).evaluate(production_actions=production_actions)
+        assert tree == expected
+
+
+def test_empty_rhs_input():
+    # Grammars with empty RHSs, like the ones written for the LR code, go through the transforms too
+    L = NonTerminal("L")
+    o_bracket = Terminal("(")
+    c_bracket = Terminal(")")
+    cfg = make_cfg({L: [[o_bracket, L, c_bracket, L], []]}, [o_bracket, c_bracket], L)
+    for transform in [remove_left_recursion, left_factor, to_ll1]:
+        transformation = transform(cfg)
+        assert transformation.cfg.P[L] == [
+            Production(L, [o_bracket, L, c_bracket, L]),
+            Production(L, [epsilon]),
+        ]
+    tokens = [o_bracket, o_bracket, c_bracket, c_bracket, o_bracket, c_bracket]
+    transformation = to_ll1(cfg)
+    tree = Parser(transformation.cfg).parse(
+        tokens, production_actions=transformation.production_actions()
+    )
+    assert str(tree) == "S(L((, L((, L(), ), L()), ), L((, L(), ), L())))"
+
+    # And so does what empty_rhs gives back
+    g = Grammar.from_file("g2.grammar", add_starting_production=True)
+    transformation = to_ll1(g.cfg).then(empty_rhs).then(to_ll1)
+    assert transformation.original is g.cfg
+    check_against_lr(transformation, random_sentences(g.cfg, 50))
+
+
+def test_remove_unit_productions():
+    g = Grammar.from_file("g2.grammar", add_starting_production=True)
+    transformation = remove_unit_productions(g.cfg)
+    assert not any(
+        len(prod.RHS) == 1 and isinstance(prod.RHS[0], NonTerminal)
+        for n, prods in transformation.cfg.P.items()
+        if n != transformation.cfg.E
+        for prod in prods
+    )
+    assert len(transformation.cfg.P[NonTerminal("E")]) == 4
+
+    # Which isn't SLR(1) any more, but is still LALR(1)
+    production_actions = transformation.production_actions()
+    sentences = random_sentences(g.cfg, 100)
+    for tokens in sentences + mutations(g.cfg, sentences):
+        try:
+            expected = lr_tree(g.cfg, tokens)
+        except ParseError:
+            with pytest.raises(ParseError):
+                lr_tree(transformation.cfg, tokens, lalr1=True)
+            continue
+        tree = lr_tree(transformation.cfg, tokens, lalr1=True)
+        assert evaluate(tree, production_actions) == expected
+
+    cfg = make_cfg({A: [[B], [a]], B: [[A], [b]]}, [a, b])
+    transformation = remove_unit_productions(cfg)
+    assert transformation.cfg.P[A] == [Production(A, [a]), Production(A, [b])]
+    tree = Parser(transformation.cfg).parse(
+        [b], production_actions=transformation.production_actions()
+    )
+    assert str(tree) == "S(A(B(b)))"
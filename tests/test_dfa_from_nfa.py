@@ -1,6 +1,8 @@
 from dfa import DFA
 from nfa import NFA
 
+import pytest
+
 
 def test_empty_nfa():
     dfa = DFA.fromNFA(NFA({"0", "1"}, {"a", "b"}, lambda _q, _c: set(), "0", {"1"}))
@@ -256,3 +258,81 @@ def test_non_int_state_names():
     assert dfa.test_string("a")
     assert not dfa.test_string("b")
     assert not dfa.test_string("aa")
+
+
+def test_transition_table():
+    dfa = DFA.fromNFA(
+        NFA(
+            {"0", "1", "2"},
+            {"a", "b"},
+            lambda q, c: {"1"}
+            if q == "0" and c == "a"
+            else ({"2"} if q == "1" and c == "b" else set()),
+            "0",
+            {"2"},
+        )
+    )
+
+    table = dfa.table
+    assert table is not None
+    assert table.symbols == ["a", "b"]
+    assert table.states[0] == dfa.q_0
+    assert set(table.states) == dfa.Q
+    assert len(table.rows) == len(table.states)
+
+    # The table agrees with the subset construction
+    assert table.states[table.rows[0][table.symbol_ids["a"]]] == frozenset({"1"})
+    assert table.states[table.rows[0][table.symbol_ids["b"]]] == frozenset()
+    for q in table.states:
+        for c in table.symbols:
+            assert (
+                dfa.delta(q, c)
+                == table.states[table.rows[table.state_ids[q]][table.symbol_ids[c]]]
+            )
+
+    # Every state only appears once
+    assert len(table.state_ids) == len(table.states)
+
+    assert dfa.test_string("ab")
+    assert dfa.last_accept_state == frozenset({"2"})
+    assert dfa.num_chars_accepted == 2
+    assert not dfa.test_string("abb")
+    assert dfa.last_accept_state == frozenset({"2"})
+    assert not dfa.test_string("b")
+    assert dfa.last_accept_state is None
+
+
+def test_longest_prefix():
+    # a(b)*
+    dfa = DFA.fromNFA(
+        NFA(
+            {"0", "1"},
+            {"a", "b", "c"},
+            lambda q, c: {"1"}
+            if (q == "0" and c == "a") or (q == "1" and c == "b")
+            else set(),
+            "0",
+            {"1"},
+        )
+    )
+    assert dfa.table is not None
+    assert dfa.table.dead is not None
+    assert dfa.table.states[dfa.table.dead] == frozenset()
+
+    assert dfa.longest_prefix("abbc") == 3
+    assert dfa.last_accept_state == frozenset({"1"})
+    assert dfa.longest_prefix("cabbc", 1) == 3
+    assert dfa.longest_prefix("cabbc", 2) == 0
+    assert dfa.last_accept_state is None
+    assert dfa.longest_prefix("cab", 3) == 0
+
+    # Once the DFA is dead it stops, so it never looks at the character it couldn't handle
+    assert dfa.longest_prefix("abcd") == 2
+    with pytest.raises(AssertionError):
+        dfa.longest_prefix("abd")
+
+
+def test_longest_prefix_needs_table():
+    dfa = DFA({"0", "1"}, {"a"}, lambda _q, _c: "1", "0", {"1"})
+    with pytest.raises(AssertionError):
+        dfa.longest_prefix("a")
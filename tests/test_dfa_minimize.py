@@ -0,0 +1,141 @@
+from string import ascii_lowercase
+
+from dfa import DFA, TransitionTable
+from nfa import NFA, TypedNFA
+from grammar_reader import Grammar
+from lexer import Lexer
+from regex import Regex
+
+import pytest
+
+
+def notes_nfa() -> NFA:
+    """The NFA on slide 9 of lecture 2, L((a or b)*abb)"""
+
+    def transition_function(q: str, c: str) -> set[str]:
+        delta = {
+            ("1", ""): {"2", "8"},
+            ("2", ""): {"3", "5"},
+            ("3", "a"): {"4"},
+            ("4", ""): {"7"},
+            ("5", "b"): {"6"},
+            ("6", ""): {"7"},
+            ("7", ""): {"2", "8"},
+            ("8", "a"): {"9"},
+            ("9", "b"): {"10"},
+            ("10", "b"): {"11"},
+        }
+        return delta.get((q, c), set())
+
+    return NFA(
+        set(str(i) for i in range(1, 12)),
+        {"a", "b"},
+        transition_function,
+        "1",
+        {"11"},
+    )
+
+
+def test_notes():
+    """The subset construction gives 5 states, but 2 of them are equivalent"""
+    dfa = DFA.fromNFA(notes_nfa())
+    assert len(dfa.Q) == 5
+
+    minimised = dfa.minimize()
+    assert len(minimised.Q) == 4
+    assert minimised.Q == {0, 1, 2, 3}
+    assert minimised.q_0 == 0
+    assert minimised.table is not None
+    assert minimised.table.dead is None
+
+    for string in ["abb", "aaabb", "abbabb", "bbaaabb", "babb"]:
+        assert minimised.test_string(string)
+    for string in ["", "abba", "abbb", "ab", "bb"]:
+        assert not minimised.test_string(string)
+
+
+def test_dead_state():
+    dfa = DFA.fromNFA(
+        TypedNFA.from_regex(Regex.parse("a(bc)*"), set(ascii_lowercase))
+    ).minimize()
+
+    # Start, after an a (accepting), after a b, and dead
+    assert len(dfa.Q) == 4
+    assert dfa.table is not None
+    assert dfa.table.dead is not None
+    assert dfa.longest_prefix("abcbcbd") == 5
+    assert dfa.longest_prefix("abcbcbd", 1) == 0
+
+
+def test_tags_not_merged():
+    """a and b both accept after 1 character, so they'd be equivalent if it weren't for the tags"""
+    nfas = [
+        TypedNFA.from_regex(Regex.parse(r), set("abc"), accept_tag=r)
+        for r in ["a", "b", "c"]
+    ]
+    dfa = DFA.fromNFA(TypedNFA.merge_nfas(nfas)).minimize()
+
+    # Start, one for each tag, and dead
+    assert len(dfa.Q) == 5
+    for r in ["a", "b", "c"]:
+        assert dfa.test_string(r)
+        assert dfa.last_accept_tag == r
+
+
+def test_tags_merged():
+    """If the tags are the same then it's fine to merge"""
+    nfas = [
+        TypedNFA.from_regex(Regex.parse(r), set("abc"), accept_tag="tag")
+        for r in ["a", "b", "cc"]
+    ]
+    dfa = DFA.fromNFA(TypedNFA.merge_nfas(nfas)).minimize()
+
+    # Start, accept, after the first c, and dead
+    assert len(dfa.Q) == 4
+    for r in ["a", "b", "cc"]:
+        assert dfa.test_string(r)
+        assert dfa.last_accept_tag == "tag"
+    assert not dfa.test_string("c")
+    assert dfa.last_accept_tag is None
+
+
+def test_unreachable_states_removed():
+    # State 2 is identical to 1 and state 3 can't be reached
+    table = TransitionTable([0, 1, 2, 3], ["a"], [[1], [2], [1], [0]])
+    dfa = DFA({0, 1, 2, 3}, {"a"}, table.delta, 0, {1, 2}, table=table)
+
+    minimised = dfa.minimize()
+    assert len(minimised.Q) == 2
+    assert minimised.tags == {}
+    assert minimised.test_string("a")
+    assert minimised.test_string("aaa")
+    assert not minimised.test_string("")
+
+
+def test_minimize_needs_table():
+    dfa = DFA({"0", "1"}, {"a"}, lambda _q, _c: "1", "0", {"1"})
+    with pytest.raises(AssertionError):
+        dfa.minimize()
+
+
+def test_slang_lexer():
+    g = Grammar.from_file("slang.grammar")
+    lexer = Lexer(g.terminal_triples)
+
+    nfas = [
+        TypedNFA.from_regex(Regex.parse(r), lexer.dfa.Sigma, accept_tag=t)
+        for (t, r, _) in g.terminal_triples
+    ]
+    unminimised = DFA.fromNFA(TypedNFA.merge_nfas(nfas))
+
+    assert len(lexer.dfa.Q) < len(unminimised.Q)
+    assert lexer.dfa.Q == set(range(len(lexer.dfa.Q)))
+
+    with open("slang/fib.slang", "r", encoding="utf-8") as f:
+        source = f.read()
+    position = 0
+    while position < len(source):
+        length = lexer.dfa.longest_prefix(source, position)
+        assert unminimised.longest_prefix(source, position) == length
+        assert lexer.dfa.last_accept_tag == unminimised.last_accept_tag
+        position += length
@@ -0,0 +1,246 @@
+from cfg_parser import ParseTree
+from common import NonTerminal, Terminal, dollar, epsilon
+from glr_parser import GLRParser, ForestNode, ambiguous_expressions
+from grammar_reader import Grammar
+from lexer import Lexer
+from packed_tables import ParseError
+from tests.helpers import make_cfg, lr_tree
+
+from typing import Any
+
+import pytest
+import time
+
+E = NonTerminal("E")
+A = NonTerminal("A")
+B = NonTerminal("B")
+C = NonTerminal("C")
+
+plus = Terminal("+")
+times = Terminal("*")
+ident = Terminal("id")
+a = Terminal("a")
+b = Terminal("b")
+x = Terminal("x")
+
+
+def sums(n: int) -> list[Terminal]:
+    """id + id + ... + id with {n} ids, each with their own value"""
+    tokens = [Terminal("id", "0")]
+    for i in range(1, n):
+        tokens += [plus, Terminal("id", str(i))]
+    return tokens
+
+
+def catalan(n: int) -> int:
+    c = 1
+    for i in range(n):
+        c = c * 2 * (2 * i + 1) // (i + 2)
+    return c
+
+
+def test_ambiguous_tables():
+    cfg = ambiguous_expressions()
+    # The normal tables can't cope with it
+    with pytest.raises(AssertionError):
+        cfg.slr1_action
+    parser = GLRParser(cfg)
+    assert parser.conflicts == 4
+    assert GLRParser(cfg, lalr1=True).conflicts == 4
+
+
+def test_catalan():
+    parser = GLRParser(ambiguous_expressions())
+    for n in range(1, 9):
+        root = parser.parse(sums(n))
+        assert root.symbol == E and (root.start, root.end) == (0, 2 * n - 1)
+        assert root.count_trees() == catalan(n - 1)
+        assert root.is_ambiguous() == (n > 2)
+
+        trees = [str(tree) for tree in root.trees()]
+        assert len(trees) == len(set(trees)) == catalan(n - 1)
+
+    # Each one of the exponentially many trees is there, but the forest is still small
+    root = parser.parse(sums(40))
+    assert root.count_trees() == catalan(39)
+    nodes, families = root.size()
+    assert nodes <= 40 * 40
+    assert families <= 40 * 40 * 40
+
+
+def test_evaluate():
+    cfg = ambiguous_expressions()
+    parser = GLRParser(cfg)
+    tokens = [
+        Terminal("id", "2"),
+        times,
+        Terminal("id", "3"),
+        plus,
+        Terminal("id", "4"),
+    ]
+    root = parser.parse(tokens)
+
+    def value(xs: list[Any]) -> int:
+        if len(xs) == 1:
+            return int(xs[0].value)
+        return xs[0] + xs[2] if xs[1] == plus else xs[0] * xs[2]
+
+    values = {
+        root.evaluate({E: value}, lambda node: i if node is root else 0)
+        for i in range(len(root.families))
+    }
+    assert values == {10, 14}
+
+    # Choosing the family for each node individually, e.g. always the one for the lowest precedence operator
+    def lowest_precedence(node: ForestNode) -> int:
+        ops = [
+            children[1] if len(children) == 3 else None for _, children in node.families
+        ]
+        return ops.index(plus) if plus in ops else 0
+
+    assert root.evaluate({E: value}, lowest_precedence) == 10
+
+    production_actions = {prod: (lambda xs: len(xs)) for prod in cfg.P[E]}
+    assert root.evaluate(production_actions=production_actions) == 3
+
+    tree = root.evaluate()
+    assert isinstance(tree, ParseTree)
+    assert tree in list(root.trees())
+
+
+def test_dangling_else():
+    S = NonTerminal("Stmt")
+    if_ = Terminal("if")
+    then = Terminal("then")
+    else_ = Terminal("else")
+    cfg = make_cfg(
+        {S: [[if_, x, then, S], [if_, x, then, S, else_, S], [a]]},
+        [if_, x, then, else_, a],
+        S,
+    )
+    parser = GLRParser(cfg)
+    root = parser.parse([if_, x, then, if_, x, then, a, else_, a])
+    assert root.count_trees() == 2
+    # Which if the else goes with, but the inner if is shared
+    assert sorted(len(children) for _, children in root.families) == [4, 6]
+
+    assert parser.parse([if_, x, then, a, else_, a]).count_trees() == 1
+
+
+def test_reduce_reduce():
+    # Not LR(k) for any k, since which of B and C the x is depends on the last token
+    cfg = make_cfg(
+        {A: [[B, a], [C, b], [B, b]], B: [[x]], C: [[x]]},
+        [a, b, x],
+    )
+    parser = GLRParser(cfg)
+    assert parser.conflicts > 0
+    assert str(parser.parse([x, a]).evaluate()) == "A(B(x), a)"
+    root = parser.parse([x, b])
+    assert sorted(str(tree) for tree in root.trees()) == ["A(B(x), b)", "A(C(x), b)"]
+
+
+def test_empty_productions():
+    # Nullable things before what we shift, and on both sides of a conflict
+    cfg = make_cfg(
+        {A: [[B, C, a], [C, B, a]], B: [[b], []], C: [[x], []]},
+        [a, b, x],
+    )
+    parser = GLRParser(cfg)
+    root = parser.parse([a])
+    assert sorted(str(tree) for tree in root.trees()) == [
+        "A(B(), C(), a)",
+        "A(C(), B(), a)",
+    ]
+    assert str(parser.parse([b, x, a]).evaluate()) == "A(B(b), C(x), a)"
+    assert parser.parse([x, a]).count_trees() == 2
+    with pytest.raises(ParseError):
+        parser.parse([b, b, a])
+
+    # Right recursion through something nullable, so the new edges turn up in the middle of reduction paths
+    cfg = make_cfg({A: [[b, A, B], [a]], B: [[b], []]}, [a, b])
+    root = GLRParser(cfg).parse([b, b, a, b])
+    assert sorted(str(tree) for tree in root.trees()) == [
+        "A(b, A(b, A(a), B()), B(b))",
+        "A(b, A(b, A(a), B(b)), B())",
+    ]
+
+    with pytest.raises(AssertionError):
+        GLRParser(make_cfg({A: [[a], [epsilon]]}, [a]))
+
+
+def test_errors():
+    parser = GLRParser(ambiguous_expressions())
+    with pytest.raises(ParseError) as e:
+        parser.parse([ident, plus, plus, ident])
+    assert e.value.source_index == 2
+    assert e.value.token == plus
+    assert set(e.value.valid_terminals) == {Terminal("("), ident}
+
+    with pytest.raises(ParseError) as e:
+        parser.parse([ident, Terminal("zzz")])
+    assert e.value.message == "Unexpected token, not a terminal of the grammar"
+    assert e.value.source_index == 1
+    assert e.value.token == Terminal("zzz")
+    # The SLR(1) tables reduce on anything in FOLLOW(E), so ) is there too
+    assert set(e.value.valid_terminals) == {plus, times, Terminal(")"), dollar}
+
+    with pytest.raises(ParseError) as e:
+        parser.parse([ident, plus])
+    assert e.value.source_index == 2
+    assert e.value.token == dollar
+
+    # The $ can be there or not, but there can't be anything after it
+    assert parser.parse([ident, dollar]).count_trees() == 1
+    with pytest.raises(ParseError) as e:
+        parser.parse([ident, dollar, ident])
+    assert e.value.source_index == 2
+
+
+def test_same_as_lr():
+    for filename in ["g2.grammar", "slang.grammar"]:
+        g = Grammar.from_file(filename, add_starting_production=True)
+        parser = GLRParser(g.cfg)
+        assert parser.conflicts == 0
+
+        lexer = Lexer(g.terminal_triples)
+        sources = (
+            ["x + y * (z + w)", "a * b * c + d", "((x))"]
+            if filename == "g2.grammar"
+            else ["slang/fib.slang", "slang/if.slang", "slang/two_plus_three.slang"]
+        )
+        for source in sources:
+            if source.endswith(".slang"):
+                with open(source, "r", encoding="utf-8") as f:
+                    source = f.read()
+            tokens = lexer.lex(source)
+            root = parser.parse(tokens)
+            assert root.count_trees() == 1
+            assert root.evaluate() == lr_tree(g.cfg, tokens)
+
+
+def test_long_input():
+    g = Grammar.from_file("g2.grammar", add_starting_production=True)
+    parser = GLRParser(g.cfg)
+    plus = Terminal("PLUS")
+    o_bracket = Terminal("O_BRACKET")
+    c_bracket = Terminal("C_BRACKET")
+    ident = Terminal("ID")
+
+    # Deep nesting and long lists don't need the stack
+    depth = 5000
+    tokens = [o_bracket] * depth + [ident] + [c_bracket] * depth
+    assert parser.parse(tokens).evaluate({n: len for n in g.cfg.N}) == 1
+    tokens = [ident] + [plus, ident] * depth
+    assert parser.parse(tokens).count_trees() == 1
+
+    # Linear on deterministic input, so 8 times as long shouldn't take much more than 8 times as long
+    def timed(n: int) -> float:
+        tokens = [ident] + [plus, ident] * n
+        start = time.perf_counter()
+        parser.parse(tokens)
+        return time.perf_counter() - start
+
+    short = min(timed(1000) for _ in range(3))
+    long = min(timed(8000) for _ in range(3))
+    assert long < short * 20, (short, long)
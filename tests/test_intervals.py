@@ -0,0 +1,64 @@
+from intervals import IntervalSet, ClassMap, partition, MAX_CODE_POINT
+
+import pytest
+
+
+def test_interval_set():
+    s = IntervalSet([(ord("d"), ord("f")), (ord("a"), ord("b")), (ord("c"), ord("c"))])
+    # Touching ranges get merged
+    assert s.ranges == ((ord("a"), ord("f")),)
+    assert s == IntervalSet.from_characters("abcdef")
+    assert len(s) == 6
+    assert str(s) == "[a-f]"
+    assert "a" in s
+    assert "f" in s
+    assert "g" not in s
+    assert "`" not in s
+    assert "" not in s
+    assert "ab" not in s
+    assert 97 not in s
+
+    t = s | IntervalSet.from_characters("xz")
+    assert str(t) == "[a-fxz]"
+    assert len({s, t, IntervalSet.from_characters("abcdef")}) == 2
+
+
+def test_complement():
+    s = IntervalSet.from_characters("\n").complement()
+    assert "\n" not in s
+    assert "a" in s
+    assert "😀" in s
+    assert len(s) == MAX_CODE_POINT
+    assert s.complement() == IntervalSet.from_characters("\n")
+    assert IntervalSet().complement() == IntervalSet([(0, MAX_CODE_POINT)])
+    assert IntervalSet([(0, MAX_CODE_POINT)]).complement() == IntervalSet()
+
+    with pytest.raises(AssertionError):
+        IntervalSet([(1, MAX_CODE_POINT + 1)])
+
+
+def test_partition():
+    digits = IntervalSet.from_characters("0123456789")
+    letters = IntervalSet([(ord("a"), ord("z"))])
+    alphanumeric = digits | letters
+    class_map = partition([letters, alphanumeric, letters])
+    # Everything else, digits, then letters
+    assert class_map.starts == [0, ord("0"), ord("9") + 1, ord("a"), ord("z") + 1]
+    assert class_map.classes == [0, 1, 0, 2, 0]
+    assert class_map.num_classes == 3
+    assert class_map.representatives() == ["\0", "0", "a"]
+    assert [class_map.class_of(c) for c in "/09:az{😀"] == [0, 1, 1, 0, 2, 2, 0, 0]
+
+    assert partition([]).classes == [0]
+
+
+def test_encode_starts():
+    starts = [0, 10, 0x10000, MAX_CODE_POINT]
+    assert ClassMap.decode_starts(ClassMap.encode_starts(starts)) == starts
+
+
+def test_translation():
+    class_map = partition([IntervalSet([(ord("α"), ord("ω"))])])
+    translation = class_map.translation()
+    assert "aλb😀".translate(translation) == "\0\1\0\0"
+    assert ord("λ") in translation
@@ -1,8 +1,11 @@
-from lexer import Lexer, LexerError
+from lexer import Lexer, LexerError, get_lexer, cached_lexer, LEXER_CACHE_SIZE
+from lexer_table import DEFAULT_CHUNK_SIZE, LexerTable
+from intervals import ClassMap
 
 from common import Terminal
 from grammar_reader import Grammar
 
+import io
 import pytest
 
 
@@ -94,3 +97,174 @@ Start Symbol: EXPR
     lexer = Lexer(g.terminal_triples)
 
     assert lexer.lex("\n\n\nif") == [Terminal("IF")]
+
+
+def test_lexer_long_input():
+    g = Grammar.from_file("slang.grammar")
+    lexer = Lexer(g.terminal_triples)
+
+    statement = "if x1 = 0 then y := (17) else z;\n"
+    tokens = lexer.lex(statement * 2000)
+
+    assert len(tokens) == 13 * 2000
+    assert tokens[:13] == lexer.lex(statement)
+    assert tokens[-2].identical_to(Terminal("IDENT", "z"))
+
+    with pytest.raises(LexerError) as le:
+        lexer.lex(statement * 100 + "@")
+    assert le.value.characters_consumed == len(statement) * 100
+
+
+def test_lexer_cache():
+    Regexes = [
+        (Terminal("WHITESPACE"), "([ \\n\\t])*", ["IGNORE"]),
+        (Terminal("ID"), "[a-zA-Z]([a-zA-Z0-9_])*", ["STORE"]),
+    ]
+
+    cached_lexer.cache_clear()
+    lexer = get_lexer(Regexes)
+    assert cached_lexer.cache_info().misses == 1
+
+    # An equal (but not identical) description reuses the same lexer
+    assert get_lexer([(Terminal(t.name), r, list(a)) for t, r, a in Regexes]) is lexer
+    assert get_lexer(Regexes).lex("x y") == [Terminal("ID"), Terminal("ID")]
+    assert cached_lexer.cache_info().hits == 2
+    assert cached_lexer.cache_info().misses == 1
+
+    # But changing the actions doesn't
+    assert get_lexer(Regexes[:1] + [(Terminal("ID"), Regexes[1][1], [])]) is not lexer
+
+    # Fill up the cache with other lexers so that the first one is evicted
+    for i in range(LEXER_CACHE_SIZE):
+        get_lexer([(Terminal("CHAR"), chr(ord("a") + i), [])])
+    assert cached_lexer.cache_info().currsize == LEXER_CACHE_SIZE
+    assert get_lexer(Regexes) is not lexer
+
+
+def test_lexer_table():
+    lexer = Lexer(
+        [
+            (Terminal("IF"), "if", []),
+            (Terminal("IDENT"), "[a-z]([a-z0-9])*", ["STORE"]),
+            (Terminal("SKIP"), "[ ]", ["IGNORE"]),
+        ]
+    )
+    table = lexer.table
+    # The classes are i, f, the other letters, digits, space, and everything else in unicode
+    dfa_table = lexer.dfa.table
+    assert dfa_table is not None
+    assert table.num_classes == dfa_table.num_classes == 6
+    class_of = table.class_map.class_of
+    for c in dfa_table.symbols:
+        assert class_of(c) == dfa_table.symbol_class(c)
+    assert class_of("a") == class_of("z")
+    assert class_of("i") != class_of("f")
+    assert class_of("A") == class_of("!") == class_of("\0") == class_of("é") == 0
+    assert table.start == 0
+    assert table.dead is not None
+    assert all(q == table.dead for q in table.rows[table.dead])
+    assert table.tokens == [
+        (Terminal("IF"), []),
+        (Terminal("IDENT"), ["STORE"]),
+        (Terminal("SKIP"), ["IGNORE"]),
+    ]
+    # "if" is accepted as both IF and IDENT, but IF comes first
+    after_if = table.rows[table.rows[0][class_of("i")]][class_of("f")]
+    assert table.accept[after_if] == 0
+
+    # Round trip through the form that gets written into generated parsers
+    encoded = LexerTable.encode_rows(table.rows)
+    assert LexerTable.decode_rows(encoded, table.num_classes) == table.rows
+    decoded_table = LexerTable(
+        ClassMap.encode_starts(table.class_map.starts),
+        LexerTable.encode_classes(table.class_map.classes),
+        encoded,
+        table.start,
+        table.dead,
+        table.accept,
+        table.tokens,
+    )
+    assert decoded_table.class_map.starts == table.class_map.starts
+    assert decoded_table.class_map.classes == table.class_map.classes
+    assert decoded_table.rows == table.rows
+    assert decoded_table.lex("if iff") == [Terminal("IF"), Terminal("IDENT", "iff")]
+
+    # Characters that aren't in any token are a lexing error
+    with pytest.raises(LexerError) as le:
+        lexer.lex("if é")
+    assert le.value.characters_consumed == 3
+
+
+def test_lexer_unicode():
+    lexer = Lexer(
+        [
+            (Terminal("IDENT"), "[a-zα-ω]([a-zα-ω0-9])*", ["STORE"]),
+            (Terminal("COMMENT"), "#([^\n])*", ["IGNORE"]),
+            (Terminal("SKIP"), "[ \n]", ["IGNORE"]),
+        ]
+    )
+    tokens = lexer.lex("λx # ünïcödé 😀 comment\nαβ1 z")
+    assert [t.value for t in tokens] == ["λx", "αβ1", "z"]
+
+    # Non-ascii that isn't in any token is still an error, even from a long way into unicode
+    with pytest.raises(LexerError) as le:
+        lexer.lex("x 😀")
+    assert le.value.characters_consumed == 2
+
+    # And the per-character lookups are remembered, so lexing it again uses the same table
+    assert lexer.lex("# 😀\nλ")[0].identical_to(Terminal("IDENT", "λ"))
+    assert ord("😀") in lexer.table.translation
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, DEFAULT_CHUNK_SIZE])
+def test_iter_tokens(chunk_size):
+    g = Grammar.from_file("slang.grammar")
+    lexer = Lexer(g.terminal_triples)
+    with open("slang/fib.slang", "r", encoding="utf-8") as f:
+        source = f.read()
+
+    expected = lexer.lex(source)
+    actual = list(lexer.iter_tokens(io.StringIO(source), chunk_size))
+    assert len(actual) == len(expected)
+    assert all(a.identical_to(e) for a, e in zip(actual, expected))
+
+    with pytest.raises(LexerError) as le:
+        list(lexer.iter_tokens(io.StringIO(source + " @"), chunk_size))
+    assert le.value.characters_consumed == len(source) + 1
+
+
+def test_iter_tokens_is_lazy():
+    lexer = Lexer(
+        [
+            (Terminal("IDENT"), "[a-z]([a-z])*", ["STORE"]),
+            (Terminal("SKIP"), "[ ]", ["IGNORE"]),
+        ]
+    )
+
+    class CountingStream(io.StringIO):
+        def __init__(self, value: str):
+            super().__init__(value)
+            self.reads = 0
+
+        def read(self, size: int = -1) -> str:
+            self.reads += 1
+            return super().read(size)
+
+    stream = CountingStream("abc " * 1000)
+    tokens = lexer.iter_tokens(stream, 10)
+    assert next(tokens).identical_to(Terminal("IDENT", "abc"))
+    assert stream.reads == 1
+    assert sum(1 for _ in tokens) == 999
+    # 4000 characters is 400 chunks, then one more read to find out that was the end
+    assert stream.reads == 401
+
+    # A token that's longer than a chunk carries on through as many chunks as it needs
+    long = "x" * 100
+    assert [t.value for t in lexer.iter_tokens(io.StringIO(f"{long} y"), 3)] == [
+        long,
+        "y",
+    ]
+    assert list(lexer.iter_tokens(io.StringIO(""))) == []
+
+    with pytest.raises(AssertionError):
+        next(lexer.iter_tokens(stream, 0))
@@ -0,0 +1,149 @@
+from itertools import product
+
+from dfa import DFA
+from nfa import CompactNFA, TypedNFA
+from intervals import IntervalSet
+from regex import Regex, EmptyRegex
+
+import pytest
+
+regexes = [
+    "",
+    "a",
+    "[a-c]",
+    "[εa]b",
+    "ab",
+    "(a+b)",
+    "(a)*",
+    "(ab)*c",
+    "((a+b))*abb",
+    "a((b+))*c",
+    "(((a)*+b)c)*",
+]
+
+
+def all_strings(alphabet: str, max_length: int) -> list[str]:
+    return [
+        "".join(chars)
+        for length in range(max_length + 1)
+        for chars in product(alphabet, repeat=length)
+    ]
+
+
+@pytest.mark.parametrize("regex_string", regexes)
+def test_same_language_as_typed_nfa(regex_string):
+    regex = Regex.parse(regex_string)
+    compact_nfa = CompactNFA.from_regex(regex, {"a", "b", "c", "d"})
+    typed_nfa = TypedNFA.from_regex(regex, {"a", "b", "c", "d"})
+
+    for string in all_strings("abcd", 4):
+        assert compact_nfa.test_string(string) == typed_nfa.test_string(string), string
+
+
+def test_empty_regex():
+    nfa = CompactNFA.from_regex(EmptyRegex(), {"a", "b", "c"})
+    assert not nfa.test_string("")
+    assert not nfa.test_string("a")
+
+
+def test_abstract_regex():
+    with pytest.raises(AssertionError):
+        CompactNFA.from_regex(Regex(), {"a"})
+
+
+def test_arrays():
+    nfa = CompactNFA.from_regex(Regex.parse("(a+b)"), {"a", "b", "c"})
+
+    # A start state for the whole thing, then the Thompson construction for the or
+    assert nfa.Q == set(range(7))
+    assert nfa.q_0 == 0
+    assert nfa.F == {6}
+    assert nfa.epsilons[0] == [1]
+    assert nfa.epsilons[1] == [2, 4]
+    assert nfa.edges[2] == [(IntervalSet.from_characters("a"), 3)]
+    assert nfa.edges[4] == [(IntervalSet.from_characters("b"), 5)]
+    assert nfa.epsilons[3] == [6]
+    assert nfa.epsilons[5] == [6]
+
+    # And the TypedNFA view of it
+    assert nfa.delta(1, "") == {2, 4}
+    assert nfa.delta(2, "a") == {3}
+    assert nfa.delta(2, "b") == set()
+    assert nfa.epsilon_close({0}) == {0, 1, 2, 4}
+    assert nfa.subset_step(frozenset({0, 1, 2, 4}), "a") == frozenset({3, 6})
+
+
+def test_tags():
+    nfa = CompactNFA.from_regexes(
+        [
+            (Regex.parse("if"), "IF"),
+            (Regex.parse("[a-z]([a-z])*"), "IDENT"),
+        ],
+        set("abcdefghijklmnopqrstuvwxyz"),
+    )
+
+    assert len(nfa.tags) == len(nfa.Q)
+    assert nfa.state_rankings[:2] == sorted(nfa.F, key=nfa.state_rankings.index)
+
+    nfa.test_string("if")
+    assert nfa.last_accept_tag == "IF"
+    nfa.test_string("iff")
+    assert nfa.last_accept_tag == "IDENT"
+
+    dfa = DFA.fromNFA(nfa)
+    dfa.test_string("if")
+    assert dfa.last_accept_tag == "IF"
+    dfa.test_string("i")
+    assert dfa.last_accept_tag == "IDENT"
+
+
+def test_same_dfa_as_merged_nfas():
+    descriptions = [("if", "IF"), ("[a-z]([a-z0-9])*", "IDENT"), ("[0-9]", "INT")]
+    Sigma = set("abcdefghijklmnopqrstuvwxyz0123456789")
+
+    compact_dfa = DFA.fromNFA(
+        CompactNFA.from_regexes([(Regex.parse(r), t) for r, t in descriptions], Sigma)
+    ).minimize()
+    merged_dfa = DFA.fromNFA(
+        TypedNFA.merge_nfas(
+            [
+                TypedNFA.from_regex(Regex.parse(r), Sigma, accept_tag=t)
+                for r, t in descriptions
+            ]
+        )
+    ).minimize()
+
+    assert len(compact_dfa.Q) == len(merged_dfa.Q)
+    for string in ["if", "i", "iff", "x9", "9", "99", "", "if9"]:
+        assert compact_dfa.longest_prefix(string) == merged_dfa.longest_prefix(string)
+        assert compact_dfa.last_accept_tag == merged_dfa.last_accept_tag
+
+
+def test_class_map():
+    nfa = CompactNFA.from_regexes(
+        [
+            (Regex.parse("if"), "IF"),
+            (Regex.parse("[a-z]([a-z0-9])*"), "IDENT"),
+            (Regex.parse("#([^\n])*"), "COMMENT"),
+        ]
+    )
+    class_map = nfa.class_map()
+    # Numbered by first appearance: anything but \n, \n, #, digits, the other letters, f, i
+    assert [class_map.class_of(c) for c in "\0\n#09aefiz+é"] == [
+        0, 1, 2, 3, 3, 4, 4, 5, 6, 4, 0, 0
+    ]  # fmt: skip
+    assert class_map.num_classes == 7
+    assert class_map.representatives() == ["\0", "\n", "#", "0", "a", "f", "i"]
+
+
+def test_unicode():
+    nfa = CompactNFA.from_regex(Regex.parse("[α-ω]([^ ])*"))
+    assert nfa.test_string("λ")
+    assert nfa.test_string("λ😀x")
+    assert not nfa.test_string("λ 😀")
+    assert not nfa.test_string("a")
+
+    dfa = DFA.fromNFA(nfa)
+    assert dfa.test_string("λ😀x")
+    assert not dfa.test_string("λ 😀")
+    assert dfa.longest_prefix("λ😀x y") == 3
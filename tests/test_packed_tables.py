@@ -0,0 +1,378 @@
+from packed_tables import (
+    PackedTables,
+    CompressedTables,
+    ParseError,
+    ERROR,
+    NO_GOTO,
+    comb,
+)
+from parser_stub import parse_internal
+
+from cfg import CFG
+from common import NonTerminal, Terminal, dollar
+from grammar_reader import Grammar
+from lexer import get_lexer
+
+from array import array
+import glob
+import pytest
+
+E = NonTerminal("E")
+T = NonTerminal("T")
+F = NonTerminal("F")
+
+ident = Terminal("id")
+o_bracket = Terminal("(")
+c_bracket = Terminal(")")
+plus = Terminal("+")
+times = Terminal("*")
+
+
+def g2():
+    P = {
+        E: [[E, plus, T], [T]],
+        T: [[T, times, F], [F]],
+        F: [[ident], [o_bracket, E, c_bracket]],
+    }
+
+    return CFG(
+        {E, T, F},
+        {ident, o_bracket, c_bracket, plus, times},
+        P,
+        E,
+        terminals_order=[o_bracket, ident, c_bracket, plus, times],
+        nonterminals_order=[E, T, F],
+        add_unique_starting_production=True,
+    )
+
+
+def pack(cfg):
+    return PackedTables.from_tables(
+        cfg.slr1_action,
+        cfg.slr1_goto,
+        cfg.terminals_order + [dollar],
+        cfg.nonterminals_order,
+        [prod for prods in cfg.P.values() for prod in prods],
+    )
+
+
+def tree_actions(cfg):
+    return {n: lambda xs, n=n: f"{n}({', '.join([str(x) for x in xs])})" for n in cfg.N}
+
+
+def test_packing():
+    cfg = g2()
+    tables = pack(cfg)
+    terminals = cfg.terminals_order + [dollar]
+    productions = [prod for prods in cfg.P.values() for prod in prods]
+
+    assert tables.num_states == len(cfg.slr1_action)
+    assert list(tables.prod_lengths) == [len(prod) for prod in productions]
+    for s, row in cfg.slr1_action.items():
+        for t, a in row.items():
+            n = tables.action[s * len(terminals) + terminals.index(t)]
+            if a is None:
+                assert n == ERROR
+            elif n > 0:
+                assert str(a) == f"Shift({t}, {n})"
+            elif -n - 1 == len(productions):
+                assert str(a) == "Accept()"
+            else:
+                assert a.prod == productions[-n - 1]
+    for s, row in cfg.slr1_goto.items():
+        for nt, next_state in row.items():
+            n = tables.goto[
+                s * len(cfg.nonterminals_order) + cfg.nonterminals_order.index(nt)
+            ]
+            assert n == (NO_GOTO if next_state is None else next_state)
+
+    # Round trip through the form that gets written into generated parsers
+    decoded = PackedTables(
+        tables.terminals,
+        tables.nonterminals,
+        PackedTables.encode(tables.action),
+        PackedTables.encode(tables.goto),
+        PackedTables.encode(tables.prod_lengths),
+        PackedTables.encode(tables.prod_lhs),
+    )
+    assert decoded.action == tables.action
+    assert decoded.goto == tables.goto
+    assert decoded.prod_lengths == tables.prod_lengths
+    assert decoded.prod_lhs == tables.prod_lhs
+
+    with pytest.raises(AssertionError):
+        PackedTables(
+            tables.terminals,
+            tables.nonterminals,
+            tables.action[1:],
+            tables.goto,
+            tables.prod_lengths,
+            tables.prod_lhs,
+        )
+
+
+@pytest.mark.parametrize("debug", [False, True])
+def test_g2(debug):
+    cfg = g2()
+    tables = pack(cfg)
+    semantic_actions = tree_actions(cfg)
+
+    for source in [
+        [ident],
+        [ident, times, ident, dollar],
+        [o_bracket, ident, plus, ident, c_bracket, times, ident],
+    ]:
+        assert tables.parse(semantic_actions, iter(source), debug) == parse_internal(
+            cfg.slr1_action, cfg.slr1_goto, semantic_actions, source
+        )
+
+    with pytest.raises(ParseError) as e:
+        tables.parse(semantic_actions, [ident, times, plus, dollar], debug)
+    assert e.value.message == "Unexpected token, unable to proceed"
+    assert e.value.source_index == 2
+    assert e.value.token == plus
+    assert set(e.value.valid_terminals) == {ident, o_bracket}
+
+    with pytest.raises(ParseError) as e:
+        tables.parse(semantic_actions, [ident, dollar, ident], debug)
+    assert e.value.message == "Unexpected tokens at end of file"
+    assert e.value.source_index == 2
+
+
+@pytest.mark.parametrize("debug", [False, True])
+def test_epsilon_production(debug):
+    # Balanced brackets, L -> ( L ) L | ε
+    L = NonTerminal("L")
+    cfg = CFG(
+        {L},
+        {o_bracket, c_bracket},
+        {L: [[o_bracket, L, c_bracket, L], []]},
+        L,
+        terminals_order=[o_bracket, c_bracket],
+        nonterminals_order=[L],
+        add_unique_starting_production=True,
+    )
+    semantic_actions = {n: lambda xs: "".join(str(x) for x in xs) for n in cfg.N}
+    source = [o_bracket, c_bracket, o_bracket, o_bracket, c_bracket, c_bracket]
+    assert pack(cfg).parse(semantic_actions, source, debug) == "()(())"
+
+
+def test_comb():
+    rows = [{0: 1, 2: 2}, {}, {1: 3}, {0: 4, 1: 5, 2: 6, 3: 7}]
+    base, check, value = comb(rows, 4)
+    # The full row goes first, and then the others fit in around it as soon as they can
+    assert list(base) == [4, 0, 4, 0]
+    for r, row in enumerate(rows):
+        for c in range(4):
+            i = base[r] + c
+            if c in row:
+                assert check[i] == r
+                assert value[i] == row[c]
+            else:
+                assert check[i] != r
+    assert len(check) == len(value) == 8
+
+
+def test_compressed():
+    cfg = g2()
+    tables = pack(cfg)
+    compressed = CompressedTables.from_packed(tables)
+
+    assert len(compressed.action_check) < len(tables.action)
+    assert len(compressed.goto_check) < len(tables.goto)
+    for s in range(tables.num_states):
+        for t in range(len(tables.terminals)):
+            n = tables.action[s * len(tables.terminals) + t]
+            if n != ERROR:
+                assert compressed.action(s, t) == n
+            elif compressed.default_reductions[s] == ERROR:
+                assert compressed.action(s, t) == ERROR
+        for nt in range(len(tables.nonterminals)):
+            n = tables.goto[s * len(tables.nonterminals) + nt]
+            if n != NO_GOTO:
+                assert compressed.goto(s, nt) == n
+
+    # Round trip through the form that gets written into generated parsers
+    arrays = [
+        compressed.default_reductions,
+        compressed.action_base,
+        compressed.action_check,
+        compressed.action_value,
+        compressed.default_gotos,
+        compressed.goto_base,
+        compressed.goto_check,
+        compressed.goto_value,
+        compressed.prod_lengths,
+        compressed.prod_lhs,
+    ]
+    decoded = CompressedTables(
+        compressed.terminals,
+        compressed.nonterminals,
+        *[PackedTables.encode(a) for a in arrays],
+    )
+    assert [
+        decoded.default_reductions,
+        decoded.action_base,
+        decoded.action_check,
+        decoded.action_value,
+        decoded.default_gotos,
+        decoded.goto_base,
+        decoded.goto_check,
+        decoded.goto_value,
+        decoded.prod_lengths,
+        decoded.prod_lhs,
+    ] == arrays
+
+    with pytest.raises(AssertionError):
+        CompressedTables(
+            compressed.terminals,
+            compressed.nonterminals,
+            compressed.default_reductions,
+            compressed.action_base,
+            compressed.action_check[1:],
+            *arrays[3:],
+        )
+
+
+@pytest.mark.parametrize("debug", [False, True])
+def test_compressed_g2(debug):
+    cfg = g2()
+    tables = pack(cfg)
+    compressed = CompressedTables.from_packed(tables)
+    semantic_actions = tree_actions(cfg)
+
+    for source in [
+        [ident],
+        [ident, times, ident, dollar],
+        [o_bracket, ident, plus, ident, c_bracket, times, ident],
+    ]:
+        assert compressed.parse(semantic_actions, iter(source), debug) == tables.parse(
+            semantic_actions, source
+        )
+
+    # The default reductions mean it might be in a different state when it notices, but it's the same token
+    for source in [[ident, times, plus, dollar], [o_bracket, ident, ident]]:
+        with pytest.raises(ParseError) as packed_error:
+            tables.parse(semantic_actions, source)
+        with pytest.raises(ParseError) as e:
+            compressed.parse(semantic_actions, source, debug)
+        assert e.value.message == "Unexpected token, unable to proceed"
+        assert e.value.source_index == packed_error.value.source_index
+        assert e.value.token == packed_error.value.token
+        assert e.value.valid_terminals
+
+    with pytest.raises(ParseError) as e:
+        compressed.parse(semantic_actions, [ident, dollar, ident], debug)
+    assert e.value.message == "Unexpected tokens at end of file"
+    assert e.value.source_index == 2
+
+    L = NonTerminal("L")
+    cfg = CFG(
+        {L},
+        {o_bracket, c_bracket},
+        {L: [[o_bracket, L, c_bracket, L], []]},
+        L,
+        terminals_order=[o_bracket, c_bracket],
+        nonterminals_order=[L],
+        add_unique_starting_production=True,
+    )
+    semantic_actions = {n: lambda xs: "".join(str(x) for x in xs) for n in cfg.N}
+    source = [o_bracket, c_bracket, o_bracket, o_bracket, c_bracket, c_bracket]
+    compressed = CompressedTables.from_packed(pack(cfg))
+    assert compressed.parse(semantic_actions, source, debug) == "()(())"
+
+
+def test_lalr1():
+    # S -> L = R | R, L -> * R | id, R -> L isn't SLR(1), so this can only be done with the LALR(1) tables
+    S = NonTerminal("P")
+    L = NonTerminal("L")
+    R = NonTerminal("R")
+    equals = Terminal("=")
+    cfg = CFG(
+        {S, L, R},
+        {equals, times, ident},
+        {S: [[L, equals, R], [R]], L: [[times, R], [ident]], R: [[L]]},
+        S,
+        terminals_order=[equals, times, ident],
+        nonterminals_order=[S, L, R],
+        add_unique_starting_production=True,
+    )
+    tables = PackedTables.from_tables(
+        cfg.lalr1_action,
+        cfg.lalr1_goto,
+        cfg.terminals_order + [dollar],
+        cfg.nonterminals_order,
+        [prod for prods in cfg.P.values() for prod in prods],
+    )
+    semantic_actions = tree_actions(cfg)
+    assert (
+        tables.parse(semantic_actions, [times, ident, equals, ident])
+        == "P(L(*, R(L(id))), =, R(L(id)))"
+    )
+    assert tables.parse(semantic_actions, [ident]) == "P(R(L(id)))"
+
+
+def test_unknown_terminal():
+    # A token the grammar doesn't have is a ParseError like any other, whichever tables are used
+    cfg = g2()
+    tables = pack(cfg)
+    compressed = CompressedTables.from_packed(tables)
+    semantic_actions = tree_actions(cfg)
+    minus = Terminal("-")
+    parsers = [
+        lambda source: parse_internal(
+            cfg.slr1_action, cfg.slr1_goto, semantic_actions, source
+        ),
+        lambda source: tables.parse(semantic_actions, source),
+        lambda source: compressed.parse(semantic_actions, source),
+    ]
+    for parse in parsers:
+        for source, index in [([ident, minus, ident], 1), ([minus], 0)]:
+            with pytest.raises(ParseError) as e:
+                parse(source)
+            assert e.value.message == "Unexpected token, not a terminal of the grammar"
+            assert e.value.source_index == index
+            assert e.value.token == minus
+            assert len(e.value.valid_terminals) > 0
+
+
+def test_bad_goto():
+    cfg = g2()
+    tables = pack(cfg)
+    semantic_actions = tree_actions(cfg)
+    compressed = CompressedTables.from_packed(tables)
+    tables.goto = PackedTables.decode(PackedTables.encode([NO_GOTO] * len(tables.goto)))
+    with pytest.raises(AssertionError):
+        tables.parse(semantic_actions, [ident])
+
+    compressed.default_gotos = array("i", [NO_GOTO] * len(compressed.default_gotos))
+    compressed.goto_check = array("i", [-1] * len(compressed.goto_check))
+    with pytest.raises(AssertionError):
+        compressed.parse(semantic_actions, [ident])
+
+
+@pytest.fixture(scope="module")
+def slang():
+    return Grammar.from_file("slang.grammar", add_starting_production=True)
+
+
+@pytest.mark.parametrize("filename", sorted(glob.glob("slang/*.slang")))
+def test_slang(slang, filename):
+    g = slang
+    tables = PackedTables.from_tables(
+        g.cfg.slr1_action,
+        g.cfg.slr1_goto,
+        g.terminals + [dollar],
+        g.nonterminals,
+        [prod for prods in g.cfg.P.values() for prod in prods],
+    )
+    semantic_actions = tree_actions(g.cfg)
+    with open(filename, "r", encoding="utf-8") as f:
+        tokens = get_lexer(g.terminal_triples).lex(f.read())
+    expected = parse_internal(
+        g.cfg.slr1_action, g.cfg.slr1_goto, semantic_actions, tokens
+    )
+    assert tables.parse(semantic_actions, tokens) == expected
+    assert (
+        CompressedTables.from_packed(tables).parse(semantic_actions, tokens) == expected
+    )
@@ -1,13 +1,19 @@
 from parser_generator import ParserGenerator
 
 from grammar_reader import Grammar
+from lexer import get_lexer
+from lexer_table import LexerTable  # noqa: F401
+from packed_tables import PackedTables, CompressedTables, ParseError  # noqa: F401
 
 # These are used in the eval but ruff doesn't know that
 from common import NonTerminal, Terminal, Production, LR0_Accept, LR0_Shift, LR0_Reduce  # noqa: F401
+from common import dollar, epsilon  # noqa: F401
 
 # Ditto, used in exec
 import abc  # noqa: F401
 
+from collections.abc import Iterator
+
 import ast
 import pytest
 
@@ -104,6 +110,39 @@ def test_action_to_string():
     assert eval(python_source) == pg.cfg.slr1_action
 
 
+def test_lalr1_action_to_string():
+    g = Grammar.from_file("slang.grammar", add_starting_production=True)
+    pg = ParserGenerator(g, "", [], [], lalr1=True)
+
+    _T = g.terminals
+    _N = g.nonterminals
+    _P = pg.production_list
+
+    python_source = pg.action_to_string()
+
+    assignment = "_Action: dict[int, dict[Terminal, Optional[LR0_Action]]] = "
+    assert python_source.startswith(assignment)
+    python_source = python_source[len(assignment) :]
+
+    assert eval(python_source) == pg.cfg.lalr1_action
+    assert pg.goto_table() == pg.cfg.lalr1_goto
+    assert pg.packed_tables().num_states == len(pg.cfg.slr1_action)
+
+
+def test_lr1_goto_to_string():
+    g = Grammar.from_file("g2.grammar", add_starting_production=True)
+    pg = ParserGenerator(g, "", [], [], lr1=True)
+
+    python_source = pg.goto_to_string()
+
+    assignment = "_Goto: dict[int, dict[NonTerminal, Optional[int]]] = "
+    assert python_source.startswith(assignment)
+    python_source = python_source[len(assignment) :]
+
+    assert eval(python_source) == pg.cfg.lr1_goto
+    assert pg.action_table() == pg.cfg.lr1_action
+
+
 def test_goto_to_string():
     g = Grammar.from_file("g2.grammar", add_starting_production=True)
     pg = ParserGenerator(g, "", [], [])
@@ -119,19 +158,91 @@ def test_goto_to_string():
     assert eval(python_source) == pg.cfg.slr1_goto
 
 
-def test_regexes_to_string():
+def test_packed_tables_to_string():
+    g = Grammar.from_file("g2.grammar", add_starting_production=True)
+    pg = ParserGenerator(g, "", [], [])
+
+    _T = g.terminals
+    _N = g.nonterminals
+
+    python_source = pg.packed_tables_to_string()
+
+    assignment = "_Tables = "
+    assert python_source.startswith(assignment)
+    python_source = python_source[len(assignment) :]
+
+    print(python_source)
+
+    actual = eval(python_source)
+    expected = pg.packed_tables()
+    assert actual.terminals == expected.terminals == _T + [dollar]
+    assert actual.nonterminals == expected.nonterminals == _N
+    assert actual.action == expected.action
+    assert actual.goto == expected.goto
+    assert actual.prod_lengths == expected.prod_lengths
+    assert actual.prod_lhs == expected.prod_lhs
+
+
+def test_compressed_tables_to_string():
+    g = Grammar.from_file("slang.grammar", add_starting_production=True)
+    pg = ParserGenerator(g, "", [], [], compressed=True)
+
+    _T = g.terminals
+    _N = g.nonterminals
+
+    python_source = pg.compressed_tables_to_string()
+
+    assignment = "_Tables = "
+    assert python_source.startswith(assignment)
+    python_source = python_source[len(assignment) :]
+
+    actual = eval(python_source)
+    expected = CompressedTables.from_packed(pg.packed_tables())
+    assert actual.terminals == expected.terminals == _T + [dollar]
+    assert actual.nonterminals == expected.nonterminals == _N
+    assert actual.default_reductions == expected.default_reductions
+    assert actual.action_base == expected.action_base
+    assert actual.action_check == expected.action_check
+    assert actual.action_value == expected.action_value
+    assert actual.default_gotos == expected.default_gotos
+    assert actual.goto_base == expected.goto_base
+    assert actual.goto_check == expected.goto_check
+    assert actual.goto_value == expected.goto_value
+    assert actual.prod_lengths == expected.prod_lengths
+    assert actual.prod_lhs == expected.prod_lhs
+
+    # Much smaller than the uncompressed ones
+    assert len(python_source) < len(pg.packed_tables_to_string()) / 2
+
+
+def test_lexer_table_to_string():
     g = Grammar.from_file("slang.grammar", add_starting_production=True)
     pg = ParserGenerator(g, "", [], [])
 
-    python_source = pg.regexes_to_string()
+    python_source = pg.lexer_table_to_string()
 
-    assignment = "_Regexes: list[tuple[Terminal, str, list[str]]] = "
+    assignment = "_LexerTable = "
     assert python_source.startswith(assignment)
     python_source = python_source[len(assignment) :]
 
     print(python_source)
 
-    assert eval(python_source) == g.terminal_triples
+    expected = get_lexer(g.terminal_triples).table
+    actual = eval(python_source)
+    assert actual.class_map.starts == expected.class_map.starts
+    assert actual.class_map.classes == expected.class_map.classes
+    assert actual.num_classes == expected.num_classes
+    assert actual.rows == expected.rows
+    assert actual.start == expected.start
+    assert actual.dead == expected.dead
+    assert actual.accept == expected.accept
+    assert actual.tokens == expected.tokens
+
+    with open("slang/fib.slang", "r", encoding="utf-8") as f:
+        source = f.read()
+    assert all(
+        a.identical_to(e) for a, e in zip(actual.lex(source), expected.lex(source))
+    )
 
 
 def test_generated_ast_classes():
@@ -223,3 +334,174 @@ def test_generated_semantic_actions():
     E = NonTerminal("E")
 
     assert isinstance(namespace["_semantic_actions"][E]([]), namespace["E"])
+
+
+def test_productions_to_string_epsilon():
+    g = Grammar.from_file("g2_ll1.grammar", add_starting_production=True)
+    pg = ParserGenerator(g, "", [], [], recursive_descent=True)
+
+    _T = g.terminals
+    _N = g.nonterminals
+
+    python_source = pg.productions_to_string()
+    python_source = python_source[len("_P: list[Production] = ") :]
+
+    assert eval(python_source) == pg.production_list
+    assert "epsilon" in python_source
+
+
+def test_recursive_descent_to_string():
+    g = Grammar.from_file("g2_ll1.grammar", add_starting_production=True)
+    pg = ParserGenerator(g, "", [], [], recursive_descent=True)
+
+    namespace = {"_T": g.terminals, "_N": g.nonterminals}
+    exec(
+        "from common import NonTerminal, Terminal, dollar\n"
+        "from packed_tables import ParseError\n"
+        "from typing import Any, Callable\n"
+        "from collections.abc import Iterable, Iterator\n",
+        namespace,
+    )
+    exec(pg.generate_ast_classes(), namespace)
+    exec(pg.generate_semantic_actions(), namespace)
+
+    python_source = pg.recursive_descent_to_string()
+    print(python_source)
+    assert "[1:]" not in python_source, "No slicing"
+    exec(python_source, namespace)
+
+    ident = Terminal("ID")
+    plus = Terminal("PLUS")
+    E, E_prime, T, T_prime, F = (
+        namespace[n] for n in ["E", "E_prime", "T", "T_prime", "F"]
+    )
+    expected_T = T([F([ident]), T_prime([])])
+    assert namespace["_parse"]([ident, plus, ident]) == E(
+        [expected_T, E_prime([plus, expected_T, E_prime([])])]
+    )
+
+    with pytest.raises(ParseError) as e:
+        namespace["_parse"]([ident, ident])
+    assert e.value.source_index == 1
+    assert e.value.valid_terminals == [
+        plus,
+        Terminal("TIMES"),
+        Terminal("C_BRACKET"),
+        dollar,
+    ]
+
+    with pytest.raises(ParseError) as e:
+        namespace["_parse"]([ident, dollar, ident])
+    assert e.value.message == "Unexpected tokens at end of file"
+    assert e.value.source_index == 2
+
+    with pytest.raises(ParseError) as e:
+        namespace["_parse"]([ident, Terminal("NOT_IN_THE_GRAMMAR")])
+    assert e.value.message == "Unexpected token, not a terminal of the grammar"
+    assert e.value.source_index == 1
+
+    # It pulls the tokens as it needs them, so it never gets to the ones after the error
+    def tokens() -> Iterator[Terminal]:
+        yield ident
+        yield ident
+        assert False, "Read past the error"
+
+    with pytest.raises(ParseError) as e:
+        namespace["_parse"](tokens())
+    assert e.value.source_index == 1
+
+
+def test_recursive_descent_not_ll1():
+    g = Grammar.from_file("g2.grammar", add_starting_production=True)
+    pg = ParserGenerator(g, "", [], [], recursive_descent=True)
+    with pytest.raises(AssertionError):
+        pg.recursive_descent_to_string()
+
+
+def recursive_ascent_namespace(
+    filename: str, without_epsilon: bool = False
+) -> tuple[Grammar, dict]:
+    g = Grammar.from_file(filename, add_starting_production=True)
+    if without_epsilon:
+        # The LR automata want ε-productions written as empty RHSs
+        g.productions = {
+            n: [[s for s in rhs if s != epsilon] for rhs in rhss]
+            for n, rhss in g.productions.items()
+        }
+        g._cfg = None
+    pg = ParserGenerator(g, "", [], [], recursive_ascent=True)
+
+    namespace = {"_T": g.terminals, "_N": g.nonterminals}
+    exec(
+        "from common import NonTerminal, Terminal, dollar\n"
+        "from packed_tables import ParseError\n"
+        "from typing import Any, Callable\n"
+        "from collections.abc import Iterable, Iterator\n"
+        "import sys\n",
+        namespace,
+    )
+    exec(pg.generate_ast_classes(), namespace)
+    exec(pg.generate_semantic_actions(), namespace)
+
+    python_source = pg.recursive_ascent_to_string()
+    print(python_source)
+    exec(python_source, namespace)
+    return g, namespace
+
+
+def test_recursive_ascent_to_string():
+    g, namespace = recursive_ascent_namespace("g2.grammar")
+
+    ident = Terminal("ID")
+    plus = Terminal("PLUS")
+    times = Terminal("TIMES")
+    E, T, F = (namespace[n] for n in ["E", "T", "F"])
+    # x + x * x
+    tree = namespace["_parse"]([ident, plus, ident, times, ident])
+    assert tree == E(
+        [E([T([F([ident])])]), plus, T([T([F([ident])]), times, F([ident])])]
+    )
+
+    with pytest.raises(ParseError) as e:
+        namespace["_parse"]([ident, ident])
+    assert e.value.source_index == 1
+    assert set(e.value.valid_terminals) == {
+        plus,
+        times,
+        Terminal("C_BRACKET"),
+        dollar,
+    }
+
+    with pytest.raises(ParseError) as e:
+        namespace["_parse"]([ident, dollar, ident])
+    assert e.value.message == "Unexpected tokens at end of file"
+    assert e.value.source_index == 2
+
+    with pytest.raises(ParseError) as e:
+        namespace["_parse"]([ident, Terminal("NOT_IN_THE_GRAMMAR")])
+    assert e.value.message == "Unexpected token, not a terminal of the grammar"
+    assert e.value.source_index == 1
+
+    # It pulls the tokens as it needs them, so it never gets to the ones after the error
+    def tokens() -> Iterator[Terminal]:
+        yield ident
+        yield ident
+        assert False, "Read past the error"
+
+    with pytest.raises(ParseError) as e:
+        namespace["_parse"](tokens())
+    assert e.value.source_index == 1
+
+
+def test_recursive_ascent_to_string_epsilon():
+    g, namespace = recursive_ascent_namespace("g2_ll1.grammar", without_epsilon=True)
+
+    ident = Terminal("ID")
+    plus = Terminal("PLUS")
+    E, E_prime, T, T_prime, F = (
+        namespace[n] for n in ["E", "E_prime", "T", "T_prime", "F"]
+    )
+    expected_T = T([F([ident]), T_prime([])])
+    assert namespace["_parse"]([ident, plus, ident]) == E(
+        [expected_T, E_prime([plus, expected_T, E_prime([])])]
+    )
@@ -1,8 +1,10 @@
-from parser_stub import parse_internal, ParseError, lex_internal
+from parser_stub import parse_internal, ParseError, lex_internal, iter_tokens_internal
 
 from cfg import CFG
-from common import NonTerminal, Terminal, dollar
+from common import NonTerminal, Terminal, LR0_Shift, dollar
+from lexer import get_lexer
 
+import io
 import pytest
 
 E = NonTerminal("E")
@@ -34,7 +36,8 @@ def g2():
     )
 
 
-def test_g2_id_times_id():
+@pytest.mark.parametrize("debug", [False, True])
+def test_g2_id_times_id(debug):
     cfg = g2()
 
     semantic_actions = {
@@ -47,11 +50,51 @@ def test_g2_id_times_id():
             cfg.slr1_goto,
             semantic_actions,
             [ident, times, ident, dollar],
+            debug,
         )
         == "E(T(T(F(id)), *, F(id)))"
     )
 
 
+@pytest.mark.parametrize("debug", [False, True])
+def test_epsilon_production(debug):
+    # Balanced brackets, L -> ( L ) L | ε
+    L = NonTerminal("L")
+    cfg = CFG(
+        {L},
+        {o_bracket, c_bracket},
+        {L: [[o_bracket, L, c_bracket, L], []]},
+        L,
+        terminals_order=[o_bracket, c_bracket],
+        nonterminals_order=[L],
+        add_unique_starting_production=True,
+    )
+    semantic_actions = {n: lambda xs: "".join(str(x) for x in xs) for n in cfg.N}
+
+    # Reducing L -> ε pops nothing, so it mustn't take anything else off the stacks with it
+    source = [o_bracket, c_bracket, o_bracket, o_bracket, c_bracket, c_bracket]
+    assert (
+        parse_internal(cfg.slr1_action, cfg.slr1_goto, semantic_actions, source, debug)
+        == "()(())"
+    )
+
+
+def test_debug_checks():
+    cfg = g2()
+    semantic_actions = {n: lambda xs: xs for n in cfg.N}
+
+    # Break a shift so that it claims to be for the wrong terminal
+    action = {s: dict(row) for s, row in cfg.slr1_action.items()}
+    for s, row in action.items():
+        if isinstance(row[ident], LR0_Shift):
+            row[ident] = LR0_Shift(plus, row[ident].next_state)
+
+    # Which only gets noticed in debug mode
+    parse_internal(action, cfg.slr1_goto, semantic_actions, [ident], False)
+    with pytest.raises(AssertionError):
+        parse_internal(action, cfg.slr1_goto, semantic_actions, [ident], True)
+
+
 def test_g2_unexpected_token():
     cfg = g2()
 
@@ -68,6 +111,50 @@ def test_g2_unexpected_token():
         )
     assert e.value.message == "Unexpected token, unable to proceed"
     assert e.value.source_index == 2
+    assert e.value.token == plus
+    assert set(e.value.valid_terminals) == {ident, o_bracket}
+    assert "at index 2 (+)" in str(e.value)
+
+
+def test_g2_iterator():
+    cfg = g2()
+
+    pulled: list[Terminal] = []
+    reductions: list[int] = []
+
+    def tokens():
+        for t in [ident, times, ident, plus, ident]:
+            pulled.append(t)
+            yield t
+
+    def semantic_action(xs, n):
+        # How far through the input we'd got when this was reduced
+        reductions.append(len(pulled))
+        return f"{n}({', '.join([str(x) for x in xs])})"
+
+    semantic_actions = {n: lambda xs, n=n: semantic_action(xs, n) for n in cfg.N}
+
+    # There's no $ at the end, that comes from running out of tokens
+    assert (
+        parse_internal(cfg.slr1_action, cfg.slr1_goto, semantic_actions, tokens())
+        == "E(E(T(T(F(id)), *, F(id))), +, T(F(id)))"
+    )
+    # The first F is reduced as soon as we can see the * after it, long before the end
+    assert reductions[0] == 2
+
+    with pytest.raises(ParseError) as e:
+        parse_internal(
+            cfg.slr1_action, cfg.slr1_goto, semantic_actions, iter([ident, times])
+        )
+    assert e.value.source_index == 2
+    assert e.value.token == dollar
+
+    with pytest.raises(ParseError) as e:
+        parse_internal(
+            cfg.slr1_action, cfg.slr1_goto, semantic_actions, [ident, dollar, ident]
+        )
+    assert e.value.message == "Unexpected tokens at end of file"
+    assert e.value.source_index == 2
 
 
 def test_g2_lexer():
@@ -81,9 +168,16 @@ def test_g2_lexer():
     ]
 
     expected = [Terminal("ID", "x"), Terminal("TIMES"), Terminal("ID", "y"), dollar]
-    actual = lex_internal(Regexes, "x * y")
+    actual = lex_internal(get_lexer(Regexes).table, "x * y")
 
     print(actual)
     assert len(expected) == len(actual)
     for e, a in zip(expected, actual):
         assert e.identical_to(a)
+
+    streamed = list(
+        iter_tokens_internal(get_lexer(Regexes).table, io.StringIO("x * y"))
+    )
+    assert len(streamed) == len(expected) - 1
+    for e, a in zip(expected, streamed):
+        assert e.identical_to(a)
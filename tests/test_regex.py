@@ -54,6 +54,35 @@ def test_range_abc():
     assert not regex.test_string("aa")
 
 
+def test_range_not_abc():
+    regex = Regex.parse("[^a-c]")
+
+    assert not regex.test_string("")
+    assert not regex.test_string("a")
+    assert not regex.test_string("c")
+    assert regex.test_string("d")
+    assert regex.test_string("^")
+    assert regex.test_string("λ")
+    assert not regex.test_string("dd")
+
+
+def test_range_unicode():
+    regex = Regex.parse("[α-ω]")
+
+    assert regex.test_string("λ")
+    assert not regex.test_string("a")
+    assert str(regex) == "RangeRegex([α-ω])"
+
+
+def test_range_epsilon():
+    regex = Regex.parse("[εa]")
+
+    assert regex.test_string("")
+    assert regex.test_string("a")
+    assert not regex.test_string("b")
+    assert str(regex) == "RangeRegex(ε[a])"
+
+
 def test_a_or_b():
     regex = Regex.parse("(a+b)")
 
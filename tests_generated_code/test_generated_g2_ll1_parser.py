@@ -0,0 +1,94 @@
+from generated_g2_ll1_parser import (
+    parse,
+    ParseError,
+    lex,
+    iter_tokens,
+    E,
+    E_prime,
+    T,
+    T_prime,
+    F,
+)
+import generated_g2_parser
+
+from common import Terminal, dollar
+
+import io
+import pytest
+
+# NOTE: This uses the grammar in the file so Terminals are all upper case
+ident = Terminal("ID")
+times = Terminal("TIMES")
+plus = Terminal("PLUS")
+o_bracket = Terminal("O_BRACKET")
+c_bracket = Terminal("C_BRACKET")
+
+
+def test_parse_id():
+    assert parse([ident, dollar]) == E([T([F([ident]), T_prime([])]), E_prime([])])
+
+
+def test_parse_id_times_id_plus_id():
+    assert parse([ident, times, ident, plus, ident]) == E(
+        [
+            T([F([ident]), T_prime([times, F([ident]), T_prime([])])]),
+            E_prime([plus, T([F([ident]), T_prime([])]), E_prime([])]),
+        ]
+    )
+
+
+def test_parse_brackets():
+    assert parse(lex("(x)")) == E(
+        [
+            T(
+                [
+                    F([o_bracket, parse(lex("x")), c_bracket]),
+                    T_prime([]),
+                ]
+            ),
+            E_prime([]),
+        ]
+    )
+
+
+def test_parse_unexpected_token():
+    with pytest.raises(ParseError) as e:
+        parse([ident, times, plus, dollar])
+    assert e.value.message == "Unexpected token, unable to proceed"
+    assert e.value.source_index == 2
+    assert e.value.token == plus
+
+    with pytest.raises(ParseError) as e:
+        parse(lex("(x"))
+    assert e.value.source_index == 2
+    assert e.value.token == dollar
+    assert e.value.valid_terminals == [c_bracket]
+
+    with pytest.raises(ParseError) as e:
+        parse([ident, dollar, ident])
+    assert e.value.message == "Unexpected tokens at end of file"
+
+
+def test_long_input():
+    # Far more than the recursion limit, which is fine because the lists are loops
+    source = " + ".join(["x * y"] * 5000)
+    tree = parse(lex(source)).nodes[1]
+    for _ in range(4999):
+        assert tree.nodes[0] == plus
+        tree = tree.nodes[2]
+    assert tree == E_prime([])
+
+
+def test_streaming_parse():
+    assert parse(iter_tokens(io.StringIO("x * y"))) == parse(lex("x * y"))
+
+
+def test_same_language_as_g2():
+    for source in ["x", "x + y * z", "(x + y) * z", "((x)) * (y + z * w)"]:
+        parse(lex(source))
+        generated_g2_parser.parse(generated_g2_parser.lex(source))
+    for source in ["x +", "(x", "x y", "* x"]:
+        with pytest.raises(ParseError):
+            parse(lex(source))
+        with pytest.raises(ParseError):
+            generated_g2_parser.parse(generated_g2_parser.lex(source))
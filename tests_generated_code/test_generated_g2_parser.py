@@ -1,8 +1,12 @@
-from generated_g2_parser import parse, ParseError, lex, E, T, F
+from generated_g2_parser import parse, ParseError, lex, iter_tokens, E, T, F
+import generated_g2_parser
 
 from common import Terminal, dollar
 
+import io
 import pytest
+import subprocess
+import sys
 
 # NOTE: This uses the grammar in the file so Terminals are all upper case
 ident = Terminal("ID")
@@ -44,6 +48,7 @@ def test_parse_unexpected_token():
         parse([ident, times, plus, dollar])
     assert e.value.message == "Unexpected token, unable to proceed"
     assert e.value.source_index == 2
+    assert e.value.token == plus
 
 
 def test_lexer():
@@ -54,3 +59,26 @@ def test_lexer():
     assert len(expected) == len(actual)
     for e, a in zip(expected, actual):
         assert e.identical_to(a)
+
+
+def test_streaming_parse():
+    assert parse(iter_tokens(io.StringIO("x * y"))) == parse(lex("x * y"))
+
+
+def test_no_lexer_generator_at_runtime():
+    # Run in a fresh interpreter, because the other tests import these modules anyway
+    imported = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, generated_g2_parser; print(' '.join(sys.modules))",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout.split()
+    assert "generated_g2_parser" in imported
+    for module in ["lexer", "nfa", "dfa", "regex"]:
+        assert module not in imported
+    # Nor the regexes, which are already in the lexer table
+    assert not hasattr(generated_g2_parser, "_Regexes")
@@ -0,0 +1,97 @@
+import generated_g2_parser
+import generated_g2_ra_parser
+import generated_slang_parser
+import generated_slang_ra_parser
+
+from common import dollar
+
+import glob
+import pytest
+import sys
+
+# The recursive ascent parsers should do exactly what the table-driven ones do, just faster.
+# They have their own AST classes, so the trees are compared as strings
+
+
+def check_same(table_driven, recursive_ascent, source: str) -> None:
+    try:
+        expected = str(table_driven.parse(table_driven.lex(source)))
+    except table_driven.ParseError as e:
+        with pytest.raises(recursive_ascent.ParseError) as actual:
+            recursive_ascent.parse(recursive_ascent.lex(source))
+        assert actual.value.message == e.message
+        assert actual.value.source_index == e.source_index
+        assert actual.value.token.identical_to(e.token)
+        assert set(actual.value.valid_terminals) == set(e.valid_terminals)
+        return
+    assert str(recursive_ascent.parse(recursive_ascent.lex(source))) == expected
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "x",
+        "x + y * z",
+        "(x + y) * z",
+        "((x)) * (y + z * w) + v",
+        "x +",
+        "(x",
+        "x y",
+        "* x",
+        "x * (y + )",
+        "",
+    ],
+)
+def test_g2(source):
+    check_same(generated_g2_parser, generated_g2_ra_parser, source)
+
+
+@pytest.mark.parametrize("filename", sorted(glob.glob("slang/*.slang")))
+def test_slang(filename):
+    with open(filename, "r", encoding="utf-8") as f:
+        source = f.read()
+    check_same(generated_slang_parser, generated_slang_ra_parser, source)
+    # And with a mistake near the end
+    check_same(generated_slang_parser, generated_slang_ra_parser, source[:-20])
+
+
+def test_deep_nesting():
+    check_same(generated_g2_parser, generated_g2_ra_parser, "(" * 200 + "x" + ")" * 200)
+
+    # Far deeper than the recursion limit, which gets put back afterwards
+    # The tree is too deep to turn into a string, so just follow it down
+    limit = sys.getrecursionlimit()
+    tree = generated_g2_ra_parser.parse(
+        generated_g2_ra_parser.lex("(" * 5000 + "x" + ")" * 5000)
+    )
+    assert sys.getrecursionlimit() == limit
+    for _ in range(5000):
+        # E -> T -> F -> ( E )
+        tree = tree.nodes[0].nodes[0].nodes[1]
+    assert str(tree) == "E(T(F(ID(x))))"
+
+
+def test_tokens_after_dollar():
+    tokens = generated_g2_ra_parser.lex("x + y")
+    with pytest.raises(generated_g2_ra_parser.ParseError) as e:
+        generated_g2_ra_parser.parse(tokens + tokens)
+    assert e.value.message == "Unexpected tokens at end of file"
+    assert e.value.source_index == 4
+    # The same as the table-driven parser
+    with pytest.raises(generated_g2_parser.ParseError) as table_driven:
+        generated_g2_parser.parse(generated_g2_parser.lex("x + y") * 2)
+    assert table_driven.value.message == e.value.message
+    assert table_driven.value.source_index == e.value.source_index
+    assert generated_g2_ra_parser.parse(tokens[:-1]) == generated_g2_ra_parser.parse(
+        tokens
+    )
+    assert tokens[-1] == dollar
+
+
+def test_streaming_parse():
+    with open("slang/fib.slang", "r", encoding="utf-8") as f:
+        tree = generated_slang_ra_parser.parse(generated_slang_ra_parser.iter_tokens(f))
+    with open("slang/fib.slang", "r", encoding="utf-8") as f:
+        assert str(tree) == str(
+            generated_slang_parser.parse(generated_slang_parser.lex(f.read()))
+        )
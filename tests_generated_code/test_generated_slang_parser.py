@@ -2,6 +2,7 @@ from generated_slang_parser import (
     parse,
     ParseError,
     lex,
+    iter_tokens,
     EXPR,
     EXPR1,
     SUM,
@@ -15,6 +16,7 @@ from slang_ast import AST
 from common import Terminal, dollar
 
 import pytest
+import glob
 
 
 ident = Terminal("IDENT")
@@ -69,3 +71,11 @@ def test_to_ast_id():
     generated_ast = parse([x, dollar]).to_AST()
     assert generated_ast.kind == AST.Kind.Var
     assert generated_ast.variable.name == "x"
+
+
+@pytest.mark.parametrize("filename", sorted(glob.glob("slang/*.slang")))
+def test_streaming_parse(filename):
+    with open(filename, "r", encoding="utf-8") as f:
+        expected = parse(lex(f.read()))
+    with open(filename, "r", encoding="utf-8") as f:
+        assert parse(iter_tokens(f)) == expected